@@ -0,0 +1,29 @@
+import os
+import sys
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'backend')))
+
+# Import the Flask app
+from app import app, ensure_dataset_loaded
+from models.async_serving import AsyncWsgiApp, RecommendCoalescing
+
+# Same preloading as wsgi.py: with gunicorn's uvicorn worker class and
+# gunicorn.conf.py, the dataset is loaded once in the master and shared
+if os.environ.get('PRELOAD_DATASET', '1') == '1':
+    ensure_dataset_loaded()
+
+# The same routes served asynchronously: Flask views run on ASGI_THREADS
+# threads per worker while the event loop keeps serving other connections,
+# and identical concurrent /api/recommend requests are answered by one
+# computation (ASGI_COALESCE=0 turns this off)
+application = AsyncWsgiApp(
+    app,
+    max_threads=int(os.environ['ASGI_THREADS']) if os.environ.get('ASGI_THREADS') else None,
+    coalescing=RecommendCoalescing() if os.environ.get('ASGI_COALESCE', '1') == '1' else None
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get('PORT', 5000))
+    uvicorn.run(application, host='0.0.0.0', port=port)
@@ -1,18 +1,32 @@
-from flask import Flask, request, jsonify, send_from_directory, Response, send_file
+from flask import Flask, request, jsonify, Response, send_file, stream_with_context, g
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
 import os
-import glob
 import base64
-import sys
+import json
+import logging
+import time
 # import tensorflow as tf  # Removing TensorFlow import
-from models.recommendation_model import RecipeRecommender
-from sklearn.metrics.pairwise import cosine_similarity
+from models.recommendation_model import RecipeRecommender, normalize_ingredients
+from models.image_manifest import ImageManifest
+from models.image_variants import ImageVariants
+from models.query_cache import QueryCache, SharedQueryCache
+from models.dataset_loader import DatasetLoader
+from models.delta_index import DeltaIndex
+from models.recipe_journal import RecipeJournal, iter_recipe_chunks, parse_recipe
+from models.recipe_payloads import RECIPE_FIELDS, dumps, image_url, parse_fields, project_recipe
+from models.recipe_filter import parse_constraints
+from models.compression import compress, negotiate_encoding
+from models.logging_config import configure_logging
+from models.metrics import metrics, stage
+from models.profiling import RequestProfiler
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# LOG_LEVEL, LOG_RATE_LIMIT and LOG_RATE_INTERVAL control logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__, static_folder='../Food Images')
 # Enable full CORS support for all routes and origins
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
@@ -22,19 +36,231 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 base_dir = os.path.dirname(current_dir)  # Go up one directory to project root
 
 # Use absolute paths for datasets and images
-dataset_path = os.path.join(base_dir, 'Food Ingredients and Recipe Dataset with Image Name Mapping.csv')
+dataset_path = os.environ.get(
+    'DATASET_PATH', os.path.join(base_dir, 'Food Ingredients and Recipe Dataset with Image Name Mapping.csv')
+)
 images_dir = os.path.join(base_dir, 'Food Images', 'Food Images')
+image_cache_dir = os.environ.get('IMAGE_CACHE_DIR', os.path.join(base_dir, 'Food Images', 'variants'))
+
+# Log the paths for debugging
+logger.debug("Current directory: %s", current_dir)
+logger.debug("Base directory: %s", base_dir)
+logger.info("Dataset path: %s (exists: %s)", dataset_path, os.path.exists(dataset_path))
+logger.info("Images directory: %s (exists: %s)", images_dir, os.path.exists(images_dir))
+
+# Index the images directory once instead of probing it on every request
+image_manifest = ImageManifest(images_dir)
+logger.info("Image manifest built with %d images", image_manifest.refresh())
+
+# Resized / WebP copies of the images, served for /api/images/<name>?w=...
+image_variants = ImageVariants(image_cache_dir)
+
+# Cache of recommendation results; QUERY_CACHE_SIZE=0 disables it. Set
+# QUERY_CACHE_SHARED_PATH to a SQLite file to share results between workers.
+shared_query_cache_path = os.environ.get('QUERY_CACHE_SHARED_PATH')
+query_cache = QueryCache(
+    max_size=int(os.environ.get('QUERY_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('QUERY_CACHE_TTL', 300)),
+    shared=SharedQueryCache(shared_query_cache_path) if shared_query_cache_path else None
+)
+
+# Full rankings behind paginated results
+ranking_cache = QueryCache(max_size=256)
+
+# Serialized /api/ingredients/suggest responses, one per prefix as typed
+suggest_cache = QueryCache(max_size=4096, ttl=300)
+
+# Serialized recommendation pages and recipe details, uncompressed and in
+# each content coding clients asked for (RESPONSE_CACHE_SIZE=0 disables it)
+response_cache = QueryCache(max_size=int(os.environ.get('RESPONSE_CACHE_SIZE', 4096)), ttl=300)
+
+# Optional LSA 'semantic' method. SEMANTIC_NPROBE is its recall/latency
+# knob: inverted lists scored per query (0 scores every recipe)
+semantic_enabled = os.environ.get('SEMANTIC_MODEL', '').lower() in ('1', 'true', 'yes')
+semantic_options = {
+    'n_components': int(os.environ.get('SEMANTIC_COMPONENTS', 64)),
+    'n_lists': int(os.environ['SEMANTIC_LISTS']) if os.environ.get('SEMANTIC_LISTS') else None,
+    'n_probe': int(os.environ.get('SEMANTIC_NPROBE', 8)) or None,
+}
+
+# SCORING_SHARDS > 1 splits 'match' and 'tfidf' scoring across that many
+# processes per worker, for catalogues too large to score on one core
+scoring_shards = int(os.environ.get('SCORING_SHARDS', 0))
+
+# Set while ensure_dataset_loaded() builds the first snapshot at startup,
+# e.g. in the gunicorn master: shard processes are then started by each
+# worker (start_scoring_shards) rather than in a process that never serves
+startup_load = False
+
+def build_recommender():
+    """
+    Load a complete recommender: store, indexes and TF-IDF model
+    
+    Runs on the loader's background thread. The result is published as an
+    immutable snapshot and never modified afterwards.
+    """
+    snapshot = RecipeRecommender(
+        dataset_path, image_manifest=image_manifest, query_cache=query_cache, ranking_cache=ranking_cache
+    )
+    if not snapshot.load_data():
+        raise RuntimeError('Failed to load dataset')
+    snapshot.build_tfidf_model()
+    if semantic_enabled:
+        snapshot.build_semantic_model(**semantic_options)
+    else:
+        # A model left in the compiled cache by an earlier run stays unused
+        snapshot.semantic_model = None
+    if scoring_shards > 1:
+        snapshot.enable_sharding(scoring_shards, start=not startup_load)
+    snapshot.delta = recipe_delta
+    return snapshot
+
+def semantic_disabled_response():
+    """400 response for the 'semantic' method when its model is not built"""
+    return jsonify({'error': "The 'semantic' method is not enabled on this server (SEMANTIC_MODEL=1)"}), 400
+
+# Loads the dataset off the request path and swaps in new snapshots on
+# reload. DATASET_WATCH_INTERVAL > 0 also reloads when the CSV changes.
+dataset_loader = DatasetLoader(
+    build_recommender,
+    watch_paths=[dataset_path],
+    poll_interval=float(os.environ.get('DATASET_WATCH_INTERVAL', 0))
+)
+
+# Recipes added through /api/recipes or ingest_recipes.py are journaled next
+# to the dataset and searched from a small delta index until compaction
+# appends them to the CSV (INGEST_COMPACT_THRESHOLD recipes, or after
+# INGEST_COMPACT_INTERVAL seconds) and the dataset is reloaded
+recipe_journal = RecipeJournal(os.environ.get('INGEST_JOURNAL_PATH', f"{dataset_path}.ingested.jsonl"), dataset_path)
+recipe_delta = DeltaIndex(
+    recipe_journal,
+    main_size=lambda: len(dataset_loader.current.store) if dataset_loader.current is not None else None,
+    on_compacted=lambda: dataset_loader.reload(),
+    poll_interval=float(os.environ.get('INGEST_POLL_INTERVAL', 1)),
+    compact_threshold=int(os.environ.get('INGEST_COMPACT_THRESHOLD', 5000)),
+    compact_interval=float(os.environ.get('INGEST_COMPACT_INTERVAL', 3600))
+)
+
+def current_recommender():
+    """
+    The published recommender snapshot
+    
+    Starts the background load if nothing has started it yet, but never
+    loads on the calling thread. Handlers take the snapshot once per request
+    so a reload part way through cannot mix two datasets.
+    
+    Returns:
+        RecipeRecommender: The snapshot, or None while the first load runs
+    """
+    dataset_loader.start()
+    recipe_delta.start()
+    return dataset_loader.current
+
+def dataset_loading_response():
+    """503 response for requests that arrive before the first snapshot"""
+    status = dataset_loader.status()
+    error = f"Failed to load dataset: {status['last_error']}" if status['last_error'] else 'Dataset is loading, try again shortly'
+    response = jsonify({'error': error, 'dataset': status})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+# Opt-in sampling profiler: PROFILE_SAMPLE_RATE is the share of requests
+# profiled (e.g. 0.01); PROFILE_DIR keeps their collapsed stacks
+request_profiler = RequestProfiler(
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    interval=float(os.environ.get('PROFILE_INTERVAL', 0.001)),
+    output_dir=os.environ.get('PROFILE_DIR')
+)
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.profiler = request_profiler.maybe_start()
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Record latency per route; for streamed responses this covers the time
+    to the first byte, not the whole body
+    """
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        labels = {'route': route, 'method': request.method, 'status': response.status_code}
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - start, **labels)
+        metrics.inc('http_requests_total', **labels)
+    return response
+
+@app.teardown_request
+def finish_request_profile(exc):
+    sampler = g.pop('profiler', None)
+    if sampler is None:
+        return
+    label = f"{request.method} {request.path}"
+    path = request_profiler.finish(sampler, label)
+    top = ', '.join(f"{frame} {share:.0%}" for frame, share in sampler.top_functions(5))
+    logger.info("Profiled %s: %d samples%s; top frames: %s",
+                label, sampler.samples, f", written to {path}" if path else '', top or 'none')
+
+def collect_app_metrics():
+    """Cache, dataset and index values for /api/metrics, read at scrape time"""
+    samples = []
+    caches = (('results', query_cache), ('rankings', ranking_cache), ('suggestions', suggest_cache),
+              ('responses', response_cache))
+    for name, cache in caches:
+        stats = cache.stats()
+        labels = {'cache': name}
+        samples += [
+            ('query_cache_hits_total', 'counter', 'Cache lookups answered from the cache', labels, stats['hits']),
+            ('query_cache_misses_total', 'counter', 'Cache lookups that had to compute', labels, stats['misses']),
+            ('query_cache_evictions_total', 'counter', 'Entries dropped to make room', labels, stats['evictions']),
+            ('query_cache_expirations_total', 'counter', 'Entries dropped after their TTL', labels, stats['expirations']),
+            ('query_cache_entries', 'gauge', 'Entries currently cached', labels, stats['size']),
+        ]
+    status = dataset_loader.status()
+    samples += [
+        ('dataset_ready', 'gauge', 'Whether a dataset snapshot is loaded', {}, status['ready']),
+        ('dataset_loading', 'gauge', 'Whether a dataset build is running', {}, status['loading']),
+        ('dataset_recipes', 'gauge', 'Recipes in the loaded snapshot', {}, status['recipes']),
+        ('dataset_reloads_total', 'counter', 'Snapshots published since start', {}, status['reloads']),
+    ]
+    if status['load_seconds'] is not None:
+        samples.append(('dataset_load_seconds', 'gauge', 'Build time of the loaded snapshot', {}, status['load_seconds']))
+    delta = recipe_delta.status()
+    samples += [
+        ('delta_recipes', 'gauge', 'Ingested recipes searched from the delta index', {}, delta['recipes']),
+        ('delta_journal_entries', 'gauge', 'Ingested recipes waiting for compaction', {}, delta['journal_entries']),
+        ('delta_ingested_total', 'counter', 'Recipes ingested through this process', {}, delta['ingested']),
+        ('delta_compactions_total', 'counter', 'Journal compactions run by this process', {}, delta['compactions']),
+    ]
+    recommender = dataset_loader.current
+    if recommender is not None:
+        samples += [
+            ('ingredient_index_terms', 'gauge', 'Distinct ingredient strings in the index', {},
+             len(recommender.ingredient_index.terms)),
+            ('ingredient_vocabulary_terms', 'gauge', 'Canonical ingredients in the vocabulary', {},
+             len(recommender.vocabulary.terms)),
+            ('recommender_scoring_shards', 'gauge', 'Shard processes scoring queries (0 scores in process)', {},
+             recommender.sharded.n_shards if recommender.sharded is not None and recommender.sharded.running else 0),
+        ]
+    return samples
 
-# Print the paths for debugging
-print(f"Current directory: {current_dir}")
-print(f"Base directory: {base_dir}")
-print(f"Dataset path: {dataset_path}")
-print(f"Images directory: {images_dir}")
-print(f"Dataset exists: {os.path.exists(dataset_path)}")
-print(f"Images directory exists: {os.path.exists(images_dir)}")
+metrics.register_collector(collect_app_metrics)
 
-# Initialize the recommender
-recommender = RecipeRecommender(dataset_path)
+# Upper bound on the number of queries accepted by /api/recommend/batch
+MAX_BATCH_SIZE = 1000
+
+# Page size of /api/recommend when no limit is given, and the largest allowed
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+# Largest top_n of /api/recommend/batch: a batch page per query is bounded
+# like a single-query page
+MAX_TOP_N = MAX_PAGE_SIZE
+
+# Suggestions returned by /api/ingredients/suggest by default and at most
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 50
 
 # Default image as fallback for missing images
 DEFAULT_IMAGE_SVG = '''
@@ -54,7 +280,7 @@ DEFAULT_IMAGE_SVG = '''
 @app.route('/api/images/default-recipe-image')
 def default_image():
     """Return a default image SVG when no recipe image is available"""
-    print("Serving default image")
+    logger.debug("Serving default image")
     svg_data = DEFAULT_IMAGE_SVG.encode('utf-8')
     response = Response(svg_data, mimetype='image/svg+xml')
     response.headers.add('Access-Control-Allow-Origin', '*')
@@ -68,16 +294,15 @@ def test_images():
             return jsonify({'error': 'Images directory not found'}), 404
         
         # Get a sample of image files
-        image_files = os.listdir(images_dir)[:20]  # Get first 20 images
+        image_files = image_manifest.entries()[:20]  # Get first 20 images
         
         # Create test URLs for these images
         test_images = []
         for img in image_files:
-            name, ext = os.path.splitext(img)
             test_images.append({
-                'name': name,
-                'full_name': img,
-                'test_url': f"/api/images/{name}"
+                'name': img.stem,
+                'full_name': img.filename,
+                'test_url': f"/api/images/{img.stem}"
             })
         
         return jsonify({
@@ -92,123 +317,561 @@ def test_images():
 # Serve images from the Food Images folder
 @app.route('/api/images/<image_name>')
 def serve_image(image_name):
+    """
+    Serve a recipe image, optionally resized
+    
+    Query parameters:
+        w: Target width in pixels; snapped to a pre-rendered size, never upscaled
+        format: 'webp' or 'jpeg'; by default WebP is sent to clients that
+            explicitly accept it
+    
+    Responses carry ETag and Last-Modified headers, answer conditional
+    requests with 304 and support byte ranges.
+    """
     # Clean up the image name to prevent directory traversal
     image_name = os.path.basename(image_name)
     
-    # First, try to find an exact match with extension
-    for ext in ['.jpg', '.jpeg', '.png', '.gif']:
-        image_path = os.path.join(images_dir, f"{image_name}{ext}")
-        if os.path.exists(image_path):
-            response = send_file(image_path, mimetype=f'image/{ext[1:]}')
-            # Add CORS headers
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            response.headers.add('Access-Control-Allow-Methods', 'GET')
-            response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
-            response.headers.add('Cache-Control', 'max-age=86400')  # Cache for 24 hours
-            return response
+    width = request.args.get('w')
+    if width is not None:
+        try:
+            width = int(width)
+        except ValueError:
+            return jsonify({'error': "'w' must be an integer"}), 400
+        if width <= 0:
+            return jsonify({'error': "'w' must be positive"}), 400
     
-    # If we got here, we couldn't find the image with any extension
-    print(f"Image not found: {image_name}", file=sys.stderr)
+    fmt = request.args.get('format')
+    if fmt is not None and fmt not in ('webp', 'jpeg'):
+        return jsonify({'error': "'format' must be 'webp' or 'jpeg'"}), 400
+    
+    # Resolve the file from the manifest rather than probing each extension
+    with stage('image_resolve'):
+        image = image_manifest.lookup(image_name)
+        if image is not None:
+            negotiated = False
+            if width is not None and fmt is None:
+                # Only an explicit mention counts; */* does not mean WebP support
+                negotiated = True
+                fmt = 'webp' if any(value == 'image/webp' and quality > 0
+                                    for value, quality in request.accept_mimetypes) else 'jpeg'
+            
+            if width is not None:
+                path, mimetype = image_variants.resolve(image, width, fmt)
+            elif fmt is not None:
+                # Only the format changes: re-encode at the original width
+                path, mimetype = image_variants.resolve(image, None, fmt)
+            else:
+                path, mimetype = image.path, image.mimetype
+    
+    if image is not None:
+        # send_file sets a strong ETag and Last-Modified, and handles
+        # If-None-Match / If-Modified-Since (304) and Range (206) requests
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=86400)
+        if negotiated:
+            response.vary.add('Accept')
+        # Add CORS headers
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'GET')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return response
+    
+    # If we got here, there is no image with that name
+    logger.warning("Image not found: %s", image_name)
     
     # Return a 404 instead of redirecting to a default image
     # This will let the frontend handle the fallback with an embedded image
     return jsonify({"error": "Image not found"}), 404
 
-# Load the dataset
-@app.route('/api/load_data', methods=['GET'])
+# Rescan the images directory, e.g. after adding images
+@app.route('/api/image_manifest/refresh', methods=['POST'])
+def refresh_image_manifest():
+    try:
+        count = image_manifest.refresh()
+        # Image availability is part of the snapshot, so publish a new one
+        dataset_loader.reload()
+        return jsonify({'message': 'Image manifest refreshed', 'images': count}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Reload the dataset in the background; requests keep using the current
+# snapshot until the new one is published
+@app.route('/api/load_data', methods=['GET', 'POST'])
 def load_data():
     try:
         # Check if the file exists
         if not os.path.exists(dataset_path):
             return jsonify({'error': 'Dataset file not found'}), 404
         
-        # Load the dataset
-        success = recommender.load_data()
-        
-        if success:
-            # Build the TF-IDF model
-            recommender.build_tfidf_model()
-            return jsonify({'message': 'Dataset loaded successfully', 'rows': len(recommender.df)}), 200
-        else:
-            return jsonify({'error': 'Failed to load dataset'}), 500
+        dataset_loader.start()
+        started = dataset_loader.reload()
+        message = 'Dataset reload started' if started else 'Dataset reload queued behind the running one'
+        return jsonify({'message': message, 'dataset': dataset_loader.status()}), 202
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Recommend recipes based on ingredients
+def ensure_dataset_loaded():
+    """
+    Load the dataset and models synchronously unless already loaded
+    
+    For startup code only (e.g. wsgi.py in the gunicorn master); request
+    handlers use current_recommender(), which never blocks on loading.
+    
+    Returns:
+        str: Error message if loading failed, otherwise None
+    """
+    global startup_load
+    if dataset_loader.ready:
+        return None
+    logger.info("Loading dataset...")
+    startup_load = True
+    try:
+        loaded = dataset_loader.load_now()
+    finally:
+        startup_load = False
+    if not loaded:
+        return f'Failed to load dataset: {dataset_loader.last_error}'
+    logger.info("Dataset loaded successfully!")
+    return None
+
+def start_scoring_shards():
+    """
+    Start the shard processes of the current snapshot in the background
+    
+    For each gunicorn worker (post_fork) when the snapshot was loaded in the
+    master. Until they are ready, queries are scored in process.
+    """
+    snapshot = dataset_loader.current
+    if snapshot is not None and snapshot.sharded is not None:
+        snapshot.sharded.start_in_background()
+
+def add_image_urls(recipes, backend_url):
+    """
+    Set image_url on recipes that have an image
+    
+    Image availability is precomputed from the image manifest, and recipes
+    without an image file already come back with image_name None, so this
+    does no filesystem access.
+    
+    Args:
+        recipes (list): Recipe dictionaries, updated in place
+        backend_url (str): Base URL of the backend
+    """
+    with stage('image_urls'):
+        for recipe in recipes:
+            if recipe.get('image_name'):
+                recipe['image_url'] = image_url(backend_url, recipe['image_name'])
+
+def encode_cursor(ingredients, method, offset, limit, fields=RECIPE_FIELDS, constraints=None, generation=None):
+    """
+    Encode the position in a ranking as an opaque, URL-safe cursor
+    
+    The cursor carries the normalized query itself, so any worker can serve
+    the next page: from its ranking cache if it has the ranking, otherwise
+    by ranking the query once more. A field projection and constraints are
+    carried along so later pages have the same fields and recipes, and the
+    dataset generation so that a cursor into a ranking of a dataset that
+    has since been reloaded is refused rather than skipping or repeating
+    recipes.
+    """
+    state = {'i': ingredients, 'm': method, 'o': offset, 'l': limit, 'g': generation}
+    if fields != RECIPE_FIELDS:
+        state['f'] = list(fields)
+    if constraints is not None:
+        state['c'] = [list(constraints.include), list(constraints.exclude), constraints.max_ingredients]
+    state = json.dumps(state, separators=(',', ':'))
+    return base64.urlsafe_b64encode(state.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor
+    
+    Returns:
+        tuple: (ingredients, method, offset, limit, fields, constraints,
+            generation); fields is None if the cursor has no projection,
+            constraints None if it has none
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        ingredients, method, offset, limit = state['i'], state['m'], int(state['o']), int(state['l'])
+        constraints = parse_constraints(*state['c']) if 'c' in state else None
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(ingredients, list) or not all(isinstance(i, str) for i in ingredients) or offset < 0:
+        raise ValueError('Invalid cursor')
+    return ingredients, method, offset, limit, state.get('f'), constraints, state.get('g')
+
+def json_response(render, cache_key=None, status=200):
+    """
+    Response for a serialized JSON body, compressed as the client accepts
+    
+    With a cache key the body is rendered once and kept in response_cache,
+    and so is each compressed copy, so a repeated request costs a lookup.
+    
+    Args:
+        render (callable): Returns the body as JSON bytes, or None if there
+            is nothing to send
+        cache_key (tuple): Key of the body in response_cache; it must
+            identify everything the body depends on
+        status (int): HTTP status
+        
+    Returns:
+        Response: The response, or None if render() returned None
+    """
+    body = response_cache.get(cache_key) if cache_key is not None else None
+    if body is None:
+        body = render()
+        if body is None:
+            return None
+        if cache_key is not None:
+            response_cache.put(cache_key, body)
+    
+    with stage('compress'):
+        encoding = negotiate_encoding(request.accept_encodings, len(body))
+        if encoding is not None:
+            compressed = response_cache.get(cache_key + (encoding,)) if cache_key is not None else None
+            if compressed is None:
+                compressed = compress(body, encoding)
+                if cache_key is not None:
+                    response_cache.put(cache_key + (encoding,), compressed)
+            body = compressed
+    
+    response = Response(body, status=status, mimetype='application/json')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+def request_fields(data=None, default=None):
+    """
+    The ``fields`` projection of a request, from the JSON body or the query string
+    
+    Raises:
+        ValueError: If a field is unknown
+    """
+    value = data.get('fields') if data else None
+    if value is None:
+        value = request.args.get('fields', default)
+    return parse_fields(value)
+
+def wants_stream(data):
+    """Whether the client asked for NDJSON streaming"""
+    stream = data.get('stream', request.args.get('stream'))
+    if isinstance(stream, str):
+        stream = stream.lower() in ('1', 'true', 'yes')
+    return bool(stream) or request.accept_mimetypes.best == 'application/x-ndjson'
+
+def stream_recommendations(recommender, user_ingredients, method, offset, limit, backend_url, corrections=(),
+                           fields=RECIPE_FIELDS, constraints=None, chunk_size=20):
+    """
+    Stream recipes as NDJSON, one recipe per line, serialized a chunk at a time
+    
+    The last line is {"total": ..., "next_cursor": ..., "corrections": ...}
+    or, if something failed part way, {"error": ...}.
+    """
+    try:
+        ids, scores = recommender.rank(user_ingredients, method, constraints)
+        end = len(ids) if limit is None else min(len(ids), offset + limit)
+        for start in range(offset, end, chunk_size):
+            stop = min(start + chunk_size, end)
+            for recipe in recommender.render_recipes(zip(ids[start:stop], scores[start:stop]), fields, backend_url):
+                yield recipe + b'\n'
+        page_size = limit or DEFAULT_PAGE_SIZE
+        next_cursor = (encode_cursor(user_ingredients, method, end, page_size, fields, constraints,
+                                     recommender.generation)
+                       if end < len(ids) else None)
+        yield dumps({'total': len(ids), 'next_cursor': next_cursor, 'corrections': list(corrections)}) + b'\n'
+    except Exception as e:
+        logger.exception("Error streaming recommendations: %s", e)
+        yield dumps({'error': str(e)}) + b'\n'
+
+# Recommend recipes based on ingredients, a page at a time
 @app.route('/api/recommend', methods=['POST'])
 def recommend_recipes():
     try:
-        # Get ingredients from request
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No JSON data provided'}), 400
+        with stage('parse'):
+            # Get ingredients from request
+            data = request.get_json()
+            if not data:
+                return jsonify({'error': 'No JSON data provided'}), 400
             
-        user_ingredients = [ingredient.lower() for ingredient in data.get('ingredients', [])]
+            # A cursor from a previous page carries the query and position
+            cursor = data.get('cursor') or request.args.get('cursor')
+            cursor_fields = cursor_generation = None
+            if cursor:
+                try:
+                    (user_ingredients, method, offset, page_size, cursor_fields, constraints,
+                     cursor_generation) = decode_cursor(cursor)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+            else:
+                user_ingredients = normalize_ingredients(data.get('ingredients', []))
+                # Scoring method: 'match' (default), 'tfidf' or 'semantic'
+                method = data.get('method') or request.args.get('method', 'match')
+                offset, page_size = 0, DEFAULT_PAGE_SIZE
+                # Only recipes with every "include" ingredient, none of the
+                # "exclude" ones (or groups such as "nuts") and at most
+                # "max_ingredients" ingredients are ranked
+                try:
+                    constraints = parse_constraints(
+                        data.get('include'), data.get('exclude'), data.get('max_ingredients')
+                    )
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+            
+            # Fields of each recipe, e.g. "id,title,image_url" for a results
+            # list; all by default, or those of the cursor's first page
+            try:
+                fields = request_fields(data, default=cursor_fields)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
         
-        print(f"Received ingredients: {user_ingredients}")
+        logger.debug("Received ingredients: %s", user_ingredients)
         
         if not user_ingredients:
             return jsonify({'error': 'No ingredients provided'}), 400
         
-        # Make sure data is loaded
-        if recommender.df is None:
-            # Try to load data
+        if method not in RecipeRecommender.METHODS:
+            return jsonify({'error': f"Unknown method '{method}'. Expected one of: {', '.join(RecipeRecommender.METHODS)}"}), 400
+        
+        stream = wants_stream(data)
+        limit = data.get('limit', request.args.get('limit'))
+        if limit is not None:
             try:
-                print("Loading dataset...")
-                success = recommender.load_data()
-                if not success:
-                    return jsonify({'error': 'Failed to load dataset'}), 500
-                    
-                recommender.build_tfidf_model()
-                print("Dataset loaded successfully!")
-            except Exception as e:
-                print(f"Error loading dataset: {str(e)}", file=sys.stderr)
-                return jsonify({'error': f'Failed to load dataset: {str(e)}'}), 500
+                limit = int(limit)
+            except (TypeError, ValueError):
+                return jsonify({'error': "'limit' must be an integer"}), 400
+            max_limit = RecipeRecommender.MAX_RANKED if stream else MAX_PAGE_SIZE
+            if not 1 <= limit <= max_limit:
+                return jsonify({'error': f"'limit' must be between 1 and {max_limit}"}), 400
+        elif not stream:
+            limit = max(1, min(page_size, MAX_PAGE_SIZE))
         
-        # Get recommendations
+        # Answer from the current snapshot; 503 until the first one is loaded
+        recommender = current_recommender()
+        if recommender is None:
+            return dataset_loading_response()
+        if method == 'semantic' and recommender.semantic_model is None:
+            return semantic_disabled_response()
+        if cursor and cursor_generation != recommender.generation:
+            return jsonify({'error': 'Cursor expired: the dataset was reloaded; request the first page again'}), 410
+        
+        # Correct misspelt ingredients that match nothing ("correct": false
+        # turns this off); cursors already carry the corrected query
+        corrections = []
+        if not cursor and data.get('correct', True):
+            with stage('correct'):
+                user_ingredients, corrections = recommender.correct_ingredients(user_ingredients)
+        
+        backend_url = request.host_url.rstrip('/')
+        if stream:
+            # Without a limit, stream the rest of the ranking
+            response = Response(
+                stream_with_context(stream_recommendations(
+                    recommender, user_ingredients, method, offset, limit, backend_url, corrections, fields,
+                    constraints
+                )),
+                mimetype='application/x-ndjson'
+            )
+            response.headers.add('Access-Control-Allow-Origin', '*')
+            return response
+        
+        def render():
+            # Later pages reuse the ranking of the first
+            recipes, total = recommender.render_page(
+                user_ingredients, offset=offset, limit=limit, method=method, fields=fields, backend_url=backend_url,
+                constraints=constraints
+            )
+            next_offset = offset + limit
+            next_cursor = (encode_cursor(user_ingredients, method, next_offset, limit, fields, constraints,
+                                         recommender.generation)
+                           if next_offset < total else None)
+            with stage('serialize'):
+                # Keys in the sorted order jsonify used
+                return (b'{"corrections":' + dumps(corrections) + b',"next_cursor":' + dumps(next_cursor)
+                        + b',"recipes":' + recipes + b',"total":' + dumps(total) + b'}')
+        
+        # The whole page is cached, serialized and compressed; the ingredients
+        # are normalized, so the corrections complete the key
+        cache_key = ('recommend', recommender.result_generation(), method, tuple(user_ingredients), offset, limit,
+                     fields, backend_url, tuple((c['original'], c['corrected']) for c in corrections),
+                     tuple(constraints) if constraints is not None else None)
         try:
-            recommended_recipes = recommender.recommend_recipes_tfidf(user_ingredients, top_n=10)
-            print(f"Found {len(recommended_recipes)} recipes")
+            return json_response(render, cache_key)
         except Exception as e:
-            print(f"Error getting recommendations: {str(e)}", file=sys.stderr)
+            logger.exception("Error getting recommendations: %s", e)
             return jsonify({'error': f'Error getting recommendations: {str(e)}'}), 500
+    
+    except Exception as e:
+        logger.exception("Unexpected error in recommend_recipes: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+# Recommend recipes for many ingredient lists in one request
+@app.route('/api/recommend/batch', methods=['POST'])
+def recommend_recipes_batch():
+    try:
+        with stage('parse'):
+            data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
         
-        # Add image URLs to the recipes
-        backend_url = request.host_url.rstrip('/')  # Get the base URL of the backend
-        for recipe in recommended_recipes:
-            if recipe.get('image_name'):
-                # Check if file exists
-                image_name = os.path.splitext(recipe['image_name'])[0]
-                
-                # Don't set image_url if we don't have the image file
-                # This will make frontend use the embedded fallback
-                found_image = False
-                for ext in ['.jpg', '.jpeg', '.png', '.gif']:
-                    full_name = f"{image_name}{ext}"
-                    full_path = os.path.join(images_dir, full_name)
-                    if os.path.exists(full_path):
-                        found_image = True
-                        break
-                
-                if found_image:
-                    recipe['image_url'] = f"{backend_url}/api/images/{image_name}"
-                    print(f"Set image URL to: {recipe['image_url']}")
-                else:
-                    # Instead of serving a "default" image that might get blocked,
-                    # just don't set an image URL, forcing frontend to use embedded image
-                    recipe['image_name'] = None  # Let frontend use embedded fallback
-                    print(f"Image not found for: {image_name}, using frontend fallback")
+        queries = data.get('queries')
+        if not isinstance(queries, list) or not all(isinstance(q, list) for q in queries):
+            return jsonify({'error': "'queries' must be a list of ingredient lists"}), 400
+        if len(queries) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} queries per batch'}), 400
         
-        # Add CORS headers to the response
-        response = jsonify({'recipes': recommended_recipes})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 200
+        try:
+            top_n = int(data.get('top_n', 10))
+        except (TypeError, ValueError):
+            return jsonify({'error': "'top_n' must be an integer"}), 400
+        if not 1 <= top_n <= MAX_TOP_N:
+            return jsonify({'error': f"'top_n' must be between 1 and {MAX_TOP_N}"}), 400
+        
+        method = data.get('method') or request.args.get('method', 'match')
+        if method not in RecipeRecommender.METHODS:
+            return jsonify({'error': f"Unknown method '{method}'. Expected one of: {', '.join(RecipeRecommender.METHODS)}"}), 400
+        
+        try:
+            fields = request_fields(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        recommender = current_recommender()
+        if recommender is None:
+            return dataset_loading_response()
+        if method == 'semantic' and recommender.semantic_model is None:
+            return semantic_disabled_response()
+        
+        corrections = [[] for _ in queries]
+        if data.get('correct', True):
+            with stage('correct'):
+                corrected = [recommender.correct_ingredients(normalize_ingredients(query)) for query in queries]
+            queries = [query for query, _ in corrected]
+            corrections = [applied for _, applied in corrected]
+        
+        try:
+            results = recommender.recommend_batch(queries, top_n=top_n, method=method)
+        except Exception as e:
+            logger.exception("Error getting batch recommendations: %s", e)
+            return jsonify({'error': f'Error getting recommendations: {str(e)}'}), 500
+        
+        backend_url = request.host_url.rstrip('/')
+        for recipes in results:
+            add_image_urls(recipes, backend_url)
+        
+        def render():
+            with stage('serialize'):
+                return dumps({'results': [
+                    {'corrections': applied, 'recipes': [project_recipe(recipe, fields) for recipe in recipes]}
+                    for recipes, applied in zip(results, corrections)
+                ]})
+        
+        return json_response(render)
     
     except Exception as e:
-        print(f"Unexpected error in recommend_recipes: {str(e)}", file=sys.stderr)
+        logger.exception("Unexpected error in recommend_recipes_batch: %s", e)
         return jsonify({'error': str(e)}), 500
 
+# Add recipes without rebuilding the dataset: a JSON recipe, {"recipes": [...]},
+# or JSON Lines (application/x-ndjson) parsed and journaled a chunk at a time.
+# They are searchable in this worker on return and in the others within
+# INGEST_POLL_INTERVAL seconds.
+@app.route('/api/recipes', methods=['POST'])
+def add_recipes():
+    recommender = current_recommender()
+    if recommender is None:
+        return dataset_loading_response()
+    
+    ids = []
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            chunks = iter_recipe_chunks(request.stream)
+        else:
+            with stage('parse'):
+                data = request.get_json(silent=True)
+            if not data:
+                return jsonify({'error': 'No JSON data provided'}), 400
+            recipes = data['recipes'] if isinstance(data, dict) and 'recipes' in data else data
+            if not isinstance(recipes, list):
+                recipes = [recipes]
+            if len(recipes) > MAX_BATCH_SIZE:
+                return jsonify({'error': f'At most {MAX_BATCH_SIZE} recipes per JSON request; send JSON Lines for more'}), 400
+            chunks = [[parse_recipe(recipe) for recipe in recipes]]
+        for chunk in chunks:
+            ids += recipe_delta.ingest(chunk, base=len(recommender.store))
+    except ValueError as e:
+        # Chunks before the invalid recipe are kept
+        return jsonify({'error': str(e), 'added': len(ids), 'ids': ids}), 400
+    except Exception as e:
+        logger.exception("Error adding recipes: %s", e)
+        return jsonify({'error': str(e), 'added': len(ids), 'ids': ids}), 500
+    
+    return jsonify({'added': len(ids), 'ids': ids, 'ingested': recipe_delta.status()}), 201
+
+# One recipe by id, e.g. to show the instructions of a recipe picked from a
+# results list fetched without them. ?fields= selects fields as on
+# /api/recommend; responses are cached serialized and compressed per recipe.
+@app.route('/api/recipes/<int:recipe_id>', methods=['GET'])
+def get_recipe(recipe_id):
+    try:
+        fields = request_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    recommender = current_recommender()
+    if recommender is None:
+        return dataset_loading_response()
+    
+    backend_url = request.host_url.rstrip('/')
+    cache_key = ('recipe', recommender.result_generation(), recipe_id, fields, backend_url)
+    try:
+        response = json_response(lambda: recommender.render_recipe(recipe_id, fields, backend_url), cache_key)
+    except Exception as e:
+        logger.exception("Error getting recipe %d: %s", recipe_id, e)
+        return jsonify({'error': str(e)}), 500
+    if response is None:
+        return jsonify({'error': 'Recipe not found'}), 404
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+# Ingredient autocomplete: canonical names with a word starting with q,
+# most used first. Cheap enough to call on every keystroke.
+@app.route('/api/ingredients/suggest', methods=['GET'])
+def suggest_ingredients():
+    prefix = ' '.join(request.args.get('q', '').lower().split())[:100]
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SUGGESTIONS))
+    except ValueError:
+        return jsonify({'error': "'limit' must be an integer"}), 400
+    if not 1 <= limit <= MAX_SUGGESTIONS:
+        return jsonify({'error': f"'limit' must be between 1 and {MAX_SUGGESTIONS}"}), 400
+    
+    recommender = current_recommender()
+    if recommender is None:
+        return dataset_loading_response()
+    
+    # Responses are cached already serialized; the generation keeps a
+    # reloaded dataset from being answered with the old names
+    key = (recommender.generation, prefix, limit)
+    body = suggest_cache.get(key)
+    if body is None:
+        suggestions = recommender.suggester.suggest(prefix, limit)
+        body = json.dumps({
+            'query': prefix,
+            'suggestions': [{'ingredient': name, 'recipes': count} for name, count in suggestions]
+        })
+        suggest_cache.put(key, body)
+    
+    response = Response(body, mimetype='application/json')
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
 # Add a simple test HTML page to test image rendering
 @app.route('/test-images-page')
 def test_images_page():
@@ -262,10 +925,43 @@ def test_images_page():
     """
     return html
 
-# Health check endpoint
+# Recommendation result cache counters
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    recommender = current_recommender()
+    stats = query_cache.stats()
+    stats['generation'] = recommender.generation if recommender is not None else None
+    stats['rankings'] = ranking_cache.stats()
+    stats['suggestions'] = suggest_cache.stats()
+    stats['responses'] = response_cache.stats()
+    return jsonify(stats), 200
+
+# Prometheus metrics for this process: stage and route latency histograms,
+# cache, dataset and index counters
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Health check endpoint: liveness plus dataset readiness
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy'}), 200
+    dataset_loader.start()
+    recipe_delta.start()
+    status = dataset_loader.status()
+    return jsonify({'status': 'healthy', 'ready': status['ready'], 'dataset': status,
+                    'ingested': recipe_delta.status()}), 200
+
+# Liveness probe: the process is up and serving requests
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    return jsonify({'status': 'alive'}), 200
+
+# Readiness probe: 503 until a dataset snapshot has been published
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    dataset_loader.start()
+    status = dataset_loader.status()
+    return jsonify({'status': 'ready' if status['ready'] else 'loading', 'dataset': status}), 200 if status['ready'] else 503
 
 # Add root route to handle requests to the root URL
 @app.route('/')
@@ -275,9 +971,19 @@ def root():
         "message": "Recipe Recommendation API is running",
         "endpoints": {
             "/": "Root endpoint with API information",
-            "/api/health": "Health check endpoint",
-            "/api/recommend": "Get recipe recommendations based on ingredients (POST)",
-            "/api/images/<filename>": "Get recipe images",
+            "/api/health": "Health check endpoint with dataset readiness",
+            "/api/health/live": "Liveness probe",
+            "/api/health/ready": "Readiness probe (503 until the dataset is loaded)",
+            "/api/load_data": "Reload the dataset in the background",
+            "/api/recommend": "Get recipe recommendations based on ingredients (POST, optional method=match|tfidf|semantic, limit, cursor, stream, correct, fields, include, exclude, max_ingredients)",
+            "/api/recommend/batch": "Get recommendations for many ingredient lists at once (POST)",
+            "/api/recipes": "Add recipes (POST one recipe, {recipes: [...]}, or application/x-ndjson); searchable within seconds",
+            "/api/recipes/<id>": "Get one recipe (GET, optional ?fields=title,instructions,...)",
+            "/api/ingredients/suggest": "Ingredient autocomplete (GET ?q=<prefix>&limit=<n>)",
+            "/api/cache/stats": "Recommendation cache hit/miss/eviction counters",
+            "/api/metrics": "Prometheus metrics: stage and route latencies, cache and index counters",
+            "/api/images/<filename>": "Get recipe images (optional ?w=<width>&format=webp|jpeg)",
+            "/api/image_manifest/refresh": "Rescan the images directory (POST)",
             "/api/test_images": "Test endpoint to list available images"
         }
     })
@@ -286,36 +992,23 @@ def root():
 def test_api():
     """Test route to check if the dataset is loaded properly"""
     try:
-        # Check dataset status
-        dataset_loaded = recommender.df is not None
-        
-        # If not loaded, try to load it
-        if not dataset_loaded:
-            try:
-                print("Attempting to load dataset...")
-                success = recommender.load_data()
-                if success:
-                    recommender.build_tfidf_model()
-                    dataset_loaded = True
-                    print("Dataset loaded successfully on test!")
-                else:
-                    print("Failed to load dataset during test")
-            except Exception as e:
-                print(f"Error loading dataset during test: {e}", file=sys.stderr)
+        # Check dataset status; loading happens in the background
+        recommender = current_recommender()
+        dataset_loaded = recommender is not None
         
         # Create a test recipe if dataset is loaded
         test_recipe = None
-        if dataset_loaded and recommender.df is not None and len(recommender.df) > 0:
+        if dataset_loaded and len(recommender.store) > 0:
             try:
                 # Get the first recipe as a test
                 test_idx = 0
                 test_recipe = {
                     'id': int(test_idx),
-                    'title': recommender.df.iloc[test_idx]['Title'],
-                    'columns_available': recommender.df.columns.tolist()
+                    'title': recommender.store.value('Title', test_idx),
+                    'columns_available': recommender.store.columns
                 }
             except Exception as e:
-                print(f"Error creating test recipe: {e}", file=sys.stderr)
+                logger.warning("Error creating test recipe: %s", e)
         
         return jsonify({
             'status': 'API is working',
@@ -327,18 +1020,13 @@ def test_api():
         })
         
     except Exception as e:
-        print(f"Error in test API: {e}", file=sys.stderr)
+        logger.exception("Error in test API: %s", e)
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    # Load data on startup (directly, not through the route)
-    try:
-        print("Loading dataset...")
-        recommender.load_data()
-        recommender.build_tfidf_model()
-        print("Dataset loaded successfully!")
-    except Exception as e:
-        print(f"Error loading dataset: {e}")
+    # Load data in the background; /api/health/ready reports when it is done
+    dataset_loader.start()
+    recipe_delta.start()
     
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port) 
\ No newline at end of file
@@ -0,0 +1,2 @@
+# Benchmarks and load tests for the recommender and the Flask API.
+# Run from the backend directory: python -m benchmarks --help
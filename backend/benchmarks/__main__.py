@@ -0,0 +1,224 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+from benchmarks.synthetic import DEFAULT_SAMPLE, generate_dataset, sample_queries
+
+SCRATCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metadata(args):
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'args': {key: value for key, value in vars(args).items() if key != 'func'},
+    }
+
+
+def _datasets(args):
+    """Dataset paths for --dataset, or synthetic datasets for each --recipes size"""
+    if args.dataset:
+        return [args.dataset]
+    return [
+        generate_dataset(os.path.join(SCRATCH_DIR, f"recipes_{n}.csv"), n, args.sample, args.seed)
+        for n in args.recipes
+    ]
+
+
+def _emit(results, output):
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+        print(f"Wrote {output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+def cmd_generate(args):
+    for n in args.recipes:
+        path = os.path.join(SCRATCH_DIR, f"recipes_{n}.csv")
+        if args.output and len(args.recipes) == 1:
+            path = args.output
+        print(generate_dataset(path, n, args.sample, args.seed))
+
+
+def cmd_micro(args):
+    from benchmarks.micro import run_micro
+    results = {'meta': _metadata(args), 'datasets': {}}
+    for path in _datasets(args):
+        print(f"Benchmarking {path}", file=sys.stderr)
+        results['datasets'][os.path.basename(path)] = run_micro(
+            path, n_queries=args.queries, repeat=args.repeat, seed=args.seed, semantic=args.semantic,
+            shards=args.shards
+        )
+    _emit(results, args.output)
+
+
+def cmd_loadtest(args):
+    from benchmarks.loadtest import (
+        FlaskClient, HttpClient, build_requests, load_app, run_burst_test, run_load_test, start_server,
+        stop_server
+    )
+    path = _datasets(args)[0]
+    app_module = load_app(path, query_cache=not args.no_query_cache)
+    recommender = app_module.dataset_loader.current
+    queries = sample_queries(recommender, args.queries, seed=args.seed)
+    image_names = [entry.stem for entry in app_module.image_manifest.entries()]
+    requests = build_requests(queries, image_names, image_share=args.image_share, seed=args.seed)
+    dataset = {'path': path, 'recipes': len(recommender.store)}
+
+    if args.serve:
+        # The same load, then bursts of identical queries, against a fresh
+        # gunicorn per serving mode
+        burst_queries = sample_queries(recommender, args.burst_rounds, seed=args.seed + 1)
+        modes = {}
+        for mode in args.serve:
+            print(f"Starting {mode} server with {args.workers} workers", file=sys.stderr)
+            process, url = start_server(mode, path, workers=args.workers)
+            try:
+                factory = lambda: HttpClient(url)
+                print(f"Load testing {mode} for {args.duration}s", file=sys.stderr)
+                load = run_load_test(factory, requests, concurrency=args.concurrency, duration=args.duration)
+                print(f"Sending {args.burst_rounds} bursts of identical queries to {mode}", file=sys.stderr)
+                burst = run_burst_test(factory, burst_queries, concurrency=args.concurrency,
+                                       rounds=args.burst_rounds)
+            finally:
+                stop_server(process)
+            modes[mode] = {'loadtest': load, 'burst': burst}
+        results = {'dataset': dataset, 'workers': args.workers, 'modes': modes}
+        if 'wsgi' in modes and 'asgi' in modes:
+            results['asgi_vs_wsgi'] = {
+                scenario: {
+                    'throughput_ratio': _ratio(modes['asgi'][scenario]['throughput_rps'],
+                                               modes['wsgi'][scenario]['throughput_rps']),
+                    'p99_ratio': _ratio(modes['asgi'][scenario]['latency'].get('p99_ms'),
+                                        modes['wsgi'][scenario]['latency'].get('p99_ms')),
+                }
+                for scenario in ('loadtest', 'burst')
+            }
+        _emit({'meta': _metadata(args), 'serve': results}, args.output)
+        return
+
+    if args.url:
+        factory = lambda: HttpClient(args.url)
+    else:
+        factory = lambda: FlaskClient(app_module.app)
+    print(f"Load testing {args.url or 'in-process app'} for {args.duration}s", file=sys.stderr)
+    results = run_load_test(factory, requests, concurrency=args.concurrency, duration=args.duration)
+    results['target'] = args.url or 'in-process'
+    results['dataset'] = dataset
+    _emit({'meta': _metadata(args), 'loadtest': results}, args.output)
+
+
+def _ratio(value, baseline):
+    return round(value / baseline, 3) if value and baseline else None
+
+
+def _flatten(value, prefix=''):
+    if isinstance(value, dict):
+        items = {}
+        for key, item in value.items():
+            items.update(_flatten(item, f"{prefix}{key}."))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix[:-1]: value}
+    return {}
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = _flatten({k: v for k, v in json.load(f).items() if k != 'meta'})
+    with open(args.candidate) as f:
+        candidate = _flatten({k: v for k, v in json.load(f).items() if k != 'meta'})
+
+    regressions = []
+    print(f"{'metric':<60} {'baseline':>12} {'candidate':>12} {'ratio':>8}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        if not key.endswith(('_ms', '_rps')):
+            continue
+        old, new = baseline[key], candidate[key]
+        ratio = new / old if old else float('inf')
+        # Latencies regress upwards, throughput downwards
+        worse = ratio > args.threshold if key.endswith('_ms') else ratio < 1 / args.threshold
+        if worse:
+            regressions.append(key)
+        print(f"{key:<60} {old:>12.4f} {new:>12.4f} {ratio:>7.2f}{' !' if worse else ''}")
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.threshold}x", file=sys.stderr)
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description='Benchmarks and load tests for the recipe recommender'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def dataset_options(sub):
+        sub.add_argument('--dataset', help='Recipe CSV to benchmark instead of synthetic data')
+        sub.add_argument('--recipes', type=int, nargs='+', default=[10_000],
+                         help='Synthetic dataset sizes, e.g. 10000 100000 1000000')
+        sub.add_argument('--sample', default=DEFAULT_SAMPLE, help='CSV the synthetic data is modeled on')
+        sub.add_argument('--seed', type=int, default=0)
+        sub.add_argument('--output', help='Write JSON results to this file instead of stdout')
+
+    sub = subparsers.add_parser('generate', help='Write synthetic recipe datasets')
+    dataset_options(sub)
+    sub.set_defaults(func=cmd_generate)
+
+    sub = subparsers.add_parser('micro', help='Load, index and scoring microbenchmarks')
+    dataset_options(sub)
+    sub.add_argument('--queries', type=int, default=200)
+    sub.add_argument('--repeat', type=int, default=3)
+    sub.add_argument('--semantic', action='store_true',
+                     help='Also benchmark the semantic method: IVF index recall and latency against exact search')
+    sub.add_argument('--shards', type=int, nargs='*', default=[],
+                     help='Also benchmark sharded scoring with these shard process counts, e.g. 1 2 4 8')
+    sub.set_defaults(func=cmd_micro)
+
+    sub = subparsers.add_parser('loadtest', help='Concurrent load test of the API')
+    dataset_options(sub)
+    sub.add_argument('--url', help='Base URL of a running server, e.g. http://127.0.0.1:5000 '
+                                   '(default: the app in this process via the Flask test client)')
+    sub.add_argument('--concurrency', type=int, default=8)
+    sub.add_argument('--duration', type=float, default=10.0)
+    sub.add_argument('--queries', type=int, default=1000)
+    sub.add_argument('--image-share', type=float, default=0.3)
+    sub.add_argument('--no-query-cache', action='store_true', help='Disable the recommendation result cache')
+    sub.add_argument('--serve', nargs='+', choices=['wsgi', 'asgi'],
+                     help='Start gunicorn in each of these modes and compare them (sync workers with wsgi.py, '
+                          'uvicorn workers with asgi.py)')
+    sub.add_argument('--workers', type=int, default=2, help='gunicorn workers for --serve')
+    sub.add_argument('--burst-rounds', type=int, default=50,
+                     help='Bursts of identical concurrent queries sent in each --serve mode')
+    sub.set_defaults(func=cmd_loadtest)
+
+    sub = subparsers.add_parser('compare', help='Compare two JSON result files')
+    sub.add_argument('baseline')
+    sub.add_argument('candidate')
+    sub.add_argument('--threshold', type=float, default=1.2, help='Ratio beyond which a metric counts as regressed')
+    sub.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from benchmarks.timing import latency_stats, quiet
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# gunicorn arguments for each serving mode, run from the repository root
+SERVER_MODES = {
+    'wsgi': ['-c', 'gunicorn.conf.py', 'wsgi:application'],
+    'asgi': ['-c', 'gunicorn.conf.py', '-k', 'uvicorn.workers.UvicornWorker', 'asgi:application'],
+}
+
+
+def build_requests(queries, image_names, image_share=0.3, seed=0):
+    """
+    Build a request mix of recommendations and image fetches
+
+    Args:
+        queries (list): Ingredient lists for /api/recommend
+        image_names (list): Image names for /api/images
+        image_share (float): Share of requests that fetch an image
+        seed (int): Random seed
+
+    Returns:
+        list: (label, method, path, JSON body or None) tuples
+    """
+    rng = random.Random(seed)
+    requests = []
+    for query in queries:
+        if image_names and rng.random() < image_share:
+            name = rng.choice(image_names)
+            if rng.random() < 0.5:
+                requests.append(('images', 'GET', f"/api/images/{name}", None))
+            else:
+                requests.append(('images_resized', 'GET', f"/api/images/{name}?w=320", None))
+        else:
+            requests.append(('recommend', 'POST', '/api/recommend', {'ingredients': query}))
+    return requests
+
+
+class FlaskClient:
+    """Sends requests to the app in this process through Flask's test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    """Sends requests to a running server (e.g. a local gunicorn) over keep-alive HTTP"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+
+    def send(self, method, path, body):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method, path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+
+def run_load_test(client_factory, requests, concurrency=8, duration=10.0, max_requests=None):
+    """
+    Drive requests from several threads and measure latency and throughput
+
+    Each thread gets its own client and walks the request list from its own
+    offset, so threads do not send the same request at the same moment.
+
+    Args:
+        client_factory (callable): Returns a new client with a send(method, path, body) method
+        requests (list): Request tuples from build_requests()
+        concurrency (int): Number of client threads
+        duration (float): Seconds to run for
+        max_requests (int): Stop after this many requests in total, if set
+
+    Returns:
+        dict: Overall and per-endpoint latency stats, throughput and error counts
+    """
+    samples = []
+    lock = threading.Lock()
+    sent = [0]
+    deadline = time.perf_counter() + duration
+
+    def worker(offset):
+        client = client_factory()
+        local = []
+        i = offset
+        while time.perf_counter() < deadline:
+            with lock:
+                if max_requests is not None and sent[0] >= max_requests:
+                    break
+                sent[0] += 1
+            label, method, path, body = requests[i % len(requests)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                status = client.send(method, path, body)
+            except Exception as e:
+                status = type(e).__name__
+            local.append((label, time.perf_counter() - start, status))
+        with lock:
+            samples.extend(local)
+
+    step = max(1, len(requests) // concurrency)
+    threads = [threading.Thread(target=worker, args=(n * step,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    with quiet():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return _summarise(samples, time.perf_counter() - started, concurrency)
+
+
+def _summarise(samples, elapsed, concurrency):
+    """Latency stats, throughput and error counts of (label, latency, status) samples"""
+    errors = {}
+    by_label = {}
+    for label, latency, status in samples:
+        by_label.setdefault(label, []).append(latency)
+        if not (isinstance(status, int) and status < 400):
+            key = f"{label}:{status}"
+            errors[key] = errors.get(key, 0) + 1
+
+    return {
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'errors': errors,
+        'latency': latency_stats([latency for _, latency, _ in samples]),
+        'endpoints': {label: latency_stats(values) for label, values in sorted(by_label.items())},
+    }
+
+
+def run_burst_test(client_factory, queries, concurrency=8, rounds=50):
+    """
+    Send bursts of identical recommendation requests
+
+    In each round every thread sends the same query at the same moment, as
+    when many users run a popular search at once. Each round uses another
+    query, so every burst reaches the server uncached.
+
+    Args:
+        client_factory (callable): Returns a new client with a send(method, path, body) method
+        queries (list): Ingredient lists, one per round (reused if fewer)
+        concurrency (int): Number of client threads, i.e. requests per burst
+        rounds (int): Number of bursts
+
+    Returns:
+        dict: Latency stats, throughput and error counts
+    """
+    samples = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency)
+
+    def worker():
+        client = client_factory()
+        local = []
+        for n in range(rounds):
+            body = {'ingredients': queries[n % len(queries)]}
+            barrier.wait()
+            start = time.perf_counter()
+            try:
+                status = client.send('POST', '/api/recommend', body)
+            except Exception as e:
+                status = type(e).__name__
+            local.append(('recommend', time.perf_counter() - start, status))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    with quiet():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    results = _summarise(samples, time.perf_counter() - started, concurrency)
+    results['rounds'] = rounds
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, dataset_path, workers=2, env=None, timeout=600.0):
+    """
+    Start gunicorn serving the app in one of SERVER_MODES and wait until it is ready
+
+    Args:
+        mode (str): 'wsgi' (sync workers) or 'asgi' (uvicorn workers, asgi.py)
+        dataset_path (str): Recipe CSV to serve
+        workers (int): Number of gunicorn workers
+        env (dict): Extra environment variables for the server
+        timeout (float): Seconds to wait for /api/health/ready
+
+    Returns:
+        tuple: (subprocess.Popen, base URL); stop it with stop_server()
+
+    Raises:
+        RuntimeError: If the server exits or is not ready in time
+    """
+    port = _free_port()
+    command = [sys.executable, '-m', 'gunicorn', *SERVER_MODES[mode],
+               '-w', str(workers), '-b', f"127.0.0.1:{port}"]
+    server_env = dict(os.environ, DATASET_PATH=os.path.abspath(dataset_path), **(env or {}))
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=server_env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} server exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/api/health/ready')
+            if connection.getresponse().status == 200:
+                return process, base_url
+        except OSError:
+            pass
+        time.sleep(0.5)
+    stop_server(process)
+    raise RuntimeError(f"{mode} server was not ready after {timeout}s")
+
+
+def stop_server(process):
+    """Stop a server from start_server()"""
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def load_app(dataset_path, query_cache=True):
+    """
+    Import the Flask app in this process, serving ``dataset_path``
+
+    The app reads its configuration from the environment at import time,
+    so this must run before anything else imports ``app``.
+
+    Args:
+        dataset_path (str): Recipe CSV to serve
+        query_cache (bool): Keep the recommendation result cache enabled
+
+    Returns:
+        module: The imported app module with its dataset loaded
+    """
+    os.environ['DATASET_PATH'] = os.path.abspath(dataset_path)
+    if not query_cache:
+        os.environ['QUERY_CACHE_SIZE'] = '0'
+    with quiet():
+        import app as app_module
+        error = app_module.ensure_dataset_loaded()
+    if error:
+        raise RuntimeError(error)
+    return app_module
@@ -0,0 +1,349 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from models.ingredient_index import IngredientIndex
+from models.ingredient_vocabulary import IngredientVocabulary
+from models.compression import compress
+from models.query_cache import QueryCache
+from models.recipe_filter import bitmap_count, parse_constraints
+from models.recipe_payloads import RECIPE_FIELDS, image_url, parse_fields
+from models.recommendation_model import RecipeRecommender
+from benchmarks.synthetic import sample_queries
+from benchmarks.timing import latency_stats, measure, quiet
+
+
+def _per_query(fn, queries):
+    samples = []
+    with quiet():
+        for query in queries:
+            start = time.perf_counter()
+            fn(query)
+            samples.append(time.perf_counter() - start)
+    return latency_stats(samples)
+
+
+def bench_load(dataset_path, cache_dir, repeat=3):
+    """
+    Time parsing the CSV, writing the compiled cache and loading from it
+
+    Args:
+        dataset_path (str): Recipe CSV
+        cache_dir (str): Scratch directory for the compiled cache
+        repeat (int): Runs of the cached load
+
+    Returns:
+        dict: Stage name to latency stats
+    """
+    results = {}
+    parsed = RecipeRecommender(dataset_path, use_cache=False)
+    results['csv_load'] = measure(parsed.load_data)
+
+    def compile_cache():
+        parsed.cache = RecipeRecommender(dataset_path, cache_dir=cache_dir).cache
+        parsed._save_compiled(strict=True)
+    results['compile'] = measure(compile_cache)
+
+    results['cached_load'] = measure(
+        lambda: RecipeRecommender(dataset_path, cache_dir=cache_dir).load_data(), repeat=repeat
+    )
+    return results
+
+
+def bench_index(recommender, repeat=3):
+    """
+    Time building the ingredient index, vocabulary and TF-IDF model
+
+    Args:
+        recommender (RecipeRecommender): Loaded recommender
+        repeat (int): Runs per structure
+
+    Returns:
+        dict: Structure name to latency stats
+    """
+    store = recommender.store
+    ids = range(len(store))
+    raw = store.values('Cleaned_Ingredients', ids)
+    ingredient_lists = [value.lower().split(', ') for value in raw]
+
+    def reset_tfidf():
+        recommender.tfidf_model = None
+        recommender.cache = None
+
+    return {
+        'ingredient_index': measure(lambda: IngredientIndex().build(ingredient_lists), repeat=repeat),
+        'vocabulary': measure(lambda: IngredientVocabulary().build(raw), repeat=repeat),
+        'tfidf_model': measure(recommender.build_tfidf_model, repeat=repeat, setup=reset_tfidf),
+    }
+
+
+def bench_score(recommender, queries, batch_size=100):
+    """
+    Time scoring per query for every method, uncached and cached
+
+    Args:
+        recommender (RecipeRecommender): Loaded recommender with a TF-IDF model
+        queries (list): Ingredient lists
+        batch_size (int): Queries per recommend_batch call
+
+    Returns:
+        dict: Benchmark name to latency stats
+    """
+    results = {
+        'match': _per_query(lambda q: recommender.recommend_recipes_tfidf(q, top_n=10), queries),
+        'tfidf': _per_query(lambda q: recommender.recommend_recipes_cosine(q, top_n=10), queries),
+    }
+
+    cache = recommender.query_cache
+    try:
+        recommender.query_cache = QueryCache(max_size=0)
+        # The semantic method has its own benchmark, bench_semantic
+        for method in ('match', 'tfidf'):
+            samples = []
+            with quiet():
+                for start in range(0, len(queries), batch_size):
+                    batch = queries[start:start + batch_size]
+                    began = time.perf_counter()
+                    recommender.recommend_batch(batch, top_n=10, method=method)
+                    # Per-query cost, comparable with the single-query numbers
+                    samples.extend([(time.perf_counter() - began) / len(batch)] * len(batch))
+            results[f"{method}_batch"] = latency_stats(samples)
+
+        recommender.query_cache = QueryCache(max_size=len(queries) + 1, ttl=0)
+        with quiet():
+            for query in queries:
+                recommender.recommend(query)
+        results['match_cached'] = _per_query(recommender.recommend, queries)
+    finally:
+        recommender.query_cache = cache
+    return results
+
+
+def bench_semantic(recommender, queries, n_probes=(1, 2, 4, 8, 16, 32), top_n=10, n_components=64):
+    """
+    Time the semantic method through the IVF index against exact scoring
+
+    Recall is the share of the exact top_n (every list scored) that the
+    index finds at each n_probe setting.
+
+    Args:
+        recommender (RecipeRecommender): Loaded recommender
+        queries (list): Ingredient lists
+        n_probes (tuple): Inverted lists scored per query, one run each
+        top_n (int): Recipes per query
+        n_components (int): Dimensions of the latent space
+
+    Returns:
+        dict: Build time, exact and per-n_probe latency stats with recall
+    """
+    def rebuild():
+        recommender.semantic_model = None
+        recommender.cache = None
+    results = {'build': measure(lambda: recommender.build_semantic_model(n_components), setup=rebuild)}
+    model = recommender.semantic_model
+    results['lists'] = model.list_count
+    results['tfidf_exact'] = _per_query(lambda q: recommender._rank_tfidf(q, top_n), queries)
+
+    recommender.semantic_n_probe = None
+    exact = [set(recommender._rank_semantic(q, top_n)[0].tolist()) for q in queries]
+    results['exact'] = _per_query(lambda q: recommender._rank_semantic(q, top_n), queries)
+    for n_probe in n_probes:
+        if n_probe >= model.list_count:
+            break
+        recommender.semantic_n_probe = n_probe
+        found = [set(recommender._rank_semantic(q, top_n)[0].tolist()) for q in queries]
+        hits = sum(len(f & e) for f, e in zip(found, exact))
+        stats = _per_query(lambda q: recommender._rank_semantic(q, top_n), queries)
+        stats['recall'] = round(hits / max(1, sum(len(e) for e in exact)), 4)
+        results[f"nprobe_{n_probe}"] = stats
+    return results
+
+
+def bench_sharded(recommender, queries, shard_counts=(1, 2, 4), top_n=10, batch_size=100):
+    """
+    Time 'match' and 'tfidf' scoring in process and across shard processes
+
+    Speedup is the in-process mean latency over the sharded one. It tends
+    to the shard count when as many cores are free and scoring outweighs the
+    message round trip to each shard, i.e. on large catalogues; one shard
+    shows the round trip overhead alone.
+
+    Args:
+        recommender (RecipeRecommender): Loaded recommender with a TF-IDF model
+        queries (list): Ingredient lists
+        shard_counts (tuple): Shard process counts, one run each
+        top_n (int): Recipes per query
+        batch_size (int): Queries per recommend_batch call
+
+    Returns:
+        dict: Per method, in-process and per-shard-count latency stats
+    """
+    rankers = {'match': recommender._rank_match, 'tfidf': recommender._rank_tfidf}
+
+    def run():
+        stats = {}
+        for method, rank in rankers.items():
+            stats[method] = _per_query(lambda q: rank(q, top_n), queries)
+            samples = []
+            for start in range(0, len(queries), batch_size):
+                batch = queries[start:start + batch_size]
+                began = time.perf_counter()
+                recommender.recommend_batch(batch, top_n=top_n, method=method)
+                samples.extend([(time.perf_counter() - began) / len(batch)] * len(batch))
+            stats[f"{method}_batch"] = latency_stats(samples)
+        return stats
+
+    cache = recommender.query_cache
+    results = {'cpus': os.cpu_count()}
+    try:
+        recommender.query_cache = QueryCache(max_size=0)
+        recommender.close()
+        recommender.sharded = None
+        results['in_process'] = baseline = run()
+        for n_shards in shard_counts:
+            start = time.perf_counter()
+            recommender.enable_sharding(n_shards)
+            stats = {'start_seconds': round(time.perf_counter() - start, 3)}
+            for name, run_stats in run().items():
+                run_stats['speedup'] = round(baseline[name]['mean_ms'] / run_stats['mean_ms'], 3)
+                stats[name] = run_stats
+            results[f"shards_{n_shards}"] = stats
+    finally:
+        recommender.close()
+        recommender.sharded = None
+        recommender.query_cache = cache
+    return results
+
+
+def bench_serialize(recommender, queries, limit=10, list_fields='id,title,ingredients,rating,image_name,similarity_score'):
+    """
+    Time serializing result pages from dictionaries and from the payloads
+    serialized at load time, and compare response sizes
+
+    'dicts' is the former path: build recipe dictionaries and encode them
+    like jsonify. Rankings are cached beforehand, so only materialising and
+    encoding a page is timed.
+
+    Args:
+        recommender (RecipeRecommender): Loaded recommender
+        queries (list): Ingredient lists
+        limit (int): Recipes per page
+        list_fields (str): Projection of a results list, without instructions
+
+    Returns:
+        dict: Latency stats per path and mean body sizes in bytes
+    """
+    backend_url = 'http://127.0.0.1:5000'
+    projected = parse_fields(list_fields)
+    cache = recommender.query_cache
+    try:
+        recommender.query_cache = QueryCache(max_size=0)
+        for query in queries:
+            recommender.rank(query)
+
+        def dict_page(query):
+            recipes, total = recommender.recommend_page(query, limit=limit)
+            for recipe in recipes:
+                if recipe.get('image_name'):
+                    recipe['image_url'] = image_url(backend_url, recipe['image_name'])
+            return json.dumps({'recipes': recipes, 'total': total}, sort_keys=True).encode('utf-8')
+
+        def payload_page(query, fields=RECIPE_FIELDS):
+            return recommender.render_page(query, limit=limit, fields=fields, backend_url=backend_url)[0]
+
+        results = {
+            'dicts': _per_query(dict_page, queries),
+            'payloads': _per_query(payload_page, queries),
+            'payloads_projected': _per_query(lambda q: payload_page(q, projected), queries),
+            'payloads_projected_gzip': _per_query(lambda q: compress(payload_page(q, projected), 'gzip'), queries),
+        }
+        bodies = {
+            'full': [payload_page(query) for query in queries],
+            'projected': [payload_page(query, projected) for query in queries],
+        }
+        results['bytes'] = {}
+        for name, pages in bodies.items():
+            results['bytes'][name] = round(sum(len(page) for page in pages) / len(pages))
+            results['bytes'][f"{name}_gzip"] = round(sum(len(compress(page, 'gzip')) for page in pages) / len(pages))
+    finally:
+        recommender.query_cache = cache
+    return results
+
+
+def bench_filter(recommender, queries, top_n=10):
+    """
+    Time constrained queries against the same queries without constraints
+
+    Rankings are computed directly, past the result and ranking caches;
+    the constraint bitmaps of each ingredient are resolved once beforehand,
+    as they stay cached between requests.
+
+    Args:
+        recommender (RecipeRecommender): Loaded recommender with a TF-IDF model
+        queries (list): Ingredient lists
+        top_n (int): Number of recipes to rank
+
+    Returns:
+        dict: Latency stats per method and constraint set, and the share of
+            recipes each set allows
+    """
+    constraint_sets = {
+        'none': None,
+        'exclude_dairy': parse_constraints(exclude=['dairy']),
+        'max_8': parse_constraints(max_ingredients=8),
+        'include_garlic': parse_constraints(include=['garlic']),
+        'narrow': parse_constraints(include=['garlic', 'lemon'], exclude=['nuts', 'dairy'], max_ingredients=12),
+    }
+    results = {'allowed_share': {}}
+    for name, constraints in constraint_sets.items():
+        if constraints is not None:
+            allowed = recommender.filters.allowed(constraints)
+            results['allowed_share'][name] = round(bitmap_count(allowed) / len(recommender.store), 4)
+            results[f"resolve_{name}"] = _per_query(lambda q: recommender.filters.allowed(constraints), queries)
+        for method in ('match', 'tfidf'):
+            results[f"{method}_{name}"] = _per_query(
+                lambda q: recommender._rank(method, q, top_n, constraints), queries
+            )
+    return results
+
+
+def run_micro(dataset_path, n_queries=200, repeat=3, seed=0, semantic=False, shards=()):
+    """
+    Run the load, index and scoring microbenchmarks on one dataset
+
+    Args:
+        dataset_path (str): Recipe CSV
+        n_queries (int): Number of scoring queries
+        repeat (int): Runs for load and index benchmarks
+        seed (int): Random seed for the queries
+        semantic (bool): Also benchmark the semantic method and its index
+        shards (tuple): Shard counts for the sharded scoring benchmark; empty to skip it
+
+    Returns:
+        dict: Results by group ('load', 'index', 'score', 'serialize', 'filter', optionally
+            'semantic' and 'sharded') plus dataset details
+    """
+    cache_dir = tempfile.mkdtemp(prefix='recipe-bench-')
+    try:
+        results = {'load': bench_load(dataset_path, cache_dir, repeat=repeat)}
+        recommender = RecipeRecommender(dataset_path, cache_dir=cache_dir)
+        with quiet():
+            recommender.load_data()
+        results['dataset'] = {
+            'recipes': len(recommender.store),
+            'index_terms': len(recommender.ingredient_index.terms),
+            'canonical_ingredients': len(recommender.vocabulary.terms),
+        }
+        results['index'] = bench_index(recommender, repeat=repeat)
+        queries = sample_queries(recommender, n_queries, seed=seed)
+        results['score'] = bench_score(recommender, queries)
+        results['serialize'] = bench_serialize(recommender, queries)
+        results['filter'] = bench_filter(recommender, queries)
+        if semantic:
+            results['semantic'] = bench_semantic(recommender, queries)
+        if shards:
+            results['sharded'] = bench_sharded(recommender, queries, shard_counts=tuple(shards))
+        return results
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
@@ -0,0 +1,153 @@
+import csv
+import os
+import random
+import re
+import numpy as np
+import pandas as pd
+from models.ingredient_parser import parse_ingredient_list
+
+DEFAULT_SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'recipes_sample.csv')
+
+COLUMNS = ['Unnamed: 0', 'Title', 'Ingredients', 'Instructions', 'Image_Name', 'Cleaned_Ingredients']
+
+# Leading quantity and unit of an ingredient line ("1 1/2 tsp. ", "3/4 cup ")
+_QUANTITY_PREFIX = re.compile(
+    r'^[\d½¼¾⅓⅔⅛/.\s\-]+'
+    r'(?:(?:cups?|tablespoons?|teaspoons?|tbsp\.?|tsp\.?|ounces?|oz\.?|pounds?|lbs?\.?|grams?|g|ml|sticks?|cans?)\s+)?',
+    re.IGNORECASE
+)
+
+
+class SyntheticRecipes:
+    """
+    Generator of recipe datasets shaped like ``recipes_sample.csv``.
+
+    Every distribution is taken from the sample: ingredients per recipe,
+    ingredient lines (sampled with their observed frequencies, so staples
+    like salt and butter stay common and the long tail stays long),
+    quantity/unit prefixes, title words, instructions and image names. A
+    share of lines get a different quantity prefix, so the number of
+    distinct ingredient strings keeps growing with the dataset as it does
+    in real data rather than saturating at the sample's vocabulary.
+    """
+
+    def __init__(self, sample_path=DEFAULT_SAMPLE, seed=0, requantify_rate=0.7):
+        """
+        Args:
+            sample_path (str): Recipe CSV to model the distributions on
+            seed (int): Random seed; the same seed gives the same dataset
+            requantify_rate (float): Share of ingredient lines given a new quantity prefix
+        """
+        sample = pd.read_csv(sample_path)
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        self.requantify_rate = requantify_rate
+
+        self.lengths = []
+        self.lines = []
+        for value in sample['Cleaned_Ingredients']:
+            lines = parse_ingredient_list(value)
+            if lines:
+                self.lengths.append(len(lines))
+                self.lines.extend(lines)
+        self.prefixes = [m.group(0) for m in map(_QUANTITY_PREFIX.match, self.lines) if m]
+        self.title_words = [word for title in sample['Title'].dropna() for word in str(title).split()]
+        self.instructions = sample['Instructions'].dropna().tolist()
+        self.image_names = sample['Image_Name'].dropna().tolist() if 'Image_Name' in sample else ['']
+
+    def _line(self):
+        line = self.rng.choice(self.lines)
+        if self.prefixes and self.rng.random() < self.requantify_rate:
+            match = _QUANTITY_PREFIX.match(line)
+            rest = line[match.end():] if match else line
+            line = self.rng.choice(self.prefixes) + rest
+        return line
+
+    def recipe(self, recipe_id):
+        """
+        Generate one recipe row
+
+        Args:
+            recipe_id (int): Row number, used as the index column
+
+        Returns:
+            list: Values in COLUMNS order
+        """
+        rng = self.rng
+        lines = [self._line() for _ in range(rng.choice(self.lengths))]
+        title = ' '.join(rng.choice(self.title_words) for _ in range(rng.randint(2, 6)))
+        return [recipe_id, title, repr(lines), rng.choice(self.instructions), rng.choice(self.image_names), repr(lines)]
+
+    def write(self, path, n_recipes):
+        """
+        Write a dataset CSV, streaming so that 1M recipes fit in constant memory
+
+        Args:
+            path (str): Output CSV path
+            n_recipes (int): Number of recipes
+
+        Returns:
+            int: Bytes written
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for recipe_id in range(n_recipes):
+                writer.writerow(self.recipe(recipe_id))
+        return os.path.getsize(path)
+
+
+def generate_dataset(path, n_recipes, sample_path=DEFAULT_SAMPLE, seed=0):
+    """
+    Write a synthetic recipe dataset unless an identical one already exists
+
+    Args:
+        path (str): Output CSV path
+        n_recipes (int): Number of recipes (e.g. 10_000, 100_000 or 1_000_000)
+        sample_path (str): Recipe CSV to model the distributions on
+        seed (int): Random seed
+
+    Returns:
+        str: The dataset path
+    """
+    marker = f"{path}.meta"
+    signature = f"{n_recipes} {seed} {os.path.getmtime(sample_path)}"
+    if os.path.exists(path) and os.path.exists(marker):
+        with open(marker) as f:
+            if f.read() == signature:
+                return path
+    size = SyntheticRecipes(sample_path, seed).write(path, n_recipes)
+    with open(marker, 'w') as f:
+        f.write(signature)
+    print(f"Wrote {n_recipes} synthetic recipes to {path} ({size / (1024 * 1024):.1f} MB)")
+    return path
+
+
+def sample_queries(recommender, n_queries, seed=0, max_ingredients=5):
+    """
+    Draw realistic user queries from a loaded recommender's vocabulary
+
+    Ingredients are canonical names drawn in proportion to the number of
+    recipes using them, 1 to ``max_ingredients`` per query.
+
+    Args:
+        recommender (RecipeRecommender): Loaded recommender
+        n_queries (int): Number of queries
+        seed (int): Random seed
+        max_ingredients (int): Largest query size
+
+    Returns:
+        list: Ingredient lists
+    """
+    vocabulary = recommender.vocabulary
+    rng = np.random.default_rng(seed)
+    weights = vocabulary.document_frequency / vocabulary.document_frequency.sum()
+    queries = []
+    for _ in range(n_queries):
+        size = int(rng.integers(1, max_ingredients + 1))
+        ids = rng.choice(len(vocabulary.terms), size=size, p=weights)
+        queries.append([vocabulary.terms[i] for i in ids])
+    return queries
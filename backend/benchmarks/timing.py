@@ -0,0 +1,58 @@
+import contextlib
+import io
+import time
+import numpy as np
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the recommender's progress prints while measuring"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def latency_stats(samples):
+    """
+    Summarise latency samples
+
+    Args:
+        samples (list): Durations in seconds
+
+    Returns:
+        dict: Count, mean, p50/p95/p99 and max in milliseconds
+    """
+    if not len(samples):
+        return {'count': 0}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'count': len(ms),
+        'mean_ms': round(float(ms.mean()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'max_ms': round(float(ms.max()), 4),
+    }
+
+
+def measure(fn, repeat=1, setup=None):
+    """
+    Time a function over several runs
+
+    Args:
+        fn (callable): Function to time, called without arguments
+        repeat (int): Number of runs
+        setup (callable): Called before each run, outside the timing
+
+    Returns:
+        dict: latency_stats of the runs
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with quiet():
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+    return latency_stats(samples)
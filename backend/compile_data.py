@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+from models.dataset_cache import DatasetCache
+from models.recommendation_model import RecipeRecommender
+
+def compile_data(dataset_path, cache_dir=None):
+    """
+    Compile a recipe CSV into the binary cache read by RecipeRecommender.load_data
+    
+    Args:
+        dataset_path (str): Path to the recipe dataset CSV
+        cache_dir (str): Output directory; defaults to ``<dataset>.compiled``
+        
+    Returns:
+        bool: True if the cache was written
+    """
+    # Parse from the CSV regardless of what is already cached
+    recommender = RecipeRecommender(dataset_path, use_cache=False)
+    start = time.time()
+    if not recommender.load_data():
+        return False
+    recommender.build_tfidf_model()
+    print(f"Parsed and indexed {len(recommender.store)} recipes in {time.time() - start:.2f}s")
+    
+    recommender.cache = DatasetCache(dataset_path, cache_dir)
+    recommender._save_compiled(strict=True)
+    recommender.cache.save('tfidf', *recommender.tfidf_model.to_arrays())
+    print(f"Wrote compiled dataset to {recommender.cache.cache_dir}")
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"Usage: python {os.path.basename(__file__)} <dataset.csv> [cache_dir]")
+        sys.exit(1)
+    success = compile_data(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+from models.image_manifest import ImageManifest
+from models.image_variants import ImageVariants
+
+def generate_images(images_dir, cache_dir):
+    """
+    Pre-render every size and format of the recipe images served by /api/images
+    
+    Args:
+        images_dir (str): Directory containing the recipe images
+        cache_dir (str): Directory to write the variants to
+        
+    Returns:
+        bool: True if the variants were generated
+    """
+    manifest = ImageManifest(images_dir)
+    count = manifest.refresh()
+    if not count:
+        print(f"No images found in {images_dir}")
+        return False
+    
+    variants = ImageVariants(cache_dir)
+    if not variants.available:
+        print("Pillow is not installed; install it to generate image variants")
+        return False
+    
+    start = time.time()
+    written = variants.pregenerate(manifest.entries())
+    print(f"Prepared {written} variants of {count} images in {cache_dir} in {time.time() - start:.1f}s")
+    return True
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    images_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base_dir, 'Food Images', 'Food Images')
+    cache_dir = sys.argv[2] if len(sys.argv) > 2 else os.environ.get(
+        'IMAGE_CACHE_DIR', os.path.join(base_dir, 'Food Images', 'variants')
+    )
+    sys.exit(0 if generate_images(images_dir, cache_dir) else 1)
@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import time
+from models.recipe_journal import CHUNK_SIZE, RecipeJournal, iter_recipe_chunks
+
+def ingest_recipes(jsonl_file, dataset_path, journal_path=None, chunk_size=CHUNK_SIZE, compact=False):
+    """
+    Import recipes from a JSON Lines file into the ingestion journal
+
+    Recipes are parsed and journaled a chunk at a time, so the file is
+    never held in memory; running servers pick them up from the journal
+    within seconds. Each line is a recipe as accepted by POST /api/recipes.
+
+    Args:
+        jsonl_file (file): Open JSON Lines file
+        dataset_path (str): Path to the recipe dataset CSV
+        journal_path (str): Journal file; defaults to ``<dataset>.ingested.jsonl``
+        chunk_size (int): Recipes per chunk
+        compact (bool): Append the journal to the CSV afterwards
+
+    Returns:
+        bool: True if every recipe was imported
+    """
+    journal = RecipeJournal(journal_path or f"{dataset_path}.ingested.jsonl", dataset_path)
+    start = time.time()
+    imported = 0
+    try:
+        for chunk in iter_recipe_chunks(jsonl_file, chunk_size):
+            ids = journal.append(chunk)
+            imported += len(ids)
+            print(f"Imported {imported} recipes (ids up to {ids[-1]})")
+    except ValueError as e:
+        print(f"Stopped after {imported} recipes: {e}")
+        return False
+    print(f"Imported {imported} recipes into {journal.path} in {time.time() - start:.2f}s")
+
+    if compact:
+        compacted = journal.compact()
+        print(f"Appended {compacted} recipes to {dataset_path}")
+    return True
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Import recipes from JSON Lines without rebuilding the dataset')
+    parser.add_argument('jsonl', help="JSON Lines file of recipes, or '-' for stdin")
+    parser.add_argument('--dataset', default=os.environ.get(
+        'DATASET_PATH', os.path.join(base_dir, 'Food Ingredients and Recipe Dataset with Image Name Mapping.csv')
+    ))
+    parser.add_argument('--journal', default=os.environ.get('INGEST_JOURNAL_PATH'))
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--compact', action='store_true',
+                        help='Append the journal to the dataset CSV now instead of leaving it to the servers')
+    args = parser.parse_args()
+
+    jsonl_file = sys.stdin if args.jsonl == '-' else open(args.jsonl, encoding='utf-8')
+    with jsonl_file:
+        success = ingest_recipes(jsonl_file, args.dataset, args.journal, args.chunk_size, args.compact)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,386 @@
+import asyncio
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from models.metrics import metrics
+
+metrics.describe('http_coalesced_requests_total', 'counter',
+                 'Requests answered with the result of an identical request already running')
+
+
+# Bytes read per step of a file response; each step is a hop to the thread pool
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class FileWrapper:
+    """
+    ``wsgi.file_wrapper`` of AsyncWsgiApp: iterates a file in large blocks
+
+    Reads at least STREAM_BLOCK_SIZE bytes per block, whatever the app asks
+    for, since AsyncWsgiApp reads each block on the thread pool. Seekable
+    like werkzeug's own wrapper, so a Range request seeks to its start
+    instead of reading and discarding everything before it.
+    """
+
+    def __init__(self, file, block_size=8192):
+        self.file = file
+        self.block_size = max(block_size, STREAM_BLOCK_SIZE)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        block = self.file.read(self.block_size)
+        if not block:
+            raise StopIteration()
+        return block
+
+    def seekable(self):
+        return hasattr(self.file, 'seekable') and self.file.seekable()
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ReceiveStream(io.RawIOBase):
+    """
+    ``wsgi.input`` of AsyncWsgiApp: the request body as the client sends it
+
+    Read on a pool thread; each read that needs more data waits for the next
+    body message from ASGI ``receive`` on the event loop, so a large upload
+    (NDJSON ingestion) is never held in memory as a whole.
+    """
+
+    def __init__(self, receive, loop):
+        """
+        Args:
+            receive (callable): ASGI receive of the request
+            loop (asyncio.AbstractEventLoop): Loop serving the request
+        """
+        super().__init__()
+        self._receive = receive
+        self._loop = loop
+        self._pending = memoryview(b'')
+        self._more_body = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and self._more_body:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                self._more_body = False
+                raise OSError("Client disconnected before sending the whole request body")
+            self._pending = memoryview(message.get('body', b''))
+            self._more_body = message.get('more_body', False)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class RequestCoalescer:
+    """
+    Runs one computation per key at a time and shares its result.
+
+    The first caller for a key runs the computation; callers arriving with
+    the same key while it runs wait for it and receive the same result (or
+    exception) instead of starting their own. Once it finishes the key is
+    forgotten: results are not cached here, that is the caches' job.
+    Belongs to one event loop.
+    """
+
+    def __init__(self):
+        self._running = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def run(self, key, compute):
+        """
+        Result of ``compute()`` for ``key``, shared with concurrent callers
+
+        Args:
+            key: Hashable identity of the computation
+            compute (callable): Returns an awaitable of the result
+
+        Returns:
+            tuple: (result, whether it came from another caller's computation)
+        """
+        task = self._running.get(key)
+        if task is not None:
+            self.followers += 1
+            shared = True
+        else:
+            # A task of its own, so the first caller going away does not
+            # cancel the computation the others wait for
+            task = asyncio.ensure_future(compute())
+            self._running[key] = task
+            task.add_done_callback(lambda _: self._running.pop(key, None))
+            self.leaders += 1
+            shared = False
+        return await asyncio.shield(task), shared
+
+    def stats(self):
+        """Computations started, requests that joined one, and computations in flight"""
+        return {'leaders': self.leaders, 'followers': self.followers, 'in_flight': len(self._running)}
+
+
+class AsyncWsgiApp:
+    """
+    ASGI application serving a WSGI app (the Flask app) from an event loop.
+
+    Each request's WSGI call runs on a thread pool, so CPU-bound work such as
+    scoring never blocks the loop, which keeps accepting and answering other
+    connections meanwhile. The request body is read from the client as the
+    app reads ``wsgi.input`` (see ReceiveStream). Response bodies are pulled
+    from the WSGI iterable a chunk at a time on the pool and sent as they
+    come, so streamed NDJSON stays streamed and files from send_file
+    (images) are sent as the client takes them: a slow client holds a
+    connection, not a thread.
+
+    Requests accepted by ``coalescing`` are coalesced: while one is being
+    answered, identical requests wait for its response instead of computing
+    their own (see RequestCoalescer). Their bodies and responses are
+    buffered in full, so it must only accept small, non-streamed requests.
+    """
+
+    def __init__(self, wsgi_app, max_threads=None, coalescing=None):
+        """
+        Args:
+            wsgi_app (callable): WSGI application
+            max_threads (int): Size of the thread pool running WSGI calls;
+                defaults to ThreadPoolExecutor's
+            coalescing: Chooses the requests to coalesce, with a
+                ``candidate(scope)`` method telling whether a request may be
+                (its body is then read in full) and a ``key(scope, body)``
+                method returning a hashable key for it, or None after all;
+                see RecommendCoalescing
+        """
+        self.wsgi_app = wsgi_app
+        self.max_threads = max_threads
+        self.coalescing = coalescing
+        self.coalescer = RequestCoalescer()
+        self._executor = None
+        self._pid = None
+
+    @property
+    def executor(self):
+        # Pool threads do not survive a fork (gunicorn workers): one pool per process
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix='asgi-wsgi')
+            self._pid = os.getpid()
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type '{scope['type']}'")
+
+        if self.coalescing is None or not self.coalescing.candidate(scope):
+            await self._respond(scope, ReceiveStream(receive, asyncio.get_running_loop()), send)
+            return
+        body = await self._read_body(receive)
+        if body is None:
+            # The client went away before sending the whole request
+            return
+        key = self.coalescing.key(scope, body)
+        if key is None:
+            await self._respond(scope, io.BytesIO(body), send)
+            return
+
+        (status, headers, content), shared = await self.coalescer.run(key, lambda: self._buffered(scope, body))
+        if shared:
+            metrics.inc('http_coalesced_requests_total', route=scope['path'])
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._executor is not None and self._pid == os.getpid():
+                    self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    def _environ(self, scope, body):
+        """
+        PEP 3333 environ for an ASGI HTTP scope
+
+        Args:
+            scope (dict): ASGI HTTP scope
+            body: File-like request body, read to its end
+        """
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        root_path = scope.get('root_path', '')
+        path = scope['path']
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+            'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1] or 80),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BufferedReader(body) if isinstance(body, io.RawIOBase) else body,
+            # The body ends where the client's does, so chunked uploads
+            # without a Content-Length are read too
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': FileWrapper,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _start(self, environ):
+        """
+        Call the WSGI app up to its first body chunk (on the pool)
+
+        Returns:
+            tuple: (status, headers, first chunk or None, (iterator, iterable))
+        """
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        iterable = self.wsgi_app(environ, start_response)
+        iterator = iter(iterable)
+        # Generator bodies call start_response on their first step at the latest
+        first = next(iterator, None)
+        status, headers = started
+        # ASGI servers send their own Date header; send_file's would repeat it
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                   for name, value in headers if name.lower() != 'date']
+        return int(status.split(' ', 1)[0]), headers, first, (iterator, iterable)
+
+    @staticmethod
+    def _next_chunk(iterable):
+        return next(iterable[0], None)
+
+    @staticmethod
+    def _close(iterable):
+        if hasattr(iterable[1], 'close'):
+            iterable[1].close()
+
+    async def _respond(self, scope, body, send):
+        """Run the WSGI app on the pool and stream its response"""
+        loop = asyncio.get_running_loop()
+        status, headers, chunk, iterable = await loop.run_in_executor(
+            self.executor, self._start, self._environ(scope, body)
+        )
+        try:
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, self._next_chunk, iterable)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Closing runs Flask's teardown and closes files
+            await loop.run_in_executor(self.executor, self._close, iterable)
+
+    async def _buffered(self, scope, body):
+        """Run the WSGI app on the pool and return its whole response"""
+        def call():
+            status, headers, chunk, iterable = self._start(self._environ(scope, io.BytesIO(body)))
+            chunks = []
+            try:
+                while chunk is not None:
+                    chunks.append(chunk)
+                    chunk = self._next_chunk(iterable)
+            finally:
+                self._close(iterable)
+            return status, headers, b''.join(chunks)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+
+class RecommendCoalescing:
+    """
+    Coalescing for AsyncWsgiApp: identical non-streamed POST /api/recommend requests
+
+    Requests are identical when their JSON bodies are equal (whatever the
+    key order or spacing), and so are the scheme, mount point (root path),
+    query string and the headers in HEADERS. Only bodies with a Content-Length of at most ``max_body``
+    bytes are considered, so that buffering them costs little.
+    """
+
+    # Request headers a /api/recommend response depends on: the backend URL
+    # in image URLs, CORS, streaming and the content coding
+    HEADERS = (b'host', b'origin', b'accept', b'accept-encoding', b'content-type')
+
+    def __init__(self, max_body=64 * 1024):
+        """
+        Args:
+            max_body (int): Largest request body to coalesce, in bytes
+        """
+        self.max_body = max_body
+
+    def candidate(self, scope):
+        """Whether the request may be coalesced, judging by its scope alone"""
+        if scope['method'] != 'POST' or scope['path'] != '/api/recommend':
+            return False
+        for name, value in scope.get('headers', []):
+            if name == b'content-length':
+                return value.isdigit() and int(value) <= self.max_body
+        return False
+
+    def key(self, scope, body):
+        """
+        Coalescing key of a candidate request
+
+        Returns:
+            tuple: The key, or None if the request must not be coalesced
+        """
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        query_string = scope.get('query_string', b'')
+        if not isinstance(data, dict) or data.get('stream') or b'stream=' in query_string:
+            return None
+        headers = tuple(sorted((name, value) for name, value in scope.get('headers', []) if name in self.HEADERS))
+        if any(name == b'accept' and b'application/x-ndjson' in value for name, value in headers):
+            return None
+        # Image URLs are built from the scheme, host and mount point
+        return (scope.get('scheme', 'http'), scope.get('root_path', ''), scope['path'], query_string, headers,
+                json.dumps(data, sort_keys=True, separators=(',', ':')))
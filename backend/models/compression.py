@@ -0,0 +1,55 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; without it only gzip is offered
+    brotli = None
+
+# Content codings offered to clients, preferred first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Smaller bodies are sent as they are: the saving would not pay for the
+# compression or the client's decompression
+MIN_COMPRESS_SIZE = 1024
+
+# Mid-range levels: most of the size reduction at a fraction of the CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def negotiate_encoding(accept_encodings, size):
+    """
+    Choose the content coding for a response body
+
+    Args:
+        accept_encodings (werkzeug.datastructures.Accept): The request's
+            parsed Accept-Encoding header
+        size (int): Size of the uncompressed body in bytes
+
+    Returns:
+        str: 'br' or 'gzip', or None to send the body uncompressed
+    """
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def compress(body, encoding):
+    """
+    Compress a body with a coding returned by negotiate_encoding()
+
+    The output only depends on the input (gzip headers carry no timestamp),
+    so compressed bodies can be cached and compared.
+
+    Args:
+        body (bytes): Uncompressed body
+        encoding (str): 'br' or 'gzip'
+
+    Returns:
+        bytes: The compressed body
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported content coding '{encoding}'")
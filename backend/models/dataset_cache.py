@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the on-disk layout of any part changes
+FORMAT_VERSION = 3
+
+
+def pack_strings(strings):
+    """
+    Pack strings into a string table: one UTF-8 blob plus an offsets array
+
+    Each string is stored NUL-terminated, so string ``i`` is
+    ``blob[offsets[i]:offsets[i + 1] - 1]`` and the whole table can also be
+    decoded in a single pass. Missing values (None/NaN) are stored as empty
+    strings; callers that need to tell them apart keep a separate mask.
+
+    Args:
+        strings (list): Strings to pack
+
+    Returns:
+        tuple: (uint8 blob array, int64 offsets array of length len(strings) + 1)
+    """
+    encoded = [
+        s.replace('\x00', '').encode('utf-8') + b'\x00' if isinstance(s, str) else b'\x00'
+        for s in strings
+    ]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def unpack_strings(blob, offsets):
+    """
+    Decode a whole string table packed with pack_strings()
+
+    Args:
+        blob (numpy.ndarray): uint8 blob
+        offsets (numpy.ndarray): Offsets array
+
+    Returns:
+        list: The strings, in order
+    """
+    if len(offsets) <= 1:
+        return []
+    return blob.tobytes().decode('utf-8').split('\x00')[:-1]
+
+
+def read_string(blob, offsets, i):
+    """Decode string ``i`` of a string table without touching the others"""
+    return blob[offsets[i]:offsets[i + 1] - 1].tobytes().decode('utf-8')
+
+
+def dataframe_to_arrays(df):
+    """
+    Export a DataFrame of numeric and string columns as flat arrays
+
+    Args:
+        df (pandas.DataFrame): DataFrame to export
+
+    Returns:
+        tuple: (dict of numpy arrays, dict of JSON-serialisable metadata)
+    """
+    arrays = {}
+    kinds = []
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            arrays[f"col{i}"] = values.to_numpy()
+            kinds.append('numeric')
+        else:
+            arrays[f"col{i}_blob"], arrays[f"col{i}_offsets"] = pack_strings(values.tolist())
+            arrays[f"col{i}_null"] = values.isna().to_numpy()
+            kinds.append('string')
+    return arrays, {'columns': [str(c) for c in df.columns], 'kinds': kinds}
+
+
+class DatasetCache:
+    """
+    Binary artifacts derived from a source CSV, stored as ``.npy`` files.
+
+    The cache is split into named parts (e.g. the parsed dataset, the
+    ingredient index, the TF-IDF model), each in its own directory with a
+    ``meta.json`` recording the source file fingerprint. A part is only used
+    while it matches the source: size and mtime are checked first, and a
+    SHA-256 of the contents decides when only the mtime changed (e.g. after
+    a fresh checkout). Parts are written to a temporary directory and then
+    renamed into place, so concurrent workers never see a partial part.
+    """
+
+    def __init__(self, source_path, cache_dir=None):
+        """
+        Args:
+            source_path (str): Path to the source CSV
+            cache_dir (str): Cache directory; defaults to ``<source>.compiled``
+                next to the source file
+        """
+        self.source_path = source_path
+        self.cache_dir = cache_dir or os.path.splitext(source_path)[0] + '.compiled'
+        self._sha256 = None
+
+    def _stat(self):
+        stat = os.stat(self.source_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _source_sha256(self):
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            with open(self.source_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    def _is_fresh(self, source):
+        current = self._stat()
+        if source.get('size') != current['size']:
+            return False
+        if source.get('mtime_ns') == current['mtime_ns']:
+            return True
+        return source.get('sha256') == self._source_sha256()
+
+    def load(self, part, mmap=True):
+        """
+        Load a part if it exists and is fresh
+
+        Args:
+            part (str): Part name
+            mmap (bool): Memory-map the arrays instead of reading them into memory
+
+        Returns:
+            tuple: (dict of arrays, metadata dict), or None if missing or stale
+        """
+        part_dir = os.path.join(self.cache_dir, part)
+        try:
+            with open(os.path.join(part_dir, 'meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('format_version') != FORMAT_VERSION or not self._is_fresh(meta['source']):
+                return None
+            arrays = {name: self._load_array(os.path.join(part_dir, f"{name}.npy"), mmap) for name in meta['arrays']}
+            return arrays, meta['meta']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @staticmethod
+    def _load_array(path, mmap):
+        if not mmap:
+            return np.load(path)
+        try:
+            # A plain ndarray view over the mapping avoids numpy.memmap's
+            # per-slice overhead on the hot path
+            return np.load(path, mmap_mode='r').view(np.ndarray)
+        except ValueError:
+            # Empty arrays cannot be memory-mapped
+            return np.load(path)
+
+    def save(self, part, arrays, meta=None):
+        """
+        Write a part atomically, replacing any previous version
+
+        Args:
+            part (str): Part name
+            arrays (dict): Arrays to store, by name
+            meta (dict): Extra JSON-serialisable metadata returned by load()
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        source = self._stat()
+        source['sha256'] = self._source_sha256()
+        tmp_dir = tempfile.mkdtemp(prefix=f".{part}-", dir=self.cache_dir)
+        try:
+            # mkdtemp creates owner-only directories; workers may run as other users
+            os.chmod(tmp_dir, 0o755)
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump({
+                    'format_version': FORMAT_VERSION,
+                    'source': source,
+                    'arrays': list(arrays),
+                    'meta': meta or {},
+                }, f)
+            # Move any previous version aside first: a directory can only be
+            # renamed over an empty one
+            part_dir = os.path.join(self.cache_dir, part)
+            stale_dir = None
+            if os.path.exists(part_dir):
+                stale_dir = tempfile.mkdtemp(prefix=f".{part}-stale-", dir=self.cache_dir)
+                os.replace(part_dir, os.path.join(stale_dir, part))
+            os.replace(tmp_dir, part_dir)
+            if stale_dir:
+                shutil.rmtree(stale_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def try_save(self, part, arrays, meta=None):
+        """Like save(), but report failures (e.g. a read-only filesystem) instead of raising"""
+        try:
+            self.save(part, arrays, meta)
+            return True
+        except Exception as e:
+            logger.warning("Could not write dataset cache part '%s': %s", part, e)
+            return False
@@ -0,0 +1,218 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetLoader:
+    """
+    Builds the recommender in a background thread and publishes it atomically.
+
+    ``factory`` returns a fully loaded recommender (store, indexes and
+    models), which is treated as an immutable snapshot once published:
+    ``current`` is a plain attribute read, and a reload builds a complete new
+    snapshot off the request path before replacing the reference in one
+    assignment. Requests that already hold the old snapshot finish with it;
+    its ``close()``, if it has one, is called once the new one is published.
+
+    Reloads are triggered explicitly with ``reload()`` or, when a poll
+    interval is set, by a change in the size or mtime of a watched file.
+    Triggers that arrive during a build are coalesced into one more build;
+    builds never overlap, so snapshots are published in the order they
+    were started.
+    Threads do not survive ``fork``, so ``start()`` is safe to call again in
+    each gunicorn worker.
+    """
+
+    def __init__(self, factory, watch_paths=(), poll_interval=0):
+        """
+        Args:
+            factory (callable): Returns a loaded recommender, or raises
+            watch_paths (iterable): Files whose changes trigger a reload
+            poll_interval (float): Seconds between checks of the watched
+                files; 0 disables watching
+        """
+        self.factory = factory
+        self.watch_paths = list(watch_paths)
+        self.poll_interval = poll_interval
+        self.current = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.last_error = None
+        self.reloads = 0
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        # Notified when a build and any builds queued behind it are done
+        self._idle = threading.Condition(self._lock)
+        self._loading = False
+        self._pending = False
+        self._pid = None
+        self._watcher = None
+        self._signature = None
+
+    @property
+    def ready(self):
+        """Whether a snapshot has been published"""
+        return self.current is not None
+
+    @property
+    def loading(self):
+        """Whether a build is in progress"""
+        return self._loading
+
+    def start(self):
+        """
+        Start the initial load (unless already loaded) and the file watcher
+
+        Returns immediately; safe to call repeatedly and after a fork.
+        """
+        pid = os.getpid()
+        with self._lock:
+            if self._pid == pid:
+                return
+            # Either never started or forked: threads from the parent are gone
+            self._pid = pid
+            self._loading = False
+            self._pending = False
+        if self.current is None:
+            self.reload()
+        if self.poll_interval and self.watch_paths:
+            self._signature = self._watch_signature()
+            self._watcher = threading.Thread(target=self._watch, name='dataset-watcher', daemon=True)
+            self._watcher.start()
+
+    def reload(self):
+        """
+        Build a new snapshot in the background
+
+        Returns:
+            bool: True if a build was started, False if one is running and
+                this request was queued behind it
+        """
+        with self._lock:
+            if self._loading:
+                self._pending = True
+                return False
+            self._loading = True
+        threading.Thread(target=self._run, name='dataset-loader', daemon=True).start()
+        return True
+
+    def load_now(self):
+        """
+        Build and publish a snapshot in the calling thread
+
+        For startup code that should not serve before the data is loaded,
+        such as the gunicorn master with preload_app. If a build is already
+        running, waits for it to finish first.
+
+        Returns:
+            bool: True if a snapshot was published
+        """
+        with self._lock:
+            while self._loading:
+                self._idle.wait()
+            self._loading = True
+        try:
+            return self._build()
+        finally:
+            if self._finish():
+                threading.Thread(target=self._run, name='dataset-loader', daemon=True).start()
+
+    def wait_ready(self, timeout=None):
+        """
+        Block until a snapshot is published
+
+        Args:
+            timeout (float): Seconds to wait at most
+
+        Returns:
+            bool: Whether a snapshot is available
+        """
+        self._ready.wait(timeout)
+        return self.ready
+
+    def _run(self):
+        while True:
+            self._build()
+            if not self._finish():
+                return
+
+    def _finish(self):
+        """
+        End a build, once its snapshot is published
+
+        Returns:
+            bool: True if a build was queued behind it and must run next;
+                the loader then stays marked as loading
+        """
+        with self._lock:
+            if self._pending:
+                self._pending = False
+                return True
+            self._loading = False
+            self._idle.notify_all()
+            return False
+
+    def _build(self):
+        start = time.perf_counter()
+        try:
+            snapshot = self.factory()
+        except Exception as e:
+            self.last_error = str(e)
+            logger.exception("Dataset load failed: %s", e)
+            return False
+
+        # Publish: one reference assignment, never a partially built snapshot
+        previous = self.current
+        self.current = snapshot
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - start
+        self.last_error = None
+        self.reloads += 1
+        self._ready.set()
+        logger.info("Dataset snapshot published in %.2fs", self.load_seconds)
+        if previous is not None and hasattr(previous, 'close'):
+            # Release what the old snapshot holds outside the heap, such as
+            # scoring processes; requests still using it keep working
+            previous.close()
+        return True
+
+    def _watch_signature(self):
+        signature = []
+        for path in self.watch_paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return signature
+
+    def _watch(self):
+        while self._pid == os.getpid():
+            time.sleep(self.poll_interval)
+            signature = self._watch_signature()
+            if signature != self._signature:
+                self._signature = signature
+                logger.info("Dataset file changed; reloading")
+                self.reload()
+
+    def status(self):
+        """
+        Loader state for health checks
+
+        Returns:
+            dict: Readiness, load timing, reload count and last error
+        """
+        snapshot = self.current
+        return {
+            'ready': snapshot is not None,
+            'loading': self._loading,
+            'generation': getattr(snapshot, 'generation', None),
+            'recipes': len(snapshot.store) if snapshot is not None else 0,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+        }
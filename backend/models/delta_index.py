@@ -0,0 +1,308 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+from sklearn.preprocessing import normalize
+from models.ingredient_index import IngredientIndex
+from models.ingredient_parser import canonicalize, parse_ingredient_list
+from models.ranking import select_top_k
+from models.recipe_filter import constraint_mask
+
+logger = logging.getLogger(__name__)
+
+
+class DeltaSegment:
+    """
+    Immutable, in-memory index of the recipes ingested since the dataset was compiled.
+
+    Holds the recipes with ids ``first_id`` up to ``end_id`` (exclusive)
+    and an IngredientIndex over them, and ranks them for each method the
+    way the main snapshot ranks its own recipes: 'match' with the same
+    match ratio, 'tfidf' and 'semantic' in the term space and latent space
+    of the snapshot's models, so scores of both are comparable and the two
+    rankings can be merged. Recipes below ``min_id`` are skipped, as the
+    snapshot asking already holds them.
+    """
+
+    def __init__(self, first_id, recipes):
+        """
+        Args:
+            first_id (int): Id of the first recipe
+            recipes (list): Recipes keyed by dataset column, in id order
+        """
+        self.first_id = first_id
+        self.recipes = recipes
+        self.ingredient_lists = [recipe['Cleaned_Ingredients'].lower().split(', ') for recipe in recipes]
+        self.ingredient_index = IngredientIndex().build(self.ingredient_lists)
+        self._tfidf = None
+        self._semantic = None
+        self._names = None
+
+    def __len__(self):
+        return len(self.recipes)
+
+    @property
+    def end_id(self):
+        return self.first_id + len(self.recipes)
+
+    def recipe(self, recipe_id):
+        """The recipe with this id, or None if the segment does not hold it"""
+        position = recipe_id - self.first_id
+        return self.recipes[position] if 0 <= position < len(self.recipes) else None
+
+    def allowed(self, constraints):
+        """
+        Which of the segment's recipes satisfy query constraints
+
+        Recipes are checked one by one against their canonical ingredient
+        names, with the same word matching as IngredientBitmaps.
+
+        Args:
+            constraints (RecipeConstraints): Constraints, or None
+
+        Returns:
+            numpy.ndarray: One boolean per recipe, or None if nothing is constrained
+        """
+        if constraints is None:
+            return None
+        if self._names is None:
+            self._names = [
+                {name for name in map(canonicalize, parse_ingredient_list(recipe['Cleaned_Ingredients'])) if name}
+                for recipe in self.recipes
+            ]
+        return constraint_mask(self._names, [len(names) for names in self._names], constraints)
+
+    def _top_k(self, scores, top_n, min_id, allowed=None):
+        ids = np.arange(self.first_id, self.end_id, dtype=np.int64)
+        if min_id > self.first_id:
+            scores = np.where(ids >= min_id, scores, 0)
+        if allowed is not None:
+            scores = np.where(allowed, scores, 0)
+        return select_top_k(scores, top_n, ids)
+
+    def rank_match(self, user_ingredients, top_n, min_id=0, allowed=None):
+        """
+        Best recipes by match ratio, as RecipeRecommender._rank_match
+
+        Args:
+            allowed (numpy.ndarray): Recipes that may be returned, from allowed()
+
+        Returns:
+            tuple: (recipe ids, scores), best first
+        """
+        candidates, matches = self.ingredient_index.match_counts(user_ingredients)
+        scores = np.zeros(len(self))
+        if len(candidates):
+            scores[candidates] = matches / self.ingredient_index.recipe_lengths[candidates]
+        return self._top_k(scores, top_n, min_id, allowed)
+
+    def rank_tfidf(self, model, user_ingredients, top_n, min_id=0, allowed=None):
+        """
+        Best recipes by TF-IDF cosine similarity in ``model``'s term space
+
+        Words the model has never seen are ignored, as in queries.
+
+        Returns:
+            tuple: (recipe ids, scores), best first
+        """
+        cached = self._tfidf
+        if cached is None or cached[0] is not model:
+            # Same weighting as the model's own rows: sublinear tf, idf, L2 norm
+            cached = self._tfidf = (model, model.transform(self.ingredient_lists).tocsc())
+        columns, weights = model.query_vector(user_ingredients)
+        if not len(columns):
+            return self._top_k(np.zeros(len(self)), top_n, min_id)
+        return self._top_k(cached[1][:, columns] @ weights, top_n, min_id, allowed)
+
+    def rank_semantic(self, model, vocabulary, term_weights, top_n, min_id=0, allowed=None):
+        """
+        Best recipes by cosine similarity in ``model``'s latent space
+
+        Recipes are projected with the model's components, with their
+        ingredients canonicalized through ``vocabulary``; ingredients it
+        does not know do not contribute. The segment is small, so it is
+        scored exactly rather than through inverted lists.
+
+        Returns:
+            tuple: (recipe ids, scores), best first
+        """
+        cached = self._semantic
+        if cached is None or cached[0] is not model:
+            vectors = np.zeros((len(self), model.components.shape[0]), dtype=np.float32)
+            for row, recipe in enumerate(self.recipes):
+                term_ids = {vocabulary.lookup(line) for line in parse_ingredient_list(recipe['Cleaned_Ingredients'])}
+                term_ids = np.asarray(sorted(tid for tid in term_ids if tid is not None), dtype=np.int64)
+                if len(term_ids):
+                    # As in SemanticIngredientModel.fit: IDF weights, L2 norm, projection, L2 norm
+                    weights = model.idf[term_ids] / np.linalg.norm(model.idf[term_ids])
+                    vectors[row] = model.components[:, term_ids] @ weights
+            cached = self._semantic = (model, normalize(vectors))
+        vector = model.query_vector(term_weights)
+        if vector is None:
+            return self._top_k(np.zeros(len(self)), top_n, min_id)
+        return self._top_k(cached[1] @ vector, top_n, min_id, allowed)
+
+
+class DeltaIndex:
+    """
+    Keeps a DeltaSegment in step with the recipe journal and triggers compaction.
+
+    The journal (RecipeJournal) is the source of truth, shared by every
+    process; each process tails it, either right after its own ingests or
+    every ``poll_interval`` seconds from a background thread, and publishes
+    a new segment by replacing ``current`` in one assignment. Recipes that
+    the main snapshot already holds (``main_size()``) are dropped from the
+    segment.
+
+    When the journal holds ``compact_threshold`` recipes, or its oldest has
+    waited ``compact_interval`` seconds, one process appends them to the
+    dataset CSV (RecipeJournal.compact). Every process then notices the
+    replaced journal and calls ``on_compacted``, which should rebuild the
+    main snapshot in the background; the segment keeps serving those
+    recipes until the new snapshot holds them.
+    """
+
+    def __init__(self, journal, main_size, on_compacted=None, poll_interval=1.0,
+                 compact_threshold=5000, compact_interval=3600):
+        """
+        Args:
+            journal (RecipeJournal): Journal of ingested recipes
+            main_size (callable): Returns the number of recipes in the main
+                snapshot, or None while none is loaded
+            on_compacted (callable): Called when the journal was compacted
+                into the CSV
+            poll_interval (float): Seconds between journal reads; 0 disables
+                the background thread
+            compact_threshold (int): Journal size that triggers compaction;
+                0 disables compaction
+            compact_interval (float): Age in seconds of the oldest journal
+                recipe that triggers compaction
+        """
+        self.journal = journal
+        self.main_size = main_size
+        self.on_compacted = on_compacted
+        self.poll_interval = poll_interval
+        self.compact_threshold = compact_threshold
+        self.compact_interval = compact_interval
+        self.current = None
+        self.compactions = 0
+        self.ingested = 0
+        self._position = None
+        self._pending_since = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """Start the polling thread; safe to call repeatedly and after a fork"""
+        pid = os.getpid()
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+        self.refresh()
+        if self.poll_interval:
+            threading.Thread(target=self._poll, name='delta-index', daemon=True).start()
+
+    def _poll(self):
+        while self._pid == os.getpid():
+            time.sleep(self.poll_interval)
+            try:
+                self.refresh()
+                self.maybe_compact()
+            except Exception as e:
+                logger.exception("Ingested recipe refresh failed: %s", e)
+
+    def refresh(self):
+        """
+        Read new journal entries and publish a segment with them
+
+        Returns:
+            DeltaSegment: The published segment, or None if it is empty
+        """
+        with self._lock:
+            state = self.journal.read(self._position)
+            if state is None:
+                return self.current
+            header, position, entries = state
+            replaced = self._position is not None and position[0] != self._position[0]
+            self._position = position
+
+            segment = self.current
+            recipes = list(segment.recipes) if segment is not None else []
+            first_id = segment.first_id if segment is not None else header['base']
+            if entries and entries[0][0] > first_id + len(recipes):
+                # Recipes between the two were compacted before this process
+                # read them; the rebuilt snapshot will hold them
+                recipes, first_id = [], entries[0][0]
+            # A replaced journal starts with recipes already held
+            recipes += [recipe for recipe_id, recipe in entries if recipe_id >= first_id + len(recipes)]
+
+            main_size = self.main_size()
+            if main_size is not None and main_size > first_id:
+                recipes = recipes[main_size - first_id:]
+                first_id = max(first_id, main_size)
+            if entries or segment is None or first_id != segment.first_id:
+                self.current = DeltaSegment(first_id, recipes) if recipes else None
+            if entries and self._pending_since is None:
+                self._pending_since = time.time()
+            if replaced:
+                self._pending_since = None
+        if replaced:
+            logger.info("Ingested recipes were compacted into the dataset")
+            if self.on_compacted is not None:
+                self.on_compacted()
+        return self.current
+
+    def ingest(self, recipes, base=None):
+        """
+        Journal parsed recipes and make them searchable in this process
+
+        Args:
+            recipes (list): Recipes as returned by parse_recipe()
+            base (int): Recipes in the main snapshot, used if the journal is new
+
+        Returns:
+            list: Ids assigned to the recipes
+        """
+        ids = self.journal.append(recipes, base)
+        self.ingested += len(ids)
+        self.refresh()
+        return ids
+
+    def maybe_compact(self):
+        """
+        Compact the journal into the CSV if it is large or old enough
+
+        Returns:
+            int: Number of recipes compacted
+        """
+        if not self.compact_threshold or self._position is None:
+            return 0
+        pending = self._position[2]
+        age = time.time() - self._pending_since if self._pending_since is not None else 0
+        if pending < self.compact_threshold and not (pending and age >= self.compact_interval):
+            return 0
+        compacted = self.journal.compact()
+        if compacted:
+            self.compactions += 1
+            # This process sees the replaced journal like any other
+            self.refresh()
+        return compacted
+
+    def status(self):
+        """
+        Delta state for health checks and metrics
+
+        Returns:
+            dict: Recipes held, id range, journal backlog and counters
+        """
+        segment = self.current
+        return {
+            'recipes': len(segment) if segment is not None else 0,
+            'first_id': segment.first_id if segment is not None else None,
+            'end_id': segment.end_id if segment is not None else None,
+            'journal_entries': self._position[2] if self._position is not None else 0,
+            'ingested': self.ingested,
+            'compactions': self.compactions,
+        }
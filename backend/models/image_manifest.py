@@ -0,0 +1,91 @@
+import logging
+import os
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# A resolved image file; size and mtime come from the directory scan
+ImageEntry = namedtuple('ImageEntry', ['stem', 'filename', 'path', 'ext', 'mimetype', 'size', 'mtime'])
+
+# Extensions in lookup priority order, matching the old per-request probing
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+
+MIMETYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+}
+
+
+class ImageManifest:
+    """
+    In-memory map from image stem (file name without extension) to image file.
+
+    The images directory is scanned once with ``os.scandir`` rather than
+    probed with ``os.path.exists`` for every extension on every request.
+    ``refresh()`` rescans and swaps the mapping in atomically, so readers
+    never see a partially built manifest.
+    """
+
+    def __init__(self, images_dir, extensions=IMAGE_EXTENSIONS):
+        """
+        Args:
+            images_dir (str): Directory containing the recipe images
+            extensions (tuple): Accepted extensions, highest priority first
+        """
+        self.images_dir = images_dir
+        self.extensions = extensions
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Rescan the images directory
+
+        Returns:
+            int: Number of images found
+        """
+        priority = {ext: i for i, ext in enumerate(self.extensions)}
+        entries = {}
+        with self._lock:
+            try:
+                with os.scandir(self.images_dir) as scan:
+                    for item in scan:
+                        stem, ext = os.path.splitext(item.name)
+                        if ext not in priority or not item.is_file():
+                            continue
+                        current = entries.get(stem)
+                        if current is not None and priority[current.ext] <= priority[ext]:
+                            continue
+                        stat = item.stat()
+                        entries[stem] = ImageEntry(
+                            stem, item.name, item.path, ext, MIMETYPES[ext], stat.st_size, stat.st_mtime
+                        )
+            except OSError as e:
+                logger.error("Could not scan images directory %s: %s", self.images_dir, e)
+            self._entries = entries
+        return len(entries)
+
+    def lookup(self, stem):
+        """
+        Resolve an image stem
+
+        Args:
+            stem (str): Image name without extension
+
+        Returns:
+            ImageEntry: The image, or None if there is no such image
+        """
+        return self._entries.get(stem)
+
+    def __contains__(self, stem):
+        return stem in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def entries(self):
+        """All images, in directory scan order"""
+        return list(self._entries.values())
@@ -0,0 +1,165 @@
+import logging
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it only originals are served
+    Image = None
+
+# Widths, in pixels, that requested widths are snapped up to
+VARIANT_WIDTHS = (160, 320, 640)
+
+# Output format name -> (file extension, MIME type, Pillow format)
+VARIANT_FORMATS = {
+    'webp': ('.webp', 'image/webp', 'WEBP'),
+    'jpeg': ('.jpg', 'image/jpeg', 'JPEG'),
+}
+
+# A file to send for an image request
+ImageFile = namedtuple('ImageFile', ['path', 'mimetype'])
+
+
+class ImageVariants:
+    """
+    Resized and re-encoded copies of recipe images, kept in a cache directory.
+
+    Requested widths are snapped to a small set of sizes so the cache stays
+    bounded, and images are never upscaled: asking for more than the original
+    width gives the original size (and the original file itself when no
+    format conversion is needed). Variants are written once, either ahead of
+    time with pregenerate() or lazily on first request, and regenerated when
+    the source image is newer.
+    """
+
+    def __init__(self, cache_dir, widths=VARIANT_WIDTHS, quality=80):
+        """
+        Args:
+            cache_dir (str): Directory for generated variants
+            widths (tuple): Allowed variant widths
+            quality (int): Encoder quality for JPEG and WebP output
+        """
+        self.cache_dir = cache_dir
+        self.widths = tuple(sorted(widths))
+        self.quality = quality
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """Whether variants can be generated (Pillow is installed)"""
+        return Image is not None
+
+    def snap_width(self, width):
+        """Smallest allowed width that is at least ``width`` (or the largest one)"""
+        for allowed in self.widths:
+            if allowed >= width:
+                return allowed
+        return self.widths[-1]
+
+    def resolve(self, image, width, fmt='jpeg'):
+        """
+        Find (generating if needed) the file to send for an image variant
+
+        Args:
+            image (ImageEntry): Source image from the image manifest
+            width (int): Requested width in pixels, or None for the original width
+            fmt (str): Output format, a key of VARIANT_FORMATS
+
+        Returns:
+            ImageFile: The variant, or the original image if no variant is needed
+                or Pillow is unavailable
+        """
+        original = ImageFile(image.path, image.mimetype)
+        if not self.available or fmt not in VARIANT_FORMATS:
+            return original
+
+        if width is not None:
+            width = self.snap_width(width)
+        key = (image.stem, width, fmt, image.mtime)
+        resolved = self._resolved.get(key)
+        if resolved is None:
+            try:
+                resolved = self._generate(image, width, fmt) or original
+            except Exception as e:
+                logger.warning("Could not generate %s variant of %s: %s", fmt, image.filename, e)
+                return original
+            with self._lock:
+                self._resolved[key] = resolved
+        return resolved
+
+    def _variant_path(self, image, width, fmt):
+        """Cache path of a variant; ``width`` is a pixel width or 'full' for the original size"""
+        label = width if width == 'full' else f"w{width}"
+        return os.path.join(self.cache_dir, f"{image.stem}.{label}{VARIANT_FORMATS[fmt][0]}")
+
+    @staticmethod
+    def _is_fresh(path, image):
+        try:
+            return os.stat(path).st_mtime >= image.mtime
+        except OSError:
+            return False
+
+    def _generate(self, image, width, fmt):
+        """
+        Write a variant unless an up-to-date one exists
+
+        Returns:
+            ImageFile: The variant, or None if the original should be sent as-is
+        """
+        ext, mimetype, pil_format = VARIANT_FORMATS[fmt]
+        path = self._variant_path(image, 'full' if width is None else width, fmt)
+        if self._is_fresh(path, image):
+            return ImageFile(path, mimetype)
+
+        with Image.open(image.path) as source:
+            if width is None or source.width <= width:
+                if image.mimetype == mimetype:
+                    # Already small enough and in the requested format
+                    return None
+                # Every width at or above the original shares one re-encode
+                path = self._variant_path(image, 'full', fmt)
+                if self._is_fresh(path, image):
+                    return ImageFile(path, mimetype)
+                variant = source.convert('RGB')
+            else:
+                height = max(1, round(source.height * width / source.width))
+                variant = source.convert('RGB').resize((width, height), Image.LANCZOS)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=ext, dir=self.cache_dir)
+        try:
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, 'wb') as f:
+                variant.save(f, pil_format, quality=self.quality)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        return ImageFile(path, mimetype)
+
+    def pregenerate(self, images, formats=tuple(VARIANT_FORMATS)):
+        """
+        Generate every width and format for the given images
+
+        Args:
+            images (iterable): ImageEntry objects from the image manifest
+            formats (tuple): Formats to generate
+
+        Returns:
+            int: Number of variant files now in the cache
+        """
+        if not self.available:
+            raise RuntimeError("Pillow is required to generate image variants")
+        paths = set()
+        for image in images:
+            for width in self.widths:
+                for fmt in formats:
+                    variant = self.resolve(image, width, fmt)
+                    if variant.path != image.path:
+                        paths.add(variant.path)
+        return len(paths)
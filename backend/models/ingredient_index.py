@@ -0,0 +1,282 @@
+import numpy as np
+from scipy import sparse
+from collections import defaultdict
+from models.dataset_cache import pack_strings, unpack_strings
+from models.metrics import metrics
+from models.recipe_filter import bitmap_contains
+
+
+def _to_csr(lists):
+    """Flatten a list of integer lists into (indptr, indices) arrays"""
+    indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(item) for item in lists])
+    indices = np.fromiter((i for item in lists for i in item), dtype=np.int32, count=indptr[-1])
+    return indptr, indices
+
+
+class IngredientIndex:
+    """
+    Inverted index from ingredient n-grams to the recipes that use them.
+
+    Every distinct ingredient string is stored once as a term with a posting
+    list of recipe ids. Terms are themselves indexed by their character
+    n-grams, so a query term is resolved by intersecting a few n-gram posting
+    lists and confirming the surviving terms with a plain substring check.
+    This keeps the exact semantics of ``ing in recipe_ing`` ("chick" still
+    finds "chickpeas") without scanning every recipe.
+
+    Posting lists are stored in CSR form (an ``indptr`` offsets array into a
+    flat ``indices`` array) so the whole index can be saved as plain arrays.
+    The forward direction, each recipe's ingredients as term ids, is kept in
+    the same form.
+    """
+
+    TERM_CACHE_SIZE = 10000
+
+    def __init__(self, ngram_size=3):
+        """
+        Args:
+            ngram_size (int): Length of the character n-grams used to index terms
+        """
+        self.ngram_size = ngram_size
+        self.terms = []
+        self.term_indptr = np.zeros(1, dtype=np.int64)
+        self.term_indices = np.zeros(0, dtype=np.int32)
+        self.gram_ids = {}
+        self.gram_indptr = np.zeros(1, dtype=np.int64)
+        self.gram_indices = np.zeros(0, dtype=np.int32)
+        self.recipe_indptr = np.zeros(1, dtype=np.int64)
+        self.recipe_terms = np.zeros(0, dtype=np.int32)
+        self.recipe_lengths = np.zeros(0, dtype=np.int32)
+        self._term_cache = {}
+
+    def build(self, ingredient_lists):
+        """
+        Build the index from one list of (lowercased) ingredients per recipe
+
+        Args:
+            ingredient_lists (iterable): Ingredient lists in recipe id order
+
+        Returns:
+            IngredientIndex: The index itself, for chaining
+        """
+        term_ids = {}
+        postings = []
+        recipes = []
+        for recipe_id, ingredients in enumerate(ingredient_lists):
+            recipe_terms = []
+            for ingredient in ingredients:
+                term_id = term_ids.get(ingredient)
+                if term_id is None:
+                    term_id = len(postings)
+                    term_ids[ingredient] = term_id
+                    postings.append([])
+                if not postings[term_id] or postings[term_id][-1] != recipe_id:
+                    postings[term_id].append(recipe_id)
+                recipe_terms.append(term_id)
+            recipes.append(recipe_terms)
+
+        self.terms = list(term_ids)
+        self.term_indptr, self.term_indices = _to_csr(postings)
+        self.recipe_indptr, self.recipe_terms = _to_csr(recipes)
+        self.recipe_lengths = np.diff(self.recipe_indptr).astype(np.int32)
+
+        grams = defaultdict(list)
+        for term_id, term in enumerate(self.terms):
+            for gram in self._grams(term):
+                grams[gram].append(term_id)
+        self.gram_ids = {gram: i for i, gram in enumerate(grams)}
+        self.gram_indptr, self.gram_indices = _to_csr(list(grams.values()))
+        self._term_cache = {}
+        return self
+
+    def to_arrays(self):
+        """
+        Export the index as flat arrays for the dataset cache
+
+        Returns:
+            tuple: (dict of numpy arrays, dict of JSON-serialisable metadata)
+        """
+        term_blob, term_offsets = pack_strings(self.terms)
+        gram_blob, gram_offsets = pack_strings(list(self.gram_ids))
+        arrays = {
+            'term_blob': term_blob,
+            'term_offsets': term_offsets,
+            'term_indptr': self.term_indptr,
+            'term_indices': self.term_indices,
+            'gram_blob': gram_blob,
+            'gram_offsets': gram_offsets,
+            'gram_indptr': self.gram_indptr,
+            'gram_indices': self.gram_indices,
+            'recipe_indptr': self.recipe_indptr,
+            'recipe_terms': self.recipe_terms,
+        }
+        return arrays, {'ngram_size': self.ngram_size}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """
+        Rebuild an index exported with to_arrays()
+
+        Args:
+            arrays (dict): Arrays as returned by to_arrays(), possibly memory-mapped
+            meta (dict): Metadata as returned by to_arrays()
+
+        Returns:
+            IngredientIndex: The restored index
+        """
+        index = cls(ngram_size=meta['ngram_size'])
+        index.terms = unpack_strings(arrays['term_blob'], arrays['term_offsets'])
+        index.term_indptr = arrays['term_indptr']
+        index.term_indices = arrays['term_indices']
+        grams = unpack_strings(arrays['gram_blob'], arrays['gram_offsets'])
+        index.gram_ids = {gram: i for i, gram in enumerate(grams)}
+        index.gram_indptr = arrays['gram_indptr']
+        index.gram_indices = arrays['gram_indices']
+        index.recipe_indptr = arrays['recipe_indptr']
+        index.recipe_terms = arrays['recipe_terms']
+        index.recipe_lengths = np.diff(index.recipe_indptr).astype(np.int32)
+        return index
+
+    def __len__(self):
+        return len(self.recipe_lengths)
+
+    def _grams(self, text):
+        n = self.ngram_size
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def recipe_term_ids(self, recipe_id):
+        """Term ids of a recipe's ingredients, in recipe order"""
+        return self.recipe_terms[self.recipe_indptr[recipe_id]:self.recipe_indptr[recipe_id + 1]]
+
+    def recipe_ingredients(self, recipe_id):
+        """A recipe's (lowercased) ingredient strings, in recipe order"""
+        return [self.terms[tid] for tid in self.recipe_term_ids(recipe_id)]
+
+    def term_recipes(self, term_id):
+        """Posting list of recipe ids for a term"""
+        return self.term_indices[self.term_indptr[term_id]:self.term_indptr[term_id + 1]]
+
+    def _gram_terms(self, gram):
+        gram_id = self.gram_ids.get(gram)
+        if gram_id is None:
+            return None
+        return self.gram_indices[self.gram_indptr[gram_id]:self.gram_indptr[gram_id + 1]]
+
+    def matching_terms(self, query):
+        """
+        Find the ids of all terms that contain ``query`` as a substring
+
+        Args:
+            query (str): Lowercased query ingredient
+
+        Returns:
+            numpy.ndarray: Sorted term ids
+        """
+        cached = self._term_cache.get(query)
+        if cached is not None:
+            metrics.inc('ingredient_index_term_lookups_total', result='hit')
+            return cached
+        metrics.inc('ingredient_index_term_lookups_total', result='miss')
+
+        if len(query) < self.ngram_size:
+            # Too short to have an n-gram of its own; the vocabulary is far
+            # smaller than the recipe table, so a scan here is still cheap.
+            term_ids = [tid for tid, term in enumerate(self.terms) if query in term]
+        else:
+            lists = []
+            for gram in self._grams(query):
+                posting = self._gram_terms(gram)
+                if posting is None:
+                    lists = None
+                    break
+                lists.append(posting)
+            if not lists:
+                term_ids = []
+            else:
+                lists.sort(key=len)
+                candidates = lists[0]
+                for posting in lists[1:]:
+                    candidates = np.intersect1d(candidates, posting, assume_unique=True)
+                    if not len(candidates):
+                        break
+                # n-gram overlap is necessary but not sufficient, so confirm
+                term_ids = [int(tid) for tid in candidates if query in self.terms[tid]]
+
+        result = np.asarray(term_ids, dtype=np.int32)
+        if len(self._term_cache) >= self.TERM_CACHE_SIZE:
+            self._term_cache.clear()
+        self._term_cache[query] = result
+        return result
+
+    def matching_recipes(self, query, allowed=None):
+        """
+        Find the ids of all recipes with an ingredient containing ``query``
+
+        Args:
+            query (str): Lowercased query ingredient
+            allowed (numpy.ndarray): Bitmap of the recipes to consider (see
+                recipe_filter); others are dropped before deduplication
+
+        Returns:
+            numpy.ndarray: Sorted, unique recipe ids
+        """
+        term_ids = self.matching_terms(query)
+        if not len(term_ids):
+            return np.zeros(0, dtype=np.int32)
+        ids = np.concatenate([self.term_recipes(tid) for tid in term_ids])
+        if allowed is not None:
+            ids = ids[bitmap_contains(allowed, ids)]
+        return np.unique(ids)
+
+    def match_counts(self, user_ingredients, allowed=None):
+        """
+        Count, per candidate recipe, how many user ingredients it matches
+
+        Args:
+            user_ingredients (list): Lowercased user ingredients
+            allowed (numpy.ndarray): Bitmap of the recipes that may be candidates
+
+        Returns:
+            tuple: (candidate recipe ids, match counts), both numpy arrays
+        """
+        postings = [self.matching_recipes(ing, allowed) for ing in user_ingredients]
+        postings = [p for p in postings if len(p)]
+        if not postings:
+            empty = np.zeros(0, dtype=np.int32)
+            return empty, empty
+        candidates, counts = np.unique(np.concatenate(postings), return_counts=True)
+        return candidates, counts
+
+    def match_matrix(self, queries):
+        """
+        Match counts for many queries as one sparse query-by-recipe matrix
+
+        Each distinct query term is resolved once, giving a term-by-recipe
+        incidence matrix; multiplying it by the query-by-term count matrix
+        yields every query's match counts in a single sparse product.
+
+        Args:
+            queries (list): List of lowercased ingredient lists
+
+        Returns:
+            scipy.sparse.csr_matrix: Match counts, one row per query
+        """
+        term_columns = {}
+        rows, cols = [], []
+        for row, user_ingredients in enumerate(queries):
+            for ing in user_ingredients:
+                rows.append(row)
+                cols.append(term_columns.setdefault(ing, len(term_columns)))
+        query_terms = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(queries), len(term_columns))
+        )
+
+        postings = [self.matching_recipes(term) for term in term_columns]
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(p) for p in postings])
+        indices = np.concatenate(postings) if postings else np.zeros(0, dtype=np.int32)
+        incidence = sparse.csr_matrix(
+            (np.ones(len(indices)), indices, indptr), shape=(len(postings), len(self))
+        )
+        return (query_terms @ incidence).tocsr()
@@ -0,0 +1,149 @@
+import ast
+import re
+
+# Units and containers dropped from the start of an ingredient
+UNITS = {
+    'cup', 'c', 'tablespoon', 'tbsp', 'tbs', 'tbl', 'teaspoon', 'tsp', 'ounce', 'oz',
+    'pound', 'lb', 'gram', 'g', 'kilogram', 'kg', 'milliliter', 'ml', 'liter', 'l',
+    'quart', 'qt', 'pint', 'pt', 'gallon', 'stick', 'can', 'jar', 'package', 'pkg',
+    'bunch', 'sprig', 'pinch', 'dash', 'handful', 'slice', 'piece', 'head', 'stalk',
+    'clove', 'ear', 'bag', 'box', 'bottle', 'container', 'envelope', 'sheet', 'inch',
+    'cm', 'drop', 'scoop', 'fillet', 'strip', 'knob', 'sachet', 'pack',
+}
+
+# Size, state and preparation words dropped anywhere in an ingredient
+DESCRIPTORS = {
+    'large', 'medium', 'small', 'extra-large', 'jumbo', 'whole', 'fresh', 'freshly',
+    'chopped', 'finely', 'coarsely', 'roughly', 'thinly', 'thickly', 'minced', 'diced',
+    'sliced', 'grated', 'shredded', 'peeled', 'seeded', 'pitted', 'halved', 'quartered',
+    'crushed', 'softened', 'melted', 'cold', 'warm', 'hot', 'chilled', 'room-temperature',
+    'divided', 'packed', 'lightly', 'loosely', 'firmly', 'about', 'optional', 'trimmed',
+    'cubed', 'torn', 'rinsed', 'drained', 'toasted', 'beaten', 'sifted', 'boneless',
+    'skinless', 'cooked', 'uncooked', 'raw', 'heaping', 'scant', 'level', 'good-quality',
+    'good', 'quality', 'plus', 'more', 'additional', 'extra', 'very', 'well', 'roughly',
+    'store-bought', 'homemade', 'purchased', 'prepared', 'frozen', 'thawed', 'stemmed',
+    'cored',
+}
+
+# Trailing words that name a part of the ingredient ("garlic clove", "celery stalk")
+TRAILING_PARTS = {'clove', 'sprig', 'stalk', 'head', 'bunch', 'piece', 'slice'}
+
+# Words that begin a preparation note rather than an ingredient ("cut into
+# pieces"); never a descriptor, which may also begin an ingredient ("finely
+# grated parmesan")
+NOTE_LEADERS = {
+    'cut', 'for', 'to', 'such', 'at', 'into', 'as', 'preferably', 'or', 'and',
+    'patted', 'from', 'if', 'in', 'on', 'with', 'see', 'note', 'room',
+}
+
+# Words that look plural but are not, and irregular plurals
+SINGULAR_EXCEPTIONS = {
+    'asparagus', 'couscous', 'hummus', 'molasses', 'swiss', 'grits', 'bass', 'citrus',
+    'octopus', 'lemongrass', 'watercress', 'brussels', 'series', 'species', 'harissa',
+    'schnapps', 'anise', 'hibiscus', 'gas',
+}
+IRREGULAR_PLURALS = {
+    'leaves': 'leaf', 'halves': 'half', 'loaves': 'loaf', 'knives': 'knife',
+    'cookies': 'cookie', 'brownies': 'brownie', 'pies': 'pie', 'calories': 'calorie',
+    'anchovies': 'anchovy', 'potatoes': 'potato', 'tomatoes': 'tomato', 'mangoes': 'mango',
+    'avocados': 'avocado', 'teeth': 'tooth', 'geese': 'goose', 'mice': 'mouse',
+    'chips': 'chip', 'oats': 'oat', 'lentils': 'lentil',
+}
+
+_PARENTHESES = re.compile(r'\([^)]*\)|\[[^\]]*\]')
+_QUANTITY = re.compile(r'^(?:[\d½¼¾⅓⅔⅛⅜⅝⅞/.\-–x×]+"?|a|an|one|two|three|four|five|six|dozen)$')
+_PLUS_QUANTITY = re.compile(r'\bplus\s+[\d½¼¾⅓⅔/.\s]+[a-z.]*')
+_PUNCTUATION = re.compile(r'[^a-z\s\-]')
+# Hyphenated sizes: "14-ounce", "15.2-ounce", "1/2-inch-thick"
+_SIZE = re.compile(r'[\d½¼¾⅓⅔⅛⅜⅝⅞][\d½¼¾⅓⅔⅛⅜⅝⅞/.]*\s*[-–]\s*(?:%s)(?:e?s)?(?:-[a-z]+)*\b'
+                   % '|'.join(sorted(UNITS, key=len, reverse=True)))
+# "to" in a range of quantities: "2 to 3 tablespoons"
+_RANGE = re.compile(r'(?<=[\d½¼¾⅓⅔⅛⅜⅝⅞])\s+to\s+(?=[\d½¼¾⅓⅔⅛⅜⅝⅞])')
+
+
+def parse_ingredient_list(value):
+    """
+    Split a ``Cleaned_Ingredients`` value into its ingredient strings
+
+    The column holds a stringified Python list, so it is parsed as one;
+    plain comma-separated text is accepted as a fallback.
+
+    Args:
+        value (str): Raw column value
+
+    Returns:
+        list: Ingredient strings
+    """
+    if not isinstance(value, str):
+        return []
+    text = value.strip()
+    if text.startswith('['):
+        try:
+            items = ast.literal_eval(text)
+            return [str(item) for item in items]
+        except (ValueError, SyntaxError):
+            text = text.strip('[]')
+    return [item.strip(" '\"") for item in text.split(', ')]
+
+
+def singularize(word):
+    """Singular form of a lowercased English word, by simple suffix rules"""
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if word in SINGULAR_EXCEPTIONS or len(word) <= 3:
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('ches', 'shes', 'sses', 'xes', 'zes')):
+        return word[:-2]
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def canonicalize(ingredient):
+    """
+    Reduce an ingredient line to its canonical name
+
+    Quantities, units and sizes ("14-ounce"), parenthesised notes, size and
+    preparation words are removed, and every word is singularized, so
+    "1 stick (1/2 cup) cold unsalted butter, cut into small pieces" becomes
+    "unsalted butter". The name is taken from the first comma-separated
+    part or alternative that has one: "butter or margarine" is "butter",
+    "fresh or frozen peas" is "pea" and "skinless, boneless chicken thighs"
+    is "chicken thigh". Lines naming two ingredients ("salt and pepper")
+    deliberately keep one name, as "and" is also part of names such as
+    "macaroni and cheese"; constraints still find both, since they match
+    every name containing their words.
+
+    Args:
+        ingredient (str): One ingredient line
+
+    Returns:
+        str: Canonical name, or '' if the line is only a note ("for serving")
+    """
+    text = _PARENTHESES.sub(' ', ingredient.lower())
+    text = _PLUS_QUANTITY.sub(' ', text)
+    text = _SIZE.sub(' ', text)
+    text = _RANGE.sub(' ', text)
+    text = re.split(r'\bfor\b|\bto taste\b', text)[0]
+    for part in re.split(r',|\bor\b', text):
+        words = _PUNCTUATION.sub(' ', part.replace('freshly ground', ' ')).split()
+
+        # Leading quantities and units ("3 ears of corn")
+        while words and (_QUANTITY.match(words[0]) or singularize(words[0]) in UNITS
+                         or words[0] in ('of', '-', '–')):
+            words = words[1:]
+        if words and words[0] in NOTE_LEADERS:
+            return ''
+
+        words = [word for word in words if word not in DESCRIPTORS and word.strip('-')]
+        # "all-purpose flour" and "all purpose flour" are the same ingredient
+        words = [singularize(part) for word in words for part in word.split('-') if part]
+        while len(words) > 1 and words[-1] in TRAILING_PARTS:
+            words = words[:-1]
+        if words:
+            return ' '.join(words)
+    return ''
@@ -0,0 +1,81 @@
+import bisect
+import numpy as np
+from models.ingredient_parser import singularize
+
+
+class IngredientSuggester:
+    """
+    Prefix search over canonical ingredient names, for autocomplete.
+
+    Every word start of every name is a key ("green onion" is found under
+    "green onion" and "onion"), kept in one sorted list so a prefix maps to
+    a contiguous range found with two binary searches. The range is ranked
+    by document frequency with an ``argpartition``, so a lookup costs two
+    bisections plus work proportional to the number of matching keys, never
+    a scan of the vocabulary.
+    """
+
+    def __init__(self, terms, document_frequency):
+        """
+        Args:
+            terms (list): Canonical ingredient names, indexed by term id
+            document_frequency (numpy.ndarray): Recipes per term id
+        """
+        entries = sorted(
+            (term[start:], term_id)
+            for term_id, term in enumerate(terms)
+            for start in [0] + [i + 1 for i, char in enumerate(term) if char == ' ']
+        )
+        self.terms = terms
+        self.keys = [key for key, _ in entries]
+        self.key_terms = np.fromiter((term_id for _, term_id in entries), dtype=np.int32, count=len(entries))
+        self.key_frequency = np.asarray(document_frequency, dtype=np.int64)[self.key_terms]
+
+    def _range(self, prefix):
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + '\uffff', lo)
+        return lo, hi
+
+    def suggest(self, text, limit=10):
+        """
+        Most used ingredients with a word starting with ``text``
+
+        Falls back to the singular of the last word ("tomatoes" finds
+        "tomato") when the text as typed matches nothing.
+
+        Args:
+            text (str): What the user has typed so far
+            limit (int): Maximum number of suggestions
+
+        Returns:
+            list: (ingredient name, number of recipes) tuples, most used first
+        """
+        prefix = ' '.join(text.lower().split())
+        if not prefix or limit <= 0:
+            return []
+        lo, hi = self._range(prefix)
+        if lo == hi:
+            words = prefix.split(' ')
+            singular = ' '.join(words[:-1] + [singularize(words[-1])])
+            if singular != prefix:
+                lo, hi = self._range(singular)
+
+        term_ids = self.key_terms[lo:hi]
+        frequency = self.key_frequency[lo:hi]
+        if len(term_ids) > limit * 4:
+            # Keys of one term can repeat within a range; keep enough to dedupe
+            keep = np.argpartition(-frequency, limit * 4)[:limit * 4]
+            term_ids, frequency = term_ids[keep], frequency[keep]
+        order = np.lexsort((term_ids, -frequency))
+
+        suggestions = []
+        seen = set()
+        for pos in order:
+            term_id = int(term_ids[pos])
+            if term_id in seen:
+                continue
+            seen.add(term_id)
+            suggestions.append((self.terms[term_id], int(frequency[pos])))
+            if len(suggestions) == limit:
+                break
+        return suggestions
@@ -0,0 +1,171 @@
+import numpy as np
+from models.dataset_cache import pack_strings, unpack_strings
+from models.ingredient_parser import parse_ingredient_list, canonicalize
+
+
+class IngredientVocabulary:
+    """
+    Table of canonical ingredient names with each recipe's ingredients as ids.
+
+    Raw ingredient lines are reduced to canonical names at load time (see
+    ``canonicalize``) and every distinct name gets an integer id. Each recipe
+    keeps a sorted, duplicate-free int32 array of its ingredient ids, and
+    each id a posting list of recipe ids, both in CSR form like
+    ``IngredientIndex``, so set operations on recipes are integer
+    intersections rather than string comparisons.
+    """
+
+    def __init__(self):
+        self.terms = []
+        self.term_ids = {}
+        self.recipe_indptr = np.zeros(1, dtype=np.int64)
+        self.recipe_ids = np.zeros(0, dtype=np.int32)
+        self.term_indptr = np.zeros(1, dtype=np.int64)
+        self.term_recipes = np.zeros(0, dtype=np.int32)
+        self.document_frequency = np.zeros(0, dtype=np.int64)
+        self._word_terms = None
+
+    def build(self, raw_ingredients):
+        """
+        Parse and canonicalize every recipe's ingredients
+
+        Args:
+            raw_ingredients (iterable): ``Cleaned_Ingredients`` values in recipe id order
+
+        Returns:
+            IngredientVocabulary: The vocabulary itself, for chaining
+        """
+        term_ids = {}
+        canonical_cache = {}
+        lengths = []
+        flat = []
+        for value in raw_ingredients:
+            ids = set()
+            for line in parse_ingredient_list(value):
+                name = canonical_cache.get(line)
+                if name is None:
+                    name = canonical_cache[line] = canonicalize(line)
+                if name:
+                    ids.add(term_ids.setdefault(name, len(term_ids)))
+            lengths.append(len(ids))
+            flat.extend(sorted(ids))
+
+        self.terms = list(term_ids)
+        self.term_ids = term_ids
+        self.recipe_indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        self.recipe_indptr[1:] = np.cumsum(lengths)
+        self.recipe_ids = np.asarray(flat, dtype=np.int32)
+        self._build_postings()
+        return self
+
+    def _build_postings(self):
+        """Invert the recipe -> ids arrays into id -> recipes posting lists"""
+        recipe_of = np.repeat(
+            np.arange(len(self), dtype=np.int32), np.diff(self.recipe_indptr)
+        )
+        # A stable sort keeps each posting list in recipe id order
+        order = np.argsort(self.recipe_ids, kind='stable')
+        self.term_recipes = recipe_of[order]
+        self.document_frequency = np.bincount(self.recipe_ids, minlength=len(self.terms))
+        self.term_indptr = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        self.term_indptr[1:] = np.cumsum(self.document_frequency)
+        self._word_terms = None
+
+    def to_arrays(self):
+        """
+        Export the vocabulary as flat arrays for the dataset cache
+
+        Returns:
+            tuple: (dict of numpy arrays, dict of JSON-serialisable metadata)
+        """
+        term_blob, term_offsets = pack_strings(self.terms)
+        arrays = {
+            'term_blob': term_blob,
+            'term_offsets': term_offsets,
+            'recipe_indptr': self.recipe_indptr,
+            'recipe_ids': self.recipe_ids,
+        }
+        return arrays, {}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta=None):
+        """
+        Rebuild a vocabulary exported with to_arrays()
+
+        Args:
+            arrays (dict): Arrays as returned by to_arrays(), possibly memory-mapped
+            meta (dict): Metadata as returned by to_arrays()
+
+        Returns:
+            IngredientVocabulary: The restored vocabulary
+        """
+        vocabulary = cls()
+        vocabulary.terms = unpack_strings(arrays['term_blob'], arrays['term_offsets'])
+        vocabulary.term_ids = {term: i for i, term in enumerate(vocabulary.terms)}
+        vocabulary.recipe_indptr = arrays['recipe_indptr']
+        vocabulary.recipe_ids = arrays['recipe_ids']
+        vocabulary._build_postings()
+        return vocabulary
+
+    def __len__(self):
+        return len(self.recipe_indptr) - 1
+
+    @property
+    def recipe_lengths(self):
+        """Number of distinct canonical ingredients of each recipe"""
+        return np.diff(self.recipe_indptr).astype(np.int32)
+
+    def recipe_ingredient_ids(self, recipe_id):
+        """Sorted canonical ingredient ids of a recipe"""
+        return self.recipe_ids[self.recipe_indptr[recipe_id]:self.recipe_indptr[recipe_id + 1]]
+
+    def recipe_ingredients(self, recipe_id):
+        """Canonical ingredient names of a recipe"""
+        return [self.terms[tid] for tid in self.recipe_ingredient_ids(recipe_id)]
+
+    def term_recipe_ids(self, term_id):
+        """Posting list of recipe ids for a canonical ingredient"""
+        return self.term_recipes[self.term_indptr[term_id]:self.term_indptr[term_id + 1]]
+
+    def lookup(self, ingredient):
+        """
+        Canonical id of an ingredient
+
+        Args:
+            ingredient (str): Ingredient as typed or as written in a recipe
+
+        Returns:
+            int: The id, or None if the canonical name is not in the vocabulary
+        """
+        return self.term_ids.get(canonicalize(ingredient))
+
+    def matching_terms(self, ingredient):
+        """
+        Ids of all canonical ingredients containing every word of ``ingredient``
+
+        "chicken" finds "chicken", "chicken breast" and "chicken stock", and
+        "tomatoes" finds "tomato" and "cherry tomato".
+
+        Args:
+            ingredient (str): Ingredient as typed
+
+        Returns:
+            numpy.ndarray: Sorted term ids
+        """
+        words = canonicalize(ingredient).split()
+        if not words:
+            return np.zeros(0, dtype=np.int32)
+        if self._word_terms is None:
+            word_terms = {}
+            for term_id, term in enumerate(self.terms):
+                for word in set(term.split()):
+                    word_terms.setdefault(word, []).append(term_id)
+            self._word_terms = {word: np.asarray(ids, dtype=np.int32) for word, ids in word_terms.items()}
+
+        result = None
+        for word in words:
+            ids = self._word_terms.get(word)
+            if ids is None:
+                return np.zeros(0, dtype=np.int32)
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+        return result
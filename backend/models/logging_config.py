@@ -0,0 +1,97 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drops repeats of the same log call beyond a per-interval budget.
+
+    Records are grouped by logger and call site, so a noisy per-request
+    message cannot drown out the rest of the log. Records at or above
+    ``exempt_level`` (errors by default) are never dropped: they matter
+    most during an incident, when they are most frequent. The first record
+    let through after a suppressed run carries the number dropped in its
+    ``suppressed`` attribute, which SuppressedCountFormatter prints.
+    """
+
+    def __init__(self, rate=10, interval=60.0, exempt_level=logging.ERROR):
+        """
+        Args:
+            rate (int): Records let through per call site per interval;
+                0 disables limiting
+            interval (float): Length of the window in seconds
+            exempt_level (int): Level from which records are never limited
+        """
+        super().__init__()
+        self.rate = rate
+        self.interval = interval
+        self.exempt_level = exempt_level
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def filter(self, record):
+        if not self.rate or record.levelno >= self.exempt_level:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, count = now, 0
+            if count >= self.rate:
+                self._windows[key] = (start, count, suppressed + 1)
+                return False
+            self._windows[key] = (start, count + 1, 0)
+        if suppressed:
+            # Not appended to record.msg, which may hold % placeholders
+            record.suppressed = suppressed
+        return True
+
+
+class SuppressedCountFormatter(logging.Formatter):
+    """Formatter noting how many repeats RateLimitFilter dropped before a record"""
+
+    def formatMessage(self, record):
+        text = super().formatMessage(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text = f"{text} ({suppressed} similar messages suppressed)"
+        return text
+
+
+def configure_logging(level=None, rate=None, interval=None, exempt_level=None):
+    """
+    Send log records to stderr with levels and rate limiting
+
+    Reads ``LOG_LEVEL`` (default INFO), ``LOG_RATE_LIMIT`` (records per call
+    site per interval, default 10, 0 to disable), ``LOG_RATE_INTERVAL``
+    (seconds, default 60) and ``LOG_RATE_EXEMPT_LEVEL`` (level from which
+    records are never limited, default ERROR) unless given. Safe to call
+    more than once.
+
+    Args:
+        level (str): Level name such as 'DEBUG' or 'WARNING'
+        rate (int): Records per call site per interval
+        interval (float): Rate limiting window in seconds
+        exempt_level (str): Level name from which records are never limited
+    """
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    rate = rate if rate is not None else int(os.environ.get('LOG_RATE_LIMIT', '10'))
+    interval = interval if interval is not None else float(os.environ.get('LOG_RATE_INTERVAL', '60'))
+    exempt_level = (exempt_level or os.environ.get('LOG_RATE_EXEMPT_LEVEL', 'ERROR')).upper()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if getattr(handler, '_recipe_handler', False):
+            root.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stderr)
+    handler._recipe_handler = True
+    handler.setFormatter(SuppressedCountFormatter(LOG_FORMAT))
+    handler.addFilter(RateLimitFilter(rate, interval, logging.getLevelName(exempt_level)))
+    root.addHandler(handler)
+    root.setLevel(level)
@@ -0,0 +1,173 @@
+import bisect
+import contextlib
+import threading
+import time
+
+# Histogram buckets (seconds) for request and stage latencies
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Histogram buckets for counts, such as candidate recipes per query
+COUNT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms, rendered in Prometheus text format.
+
+    Recording is a dictionary lookup and an addition under one lock, cheap
+    enough for per-stage timing on the request path. Values owned by other
+    objects (cache statistics, loader state) are read at render time
+    through collectors instead of being mirrored on every change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        """
+        Set the TYPE and HELP of a metric
+
+        Args:
+            name (str): Metric name
+            kind (str): 'counter', 'gauge' or 'histogram'
+            help_text (str): One-line description
+        """
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """Record a value in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Time a block into a latency histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def register_collector(self, collector):
+        """
+        Add a function called at render time
+
+        Args:
+            collector (callable): Returns (name, kind, help, labels dict, value)
+                tuples for values kept elsewhere
+        """
+        self._collectors.append(collector)
+
+    def reset(self):
+        """Drop all recorded values (collectors are kept)"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format
+
+        Returns:
+            str: The exposition text
+        """
+        families = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                families.setdefault(name, []).append(('', labels, value))
+            for (name, labels), histogram in self._histograms.items():
+                samples = families.setdefault(name, [])
+                bounds = [_format_value(bound) for bound in histogram.buckets] + ['+Inf']
+                cumulative = 0
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    samples.append(('_bucket', labels + (('le', bound),), cumulative))
+                samples.append(('_sum', labels, histogram.sum))
+                samples.append(('_count', labels, histogram.count))
+
+        for collector in self._collectors:
+            for name, kind, help_text, labels, value in collector():
+                self._help.setdefault(name, (kind, help_text))
+                families.setdefault(name, []).append(('', tuple(sorted(labels.items())), value))
+
+        lines = []
+        for name in sorted(families):
+            kind, help_text = self._help.get(name, ('untyped', ''))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in families[name]:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+# The registry shared by the app and the models
+metrics = MetricsRegistry()
+
+metrics.describe('recommender_stage_seconds', 'histogram',
+                 'Time spent in each stage of answering a recommendation request')
+metrics.describe('recommender_candidates', 'histogram',
+                 'Candidate recipes scored per query')
+metrics.describe('recommender_allowed', 'histogram',
+                 'Recipes satisfying the constraints of constrained queries')
+metrics.describe('ingredient_index_term_lookups_total', 'counter',
+                 'Query term resolutions in the ingredient index, by term cache result')
+metrics.describe('http_request_duration_seconds', 'histogram',
+                 'Request latency by route, method and status')
+metrics.describe('http_requests_total', 'counter',
+                 'Requests by route, method and status')
+
+
+def stage(name):
+    """Time a stage of the recommendation pipeline"""
+    return metrics.timer('recommender_stage_seconds', stage=name)
@@ -0,0 +1,139 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class StackSampler:
+    """
+    Statistical profiler for one thread.
+
+    A helper thread reads the target thread's stack every ``interval``
+    seconds through ``sys._current_frames()``, so the profiled code runs
+    unmodified and the overhead is bounded by the sampling rate rather
+    than by the number of calls, unlike cProfile. Samples are kept as
+    collapsed stacks, the input format of flame graph tools.
+    """
+
+    def __init__(self, thread_id=None, interval=0.001, max_depth=64):
+        """
+        Args:
+            thread_id (int): Thread to sample; defaults to the calling thread
+            interval (float): Seconds between samples
+            max_depth (int): Innermost frames kept per sample
+        """
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            names = []
+            while frame is not None and len(names) < self.max_depth:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """
+        Samples in collapsed-stack format
+
+        Returns:
+            str: One 'outer;...;inner count' line per distinct stack
+        """
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, n=10):
+        """
+        Functions most often on top of the stack
+
+        Returns:
+            list: (frame, share of samples) pairs, most frequent first
+        """
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = self.samples or 1
+        return [(frame, count / total) for frame, count in leaves.most_common(n)]
+
+
+class RequestProfiler:
+    """
+    Opt-in per-request profiling hook.
+
+    A share of requests (``sample_rate``) is profiled with a StackSampler
+    for the duration of the request. Results are logged and, when
+    ``output_dir`` is set, written there as collapsed-stack files.
+    """
+
+    def __init__(self, sample_rate=0.0, interval=0.001, output_dir=None):
+        """
+        Args:
+            sample_rate (float): Share of requests to profile, 0 to 1
+            interval (float): Seconds between stack samples
+            output_dir (str): Directory for collapsed-stack files, if any
+        """
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.output_dir = output_dir
+        self.profiled = 0
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def maybe_start(self):
+        """
+        Start sampling the calling thread if this request is selected
+
+        Returns:
+            StackSampler: The running sampler, or None
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        return StackSampler(interval=self.interval).start()
+
+    def finish(self, sampler, label):
+        """
+        Stop a sampler and write out its profile
+
+        Args:
+            sampler (StackSampler): Sampler returned by maybe_start()
+            label (str): Name of the profiled request, e.g. 'POST /api/recommend'
+
+        Returns:
+            str: Path of the written profile, or None
+        """
+        sampler.stop()
+        self.profiled += 1
+        if not self.output_dir or not sampler.samples:
+            return None
+        safe = ''.join(c if c.isalnum() else '_' for c in label).strip('_')
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.profiled}-{safe}.folded")
+        with open(path, 'w') as f:
+            f.write(sampler.collapsed())
+        return path
@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with a time-to-live, for recommendation results.
+
+    Entries are evicted when the cache is over ``max_size`` (least recently
+    used first) or older than ``ttl`` seconds. Hit, miss, eviction and
+    expiration counters are kept for the stats endpoint. An optional
+    SharedQueryCache behind it lets gunicorn workers reuse each other's
+    results; keys and values must then be JSON-serialisable.
+    """
+
+    def __init__(self, max_size=1024, ttl=300, shared=None):
+        """
+        Args:
+            max_size (int): Maximum number of entries; 0 disables the cache
+            ttl (float): Seconds an entry stays valid; 0 or None for no expiry
+            shared (SharedQueryCache): Optional cross-process second level
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_hits = 0
+
+    def get(self, key):
+        """
+        Look up a key
+
+        Args:
+            key (tuple): Cache key
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        if not self.max_size:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                    self.hits += 1
+                self._store(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """
+        Store a value
+
+        Args:
+            key (tuple): Cache key
+            value: Value to cache; must not be mutated afterwards
+        """
+        if not self.max_size:
+            return
+        self._store(key, value)
+        if self.shared is not None:
+            self.shared.put(key, value, self.ttl)
+
+    def _store(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drop every in-process entry, e.g. when the dataset is reloaded
+
+        The shared level is left alone since other workers may still be
+        serving its entries; callers put a dataset generation in their keys
+        instead. Use ``shared.clear()`` to empty it explicitly.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Cache counters
+
+        Returns:
+            dict: Size, limits and hit/miss/eviction/expiration counts
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'shared': self.shared is not None,
+                'shared_hits': self.shared_hits,
+            }
+
+
+class SharedQueryCache:
+    """
+    Cross-process cache level stored in a local SQLite file.
+
+    Every gunicorn worker opens the same file, so a result computed by one
+    worker is a hit for the others. SQLite handles the locking; each thread
+    gets its own connection. Rows are pruned to ``max_size`` and past their
+    expiry now and then on writes.
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path, max_size=10000):
+        """
+        Args:
+            path (str): SQLite database file
+            max_size (int): Maximum number of rows kept
+        """
+        self.path = path
+        self.max_size = max_size
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS results '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)'
+            )
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=1.0)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=OFF')
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        try:
+            row = self._connect().execute(
+                'SELECT value FROM results WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (json.dumps(key), time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Shared query cache read failed: %s", e)
+            return None
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        try:
+            with self._connect() as db:
+                db.execute(
+                    'INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)',
+                    (json.dumps(key), json.dumps(value), expires)
+                )
+                self._writes += 1
+                if self._writes % self.PRUNE_EVERY == 0:
+                    db.execute('DELETE FROM results WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+                    db.execute(
+                        'DELETE FROM results WHERE rowid NOT IN '
+                        '(SELECT rowid FROM results ORDER BY rowid DESC LIMIT ?)',
+                        (self.max_size,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning("Shared query cache write failed: %s", e)
+
+    def clear(self):
+        try:
+            with self._connect() as db:
+                db.execute('DELETE FROM results')
+        except sqlite3.Error as e:
+            logger.warning("Shared query cache clear failed: %s", e)
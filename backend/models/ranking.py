@@ -0,0 +1,73 @@
+import heapq
+import itertools
+import numpy as np
+
+
+def select_top_k(scores, top_n, ids=None):
+    """
+    Pick the ``top_n`` highest positive scores without a full sort
+
+    Args:
+        scores (numpy.ndarray): Scores to rank
+        top_n (int): Number of entries to return
+        ids (numpy.ndarray): Recipe id of each score; defaults to its position
+
+    Returns:
+        tuple: (recipe ids, scores), best first with ties in recipe id order
+    """
+    if ids is None:
+        ids = np.arange(len(scores))
+    keep = scores > 0
+    ids, scores = ids[keep], scores[keep]
+    if top_n <= 0 or not len(ids):
+        return ids[:0], scores[:0]
+    if len(ids) > top_n:
+        # Keep every recipe tied with the k-th best so tie-breaking stays stable
+        threshold = scores[np.argpartition(scores, -top_n)[-top_n]]
+        keep = scores >= threshold
+        ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))[:top_n]
+    return ids[order], scores[order]
+
+
+def select_top_k_rows(matrix, top_n):
+    """
+    Apply select_top_k to every row of a sparse query-by-recipe score matrix
+
+    Args:
+        matrix (scipy.sparse.csr_matrix): One row of recipe scores per query
+        top_n (int): Number of entries to return per row
+
+    Returns:
+        list: One (recipe ids, scores) tuple per row, in row order
+    """
+    matrix = matrix.tocsr()
+    results = []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        results.append(select_top_k(matrix.data[start:end], top_n, matrix.indices[start:end]))
+    return results
+
+
+def merge_top_k(parts, top_n):
+    """
+    Merge ranked lists over disjoint recipes into one global top-k
+
+    Each part is sorted best first with ties in recipe id order, as
+    select_top_k returns them, so a heap merge on (-score, id) reads only the
+    first ``top_n`` entries and gives the same ranking as select_top_k over
+    all the recipes at once.
+
+    Args:
+        parts (list): (recipe ids, scores) tuples, e.g. one per shard
+        top_n (int): Number of entries to return
+
+    Returns:
+        tuple: (recipe ids, scores), best first with ties in recipe id order
+    """
+    dtype = parts[0][1].dtype if parts else np.float64
+    merged = heapq.merge(*(zip((-scores).tolist(), ids.tolist()) for ids, scores in parts))
+    best = list(itertools.islice(merged, max(top_n, 0)))
+    ids = np.fromiter((idx for _, idx in best), dtype=np.int32, count=len(best))
+    scores = np.fromiter((-score for score, _ in best), dtype=dtype, count=len(best))
+    return ids, scores
@@ -0,0 +1,291 @@
+from collections import namedtuple
+import numpy as np
+from models.ingredient_parser import canonicalize
+
+# Ingredients a group name stands for in constraints, e.g. "exclude": ["nuts"].
+# Members are matched like any constraint ingredient, by canonical words.
+INGREDIENT_GROUPS = {
+    'nuts': ('nut', 'almond', 'walnut', 'pecan', 'cashew', 'hazelnut', 'pistachio', 'peanut',
+             'macadamia', 'pine nut', 'praline', 'marzipan'),
+    'dairy': ('milk', 'butter', 'buttermilk', 'cream', 'cheese', 'yogurt', 'ghee', 'mascarpone',
+              'ricotta', 'parmesan', 'mozzarella', 'cheddar', 'feta', 'gruyere', 'creme fraiche', 'kefir'),
+    'gluten': ('flour', 'bread', 'breadcrumb', 'panko', 'pasta', 'noodle', 'spaghetti', 'wheat',
+               'barley', 'rye', 'couscous', 'bulgur', 'farro', 'semolina', 'cracker', 'tortilla'),
+    'shellfish': ('shrimp', 'prawn', 'crab', 'lobster', 'scallop', 'clam', 'mussel', 'oyster', 'crawfish'),
+    'meat': ('beef', 'pork', 'chicken', 'lamb', 'veal', 'turkey', 'duck', 'bacon', 'ham', 'sausage',
+             'prosciutto', 'pancetta', 'chorizo', 'salami', 'steak'),
+}
+
+# Ingredients sharing a word with a group member that are not in the group,
+# such as "coconut milk" or "peanut butter" for dairy. A canonical ingredient
+# containing every word of one of these is left out of the group, since an
+# exclusion filter should not drop recipes that are safe to eat.
+GROUP_EXCEPTIONS = {
+    'dairy': ('coconut', 'almond milk', 'soy milk', 'oat milk', 'rice milk', 'cashew milk', 'hemp milk',
+              'cream of tartar', 'cream soda', 'cream sherry', 'peanut butter', 'almond butter', 'cashew butter',
+              'nut butter', 'seed butter', 'sunflower butter', 'cocoa butter', 'cacao butter', 'shea butter',
+              'apple butter', 'butter lettuce', 'butter bean', 'vegan', 'dairy free', 'nondairy', 'non dairy'),
+    'gluten': ('gluten free', 'rice flour', 'almond flour', 'coconut flour', 'chickpea flour', 'corn flour',
+               'tapioca flour', 'potato flour', 'buckwheat flour', 'corn tortilla', 'rice noodle', 'rice pasta',
+               'rice cracker'),
+}
+
+# Constraints of a recommendation query: ingredients every recipe must have,
+# ingredients none may have (both sorted tuples) and a maximum ingredient count
+RecipeConstraints = namedtuple('RecipeConstraints', ['include', 'exclude', 'max_ingredients'])
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _ingredient_list(value, name):
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"'{name}' must be a list of ingredients or a comma-separated string")
+    return tuple(sorted({' '.join(item.lower().split()) for item in value if item.strip()}))
+
+
+def parse_constraints(include=None, exclude=None, max_ingredients=None):
+    """
+    Validate the constraints of a recommendation request
+
+    Args:
+        include: Ingredients (or group names, see INGREDIENT_GROUPS) every
+            recipe must contain, as a list or comma-separated string
+        exclude: Ingredients or group names no recipe may contain
+        max_ingredients: Largest number of ingredients a recipe may have
+
+    Returns:
+        RecipeConstraints: The normalized constraints, or None if there are none
+
+    Raises:
+        ValueError: If a value is malformed
+    """
+    include = _ingredient_list(include, 'include')
+    exclude = _ingredient_list(exclude, 'exclude')
+    if max_ingredients is not None:
+        try:
+            max_ingredients = int(max_ingredients)
+        except (TypeError, ValueError):
+            raise ValueError("'max_ingredients' must be an integer")
+        if max_ingredients < 1:
+            raise ValueError("'max_ingredients' must be at least 1")
+    if not include and not exclude and max_ingredients is None:
+        return None
+    return RecipeConstraints(include, exclude, max_ingredients)
+
+
+def ids_to_bitmap(ids, size):
+    """
+    Pack sorted recipe ids into a bitmap
+
+    Bitmaps are uint8 arrays with bit ``i % 8`` of byte ``i // 8`` set for
+    recipe ``i`` (numpy's 'little' bit order); bits past ``size`` are clear.
+
+    Args:
+        ids (numpy.ndarray): Sorted recipe ids, duplicates allowed
+        size (int): Number of recipes the bitmap covers
+
+    Returns:
+        numpy.ndarray: The bitmap
+    """
+    bitmap = np.zeros((size + 7) // 8, dtype=np.uint8)
+    if len(ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = ids >> 3
+        bits = np.left_shift(1, ids & 7).astype(np.uint8)
+        # OR together the bits of ids falling in the same byte
+        starts = np.flatnonzero(np.concatenate(([True], positions[1:] != positions[:-1])))
+        bitmap[positions[starts]] = np.bitwise_or.reduceat(bits, starts)
+    return bitmap
+
+
+def bitmap_contains(bitmap, ids):
+    """Whether each of ``ids`` is in the bitmap, as a boolean array"""
+    ids = np.asarray(ids, dtype=np.int64)
+    return ((bitmap[ids >> 3] >> (ids & 7).astype(np.uint8)) & 1).astype(bool)
+
+
+def bitmap_mask(bitmap, size):
+    """The bitmap as one boolean per recipe"""
+    return np.unpackbits(bitmap, count=size, bitorder='little').view(bool)
+
+
+def bitmap_count(bitmap):
+    """Number of recipes in the bitmap"""
+    return int(_POPCOUNT[bitmap].sum(dtype=np.int64))
+
+
+def _item_words(item):
+    """
+    Canonical word sets an ingredient or group name stands for
+
+    Returns:
+        tuple: (word sets of its members, word sets of its exceptions)
+    """
+    return (
+        [set(canonicalize(member).split()) for member in INGREDIENT_GROUPS.get(item, (item,))],
+        [set(canonicalize(exception).split()) for exception in GROUP_EXCEPTIONS.get(item, ())],
+    )
+
+
+def constraint_mask(ingredient_names, lengths, constraints):
+    """
+    Evaluate constraints recipe by recipe, for small recipe sets
+
+    Gives the same result as IngredientBitmaps.allowed() for recipes that are
+    not in its vocabulary, such as those ingested since it was built.
+
+    Args:
+        ingredient_names (list): Per recipe, its canonical ingredient names
+        lengths (list): Per recipe, its number of distinct canonical ingredients
+        constraints (RecipeConstraints): Constraints to apply
+
+    Returns:
+        numpy.ndarray: One boolean per recipe, True if it satisfies them
+    """
+    def matches(names, item_words):
+        members, exceptions = item_words
+        for name in names:
+            name_words = set(name.split())
+            if (any(words and words <= name_words for words in members)
+                    and not any(words <= name_words for words in exceptions)):
+                return True
+        return False
+
+    include = [_item_words(item) for item in constraints.include]
+    exclude = [_item_words(item) for item in constraints.exclude]
+    mask = np.ones(len(lengths), dtype=bool)
+    for row, (names, length) in enumerate(zip(ingredient_names, lengths)):
+        if constraints.max_ingredients is not None and length > constraints.max_ingredients:
+            mask[row] = False
+        elif not all(matches(names, words) for words in include) or any(matches(names, words) for words in exclude):
+            mask[row] = False
+    return mask
+
+
+class IngredientBitmaps:
+    """
+    Recipe sets per canonical ingredient and per ingredient count, for constraint filtering.
+
+    Constraints are resolved to one bitmap of allowed recipes before any
+    scoring: an ingredient (or group, see INGREDIENT_GROUPS) stands for the
+    recipes using any canonical ingredient containing its words, as in
+    IngredientVocabulary.matching_terms, except a group's GROUP_EXCEPTIONS;
+    ``include`` ingredients are ANDed,
+    ``exclude`` ingredients ORed and negated, and ``max_ingredients`` is
+    ANDed as a precomputed "at most k ingredients" bitmap.
+
+    As in roaring bitmaps, each ingredient's set is kept in whichever form is
+    smaller: common ingredients as a bitmap (one bit per recipe), the many
+    rare ones as their sorted posting list from the vocabulary, which is
+    packed into bits only when a query needs it. Resolved ingredients are
+    cached, so repeated constraints such as "exclude dairy" cost a lookup.
+    """
+
+    # A bitmap is smaller than an int32 posting list above size / 32 recipes
+    DENSE_RATIO = 32
+
+    ITEM_CACHE_SIZE = 256
+
+    def __init__(self, vocabulary, recipe_lengths):
+        """
+        Args:
+            vocabulary (IngredientVocabulary): Canonical ingredients and their postings
+            recipe_lengths (numpy.ndarray): Number of distinct canonical
+                ingredients of each recipe (IngredientVocabulary.recipe_lengths)
+        """
+        self.vocabulary = vocabulary
+        self.size = size = len(recipe_lengths)
+        dense = np.flatnonzero(vocabulary.document_frequency * self.DENSE_RATIO > size)
+        self.dense = {int(tid): ids_to_bitmap(vocabulary.term_recipe_ids(tid), size) for tid in dense}
+
+        # at_most[k] holds the recipes with at most k ingredients, built by
+        # adding each count's recipes to the previous bitmap
+        lengths = np.asarray(recipe_lengths, dtype=np.int64)
+        max_length = int(lengths.max()) if size else 0
+        order = np.argsort(lengths, kind='stable')
+        bounds = np.searchsorted(lengths[order], np.arange(max_length + 2))
+        self.at_most = []
+        bitmap = np.zeros((size + 7) // 8, dtype=np.uint8)
+        for k in range(max_length + 1):
+            bitmap = bitmap | ids_to_bitmap(np.sort(order[bounds[k]:bounds[k + 1]]), size)
+            self.at_most.append(bitmap)
+        self._items = {}
+
+    def nbytes(self):
+        """Memory held by the precomputed bitmaps"""
+        return sum(bitmap.nbytes for bitmap in self.dense.values()) + sum(bitmap.nbytes for bitmap in self.at_most)
+
+    def item(self, ingredient):
+        """
+        Bitmap of the recipes with an ingredient matching ``ingredient``
+
+        Args:
+            ingredient (str): Normalized ingredient or group name
+
+        Returns:
+            numpy.ndarray: The bitmap; must not be modified
+        """
+        cached = self._items.get(ingredient)
+        if cached is not None:
+            return cached
+
+        members = INGREDIENT_GROUPS.get(ingredient, (ingredient,))
+        term_ids = np.unique(np.concatenate(
+            [self.vocabulary.matching_terms(member) for member in members] + [np.zeros(0, dtype=np.int32)]
+        ))
+        exceptions = [self.vocabulary.matching_terms(exception) for exception in GROUP_EXCEPTIONS.get(ingredient, ())]
+        if exceptions:
+            term_ids = np.setdiff1d(term_ids, np.concatenate(exceptions))
+        bitmap = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        postings = []
+        for tid in term_ids.tolist():
+            dense = self.dense.get(tid)
+            if dense is not None:
+                bitmap |= dense
+            else:
+                postings.append(self.vocabulary.term_recipe_ids(tid))
+        if postings:
+            bitmap |= ids_to_bitmap(np.sort(np.concatenate(postings)), self.size)
+
+        if len(self._items) >= self.ITEM_CACHE_SIZE:
+            self._items.clear()
+        self._items[ingredient] = bitmap
+        return bitmap
+
+    def allowed(self, constraints):
+        """
+        Bitmap of the recipes satisfying constraints
+
+        Args:
+            constraints (RecipeConstraints): Constraints, or None
+
+        Returns:
+            numpy.ndarray: The bitmap, or None if nothing is constrained
+        """
+        if constraints is None:
+            return None
+        bitmap = None
+        for ingredient in constraints.include:
+            item = self.item(ingredient)
+            bitmap = item if bitmap is None else bitmap & item
+        if constraints.max_ingredients is not None and constraints.max_ingredients < len(self.at_most) - 1:
+            at_most = self.at_most[constraints.max_ingredients]
+            bitmap = at_most if bitmap is None else bitmap & at_most
+        if constraints.exclude:
+            excluded = self.item(constraints.exclude[0])
+            for ingredient in constraints.exclude[1:]:
+                excluded = excluded | self.item(ingredient)
+            bitmap = ~excluded if bitmap is None else bitmap & ~excluded
+        if bitmap is None:
+            # Only a max_ingredients that every recipe satisfies
+            bitmap = np.full((self.size + 7) // 8, 0xFF, dtype=np.uint8)
+        else:
+            bitmap = bitmap.copy()
+        # NOT sets the padding bits past the last recipe
+        if self.size % 8:
+            bitmap[-1] &= (1 << (self.size % 8)) - 1
+        return bitmap
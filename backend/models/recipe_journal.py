@@ -0,0 +1,336 @@
+import contextlib
+import csv
+import fcntl
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Recipes parsed and written to the journal per step of a bulk import
+CHUNK_SIZE = 500
+
+
+def parse_recipe(data):
+    """
+    Validate a recipe submitted for ingestion and convert it to dataset columns
+
+    Args:
+        data (dict): ``title``, ``ingredients`` (a list of lines, or one
+            comma-separated string) and ``instructions``; optionally
+            ``image_name`` and ``rating``
+
+    Returns:
+        dict: The recipe keyed by dataset CSV column
+
+    Raises:
+        ValueError: If a required field is missing or malformed
+    """
+    if not isinstance(data, dict):
+        raise ValueError("A recipe must be a JSON object")
+    title = data.get('title')
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("'title' must be a non-empty string")
+    instructions = data.get('instructions')
+    if not isinstance(instructions, str) or not instructions.strip():
+        raise ValueError("'instructions' must be a non-empty string")
+
+    ingredients = data.get('ingredients')
+    if isinstance(ingredients, str):
+        ingredients = ingredients.split(',')
+    if not isinstance(ingredients, list) or not all(isinstance(line, str) for line in ingredients):
+        raise ValueError("'ingredients' must be a list of strings")
+    ingredients = [' '.join(line.split()) for line in ingredients]
+    ingredients = [line for line in ingredients if line]
+    if not ingredients:
+        raise ValueError("'ingredients' must not be empty")
+
+    recipe = {
+        'Title': title.strip(),
+        # Same list-literal form as the dataset's own columns
+        'Ingredients': str(ingredients),
+        'Instructions': instructions.strip(),
+        'Image_Name': data.get('image_name') or '',
+        'Cleaned_Ingredients': str(ingredients),
+    }
+    if data.get('rating') is not None:
+        try:
+            recipe['Rating'] = float(data['rating'])
+        except (TypeError, ValueError):
+            raise ValueError("'rating' must be a number")
+    if not isinstance(recipe['Image_Name'], str):
+        raise ValueError("'image_name' must be a string")
+    return recipe
+
+
+def iter_recipe_chunks(lines, chunk_size=CHUNK_SIZE):
+    """
+    Parse JSON Lines recipes a chunk at a time
+
+    Args:
+        lines (iterable): Lines of text or bytes, one JSON recipe per line
+        chunk_size (int): Recipes per chunk
+
+    Yields:
+        list: Parsed recipes (see parse_recipe), at most ``chunk_size`` each
+
+    Raises:
+        ValueError: On the first invalid line, naming its line number
+    """
+    chunk = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            chunk.append(parse_recipe(json.loads(line)))
+        except ValueError as e:
+            raise ValueError(f"Line {number}: {e}")
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def count_csv_rows(path):
+    """Number of records in a CSV file, not counting the header"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+class RecipeJournal:
+    """
+    Append-only JSON Lines log of recipes ingested since the dataset CSV was written.
+
+    The first line is a header, ``{"base": N, "csv_size": bytes}``: N is the
+    number of recipes in the CSV, so the recipe on journal line i (from 0)
+    has id ``N + i``, the row it will occupy once appended to the CSV. Ids
+    therefore never change when the journal is compacted into the CSV, and
+    ``csv_size`` detects a CSV that was replaced behind the journal's back.
+
+    Writers hold an exclusive ``flock`` on ``<journal>.lock``, so any
+    number of processes (gunicorn workers, the import CLI) can append.
+    Readers only tail the file: lines are written whole and a reader stops
+    at the last newline. A failed append is rolled back, and the partial
+    last line of a writer that died is dropped by the next append.
+
+    Compaction appends the entries to the CSV and replaces the journal with
+    an empty one, giving it a new inode that readers notice. It first
+    writes ``<journal>.compacting``; finding that marker for the current
+    journal means a compaction died after it started appending, so the CSV
+    is cut back to ``csv_size`` and the entries are appended again. A
+    recipe thus lands in the CSV exactly once, however far an interrupted
+    compaction got.
+    """
+
+    def __init__(self, path, dataset_path):
+        """
+        Args:
+            path (str): Journal file
+            dataset_path (str): Recipe CSV the journal extends
+        """
+        self.path = path
+        self.dataset_path = dataset_path
+        self.marker_path = f"{path}.compacting"
+        # (inode, byte offset, entries up to that offset) of the last count
+        self._count = None
+
+    @contextlib.contextmanager
+    def lock(self, blocking=True):
+        """
+        Hold the journal's write lock
+
+        Args:
+            blocking (bool): Wait for the lock; otherwise yield False at once
+                if another process holds it
+
+        Yields:
+            bool: Whether the lock is held
+        """
+        with open(self.path + '.lock', 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read_header(self):
+        """
+        The journal header
+
+        Returns:
+            dict: ``base`` and ``csv_size``, or None if there is no journal
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    def _write_header(self, base):
+        """Replace the journal with an empty one starting at recipe id ``base``"""
+        header = {'base': base, 'csv_size': os.path.getsize(self.dataset_path)}
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._count = None
+        return header
+
+    def _read_marker(self):
+        """Journal base of the compaction in progress, or None"""
+        try:
+            with open(self.marker_path, encoding='utf-8') as f:
+                return json.load(f)['base']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_marker(self, base):
+        with open(self.marker_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'base': base}))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _entry_count(self, f):
+        """Entries in the open journal, counting only lines added since the last call"""
+        stat = os.fstat(f.fileno())
+        inode, offset, count = self._count if self._count and self._count[0] == stat.st_ino else (stat.st_ino, 0, -1)
+        f.seek(offset)
+        for line in f:
+            if line.endswith(b'\n'):
+                count += 1
+                offset += len(line)
+        self._count = (inode, offset, count)
+        return max(count, 0)
+
+    def append(self, recipes, base=None):
+        """
+        Append parsed recipes
+
+        Args:
+            recipes (list): Recipes as returned by parse_recipe()
+            base (int): Number of recipes in the CSV, if known, for a new
+                journal; counted from the CSV otherwise
+
+        Returns:
+            list: Ids assigned to the recipes
+        """
+        data = ''.join(json.dumps(recipe) + '\n' for recipe in recipes).encode('utf-8')
+        with self.lock():
+            header = self.read_header()
+            if header is None:
+                header = self._write_header(count_csv_rows(self.dataset_path) if base is None else base)
+            with open(self.path, 'ab+') as f:
+                first_id = header['base'] + self._entry_count(f)
+                end = self._count[1]
+                if os.fstat(f.fileno()).st_size > end:
+                    # A writer died mid-line; the next line would be glued to it
+                    logger.warning("Dropping a partly written entry at the end of %s", self.path)
+                    os.ftruncate(f.fileno(), end)
+                try:
+                    # Unbuffered, so that nothing is left to be written after a rollback
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(f.fileno(), view):]
+                    os.fsync(f.fileno())
+                except BaseException:
+                    # Readers must not serve recipes whose ids the caller never got
+                    os.ftruncate(f.fileno(), end)
+                    raise
+        return list(range(first_id, first_id + len(recipes)))
+
+    def read(self, position=None):
+        """
+        Read entries written since a previous read
+
+        Args:
+            position (tuple): Position returned by the previous read; if the
+                journal has been replaced since, it is read from the start
+
+        Returns:
+            tuple: (header, position after the last whole line, list of
+                (recipe id, recipe) pairs), or None if there is no journal
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+            header = json.loads(f.readline())
+            if position is not None and position[0] == inode:
+                _, offset, count = position
+                f.seek(offset)
+            else:
+                offset, count = f.tell(), 0
+            entries = []
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Partly written; picked up by the next read
+                    break
+                entries.append((header['base'] + count, json.loads(line)))
+                offset += len(line)
+                count += 1
+        return header, (inode, offset, count), entries
+
+    def compact(self):
+        """
+        Append every journal entry to the CSV and start an empty journal
+
+        Returns:
+            int: Number of recipes moved into the CSV; 0 if there were none,
+                the lock was busy or the CSV no longer matches the journal
+        """
+        with self.lock(blocking=False) as locked:
+            if not locked:
+                return 0
+            state = self.read()
+            if state is None:
+                return 0
+            header, _, entries = state
+            base = header['base']
+            marker = self._read_marker()
+            if marker is not None and marker != base:
+                # Left by a compaction that finished but for removing it
+                os.remove(self.marker_path)
+                marker = None
+            if not entries:
+                return 0
+            if marker is not None:
+                # A compaction of these entries died after it started
+                # appending: drop whatever rows it wrote and start over
+                if os.path.getsize(self.dataset_path) >= header['csv_size']:
+                    logger.warning("Redoing an interrupted compaction of %s", self.path)
+                    os.truncate(self.dataset_path, header['csv_size'])
+            if os.path.getsize(self.dataset_path) != header['csv_size']:
+                logger.error("%s changed since %s was started; not compacting", self.dataset_path, self.path)
+                return 0
+            self._write_marker(base)
+
+            with open(self.dataset_path, newline='', encoding='utf-8') as f:
+                columns = next(csv.reader(f))
+            with open(self.dataset_path, 'rb') as f:
+                # Start on a new line even if the CSV lacks a final newline
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+            with open(self.dataset_path, 'a', newline='', encoding='utf-8') as f:
+                if needs_newline:
+                    f.write('\n')
+                writer = csv.DictWriter(f, fieldnames=columns, restval='', extrasaction='ignore', lineterminator='\n')
+                for recipe_id, recipe in entries:
+                    # The unnamed pandas index column keeps its integer ids
+                    row = {column: recipe_id for column in columns if not column or column.startswith('Unnamed')}
+                    row.update(recipe)
+                    writer.writerow(row)
+                f.flush()
+                os.fsync(f.fileno())
+            self._write_header(base + len(entries))
+            os.remove(self.marker_path)
+        logger.info("Compacted %d ingested recipes into %s", len(entries), self.dataset_path)
+        return len(entries)
@@ -0,0 +1,176 @@
+import json
+import math
+import os
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard encoder gives the same JSON
+    orjson = None
+
+# Fields of a recipe in API responses, in the (sorted) order they are written
+RECIPE_FIELDS = ('id', 'image_name', 'image_url', 'ingredients', 'instructions', 'rating', 'similarity_score', 'title')
+
+# Fields serialized once per recipe at load time, with the column they come from.
+# The others depend on the image manifest, the request or the query.
+PRESERIALIZED_FIELDS = {
+    'title': 'Title',
+    'ingredients': 'Cleaned_Ingredients',
+    'instructions': 'Instructions',
+    'rating': 'Rating',
+}
+
+
+def dumps(value):
+    """
+    Serialize a value to compact JSON
+
+    Uses orjson when it is installed. NaN and infinite floats must not be
+    passed: orjson writes them as null, the standard encoder as invalid JSON.
+
+    Returns:
+        bytes: UTF-8 JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def parse_fields(value):
+    """
+    Parse a ``fields`` projection
+
+    Args:
+        value: Comma-separated field names, a list of them, or None for all
+
+    Returns:
+        tuple: Field names in RECIPE_FIELDS order; 'id' is always included
+
+    Raises:
+        ValueError: If a field is unknown
+    """
+    if value is None or value == '':
+        return RECIPE_FIELDS
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list) or not all(isinstance(field, str) for field in value):
+        raise ValueError("'fields' must be a comma-separated string or a list of field names")
+    requested = {field.strip() for field in value if field.strip()}
+    unknown = sorted(requested.difference(RECIPE_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Expected any of: {', '.join(RECIPE_FIELDS)}")
+    requested.add('id')
+    return tuple(field for field in RECIPE_FIELDS if field in requested)
+
+
+def project_recipe(recipe, fields):
+    """Copy of a recipe dictionary with only ``fields``, in RECIPE_FIELDS order"""
+    return {field: recipe[field] for field in fields if field in recipe}
+
+
+def encode_object(members):
+    """
+    Assemble a JSON object from already serialized values
+
+    Args:
+        members (list): (field name, JSON bytes) pairs, in output order
+
+    Returns:
+        bytes: The JSON object
+    """
+    return b'{' + b','.join(b'"%s":%s' % (name.encode('ascii'), value) for name, value in members) + b'}'
+
+
+def image_url(backend_url, image_name):
+    """URL of a recipe image served by /api/images"""
+    return f"{backend_url}/api/images/{os.path.splitext(image_name)[0]}"
+
+
+class RecipePayloads:
+    """
+    JSON fragments of every recipe's static fields, serialized once at load time.
+
+    For each field in PRESERIALIZED_FIELDS whose column the dataset has,
+    the JSON text of every recipe's value is packed into one byte blob with
+    an offsets array, like a string table. A response is then assembled by
+    slicing and joining bytes, without building dictionaries or encoding
+    the (long) instructions again. The arrays are saved in the dataset
+    cache, so workers map them instead of rebuilding them.
+    """
+
+    def __init__(self, arrays=None):
+        """
+        Args:
+            arrays (dict): ``<field>_blob`` and ``<field>_offsets`` arrays
+        """
+        self.arrays = arrays or {}
+        self.fields = tuple(field for field in PRESERIALIZED_FIELDS if f"{field}_blob" in self.arrays)
+
+    def build(self, store):
+        """
+        Serialize the static fields of every recipe in a store
+
+        Missing strings become null, missing ingredient lists an empty list
+        and a missing (NaN) rating null, so every fragment is valid JSON.
+
+        Args:
+            store (RecipeStore): Recipe store
+
+        Returns:
+            RecipePayloads: self, for chaining
+        """
+        ids = range(len(store))
+        arrays = {}
+        for field, column in PRESERIALIZED_FIELDS.items():
+            if column not in store.columns:
+                continue
+            values = store.values(column, ids)
+            if field == 'ingredients':
+                values = [value.split(', ') if value is not None else [] for value in values]
+            elif field == 'rating':
+                values = [float(value) if value is not None and not math.isnan(value) else None for value in values]
+            fragments = [dumps(value) for value in values]
+            offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(fragment) for fragment in fragments])
+            arrays[f"{field}_blob"] = np.frombuffer(b''.join(fragments), dtype=np.uint8)
+            arrays[f"{field}_offsets"] = offsets
+        self.arrays = arrays
+        self.fields = tuple(field for field in PRESERIALIZED_FIELDS if f"{field}_blob" in arrays)
+        return self
+
+    def to_arrays(self):
+        """
+        Export the fragments for the dataset cache
+
+        Returns:
+            tuple: (dict of numpy arrays, dict of JSON-serialisable metadata)
+        """
+        return self.arrays, {'fields': list(self.fields)}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """
+        Restore fragments exported with to_arrays()
+
+        Args:
+            arrays (dict): Arrays, possibly memory-mapped
+            meta (dict): Metadata
+
+        Returns:
+            RecipePayloads: The restored fragments
+        """
+        return cls({key: value for key, value in arrays.items() if key.rsplit('_', 1)[0] in meta['fields']})
+
+    def fragment(self, field, idx):
+        """
+        JSON text of one field of one recipe
+
+        Args:
+            field (str): Field in ``fields``
+            idx (int): Recipe id
+
+        Returns:
+            bytes: The serialized value
+        """
+        offsets = self.arrays[f"{field}_offsets"]
+        return self.arrays[f"{field}_blob"][offsets[idx]:offsets[idx + 1]].tobytes()
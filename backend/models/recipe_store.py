@@ -0,0 +1,115 @@
+import numpy as np
+from models.dataset_cache import dataframe_to_arrays, read_string
+
+
+class RecipeStore:
+    """
+    Read-only columnar recipe table backed by flat (usually memory-mapped) arrays.
+
+    String columns are string tables (a UTF-8 blob plus offsets and a null
+    mask) and numeric columns are plain arrays, exactly as written by
+    ``dataframe_to_arrays``. Values are decoded only when a row is read, so
+    opening the store costs nothing beyond mapping the files, and every
+    worker process that maps the same files shares their pages through the
+    OS page cache.
+    """
+
+    def __init__(self, arrays, meta):
+        """
+        Args:
+            arrays (dict): Column arrays as produced by dataframe_to_arrays()
+            meta (dict): Column names and kinds as produced by dataframe_to_arrays()
+        """
+        self.arrays = arrays
+        self.meta = meta
+        self.columns = list(meta['columns'])
+        self._kinds = dict(zip(self.columns, meta['kinds']))
+        self._positions = {column: i for i, column in enumerate(self.columns)}
+        first = self._column_arrays(self.columns[0]) if self.columns else None
+        if first is None:
+            self._length = 0
+        elif self._kinds[self.columns[0]] == 'numeric':
+            self._length = len(first[0])
+        else:
+            self._length = len(first[1]) - 1
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        Build an in-memory store from a DataFrame
+
+        Args:
+            df (pandas.DataFrame): DataFrame of numeric and string columns
+
+        Returns:
+            RecipeStore: The new store
+        """
+        return cls(*dataframe_to_arrays(df))
+
+    def to_arrays(self):
+        """
+        Export the store for the dataset cache
+
+        Returns:
+            tuple: (dict of numpy arrays, dict of JSON-serialisable metadata)
+        """
+        return self.arrays, self.meta
+
+    def __len__(self):
+        return self._length
+
+    def set_column(self, column, values):
+        """
+        Add or replace a derived numeric column held in memory
+
+        The mapped arrays are never modified; derived columns such as image
+        availability live alongside them and are recomputed on reload.
+
+        Args:
+            column (str): Column name
+            values (numpy.ndarray): One value per recipe
+        """
+        if len(values) != len(self):
+            raise ValueError(f"Column '{column}' has {len(values)} values for {len(self)} recipes")
+        if column not in self._positions:
+            self._positions[column] = len(self.columns)
+            self.columns.append(column)
+        self._kinds[column] = 'numeric'
+        self.arrays = dict(self.arrays)
+        self.arrays[f"col{self._positions[column]}"] = np.asarray(values)
+
+    def _column_arrays(self, column):
+        i = self._positions[column]
+        if self._kinds[column] == 'numeric':
+            return (self.arrays[f"col{i}"],)
+        return self.arrays[f"col{i}_blob"], self.arrays[f"col{i}_offsets"], self.arrays[f"col{i}_null"]
+
+    def value(self, column, idx):
+        """
+        Read one value
+
+        Args:
+            column (str): Column name
+            idx (int): Recipe id (row position)
+
+        Returns:
+            The value as a Python str, int or float; None for a missing string
+        """
+        return self.values(column, [idx])[0]
+
+    def values(self, column, ids):
+        """
+        Read one column for several rows
+
+        Args:
+            column (str): Column name
+            ids (list): Recipe ids (row positions)
+
+        Returns:
+            list: Values in the order of ``ids``
+        """
+        arrays = self._column_arrays(column)
+        if self._kinds[column] == 'numeric':
+            return arrays[0][np.asarray(ids, dtype=np.int64)].tolist()
+        blob, offsets, null = arrays
+        return [None if null[idx] else read_string(blob, offsets, idx) for idx in ids]
@@ -1,58 +1,645 @@
+import logging
 import numpy as np
 import pandas as pd
 import os
-import sys
+from models.ingredient_index import IngredientIndex
+from models.ingredient_vocabulary import IngredientVocabulary
+from models.tfidf_model import TfidfIngredientModel
+from models.semantic_model import SemanticIngredientModel
+from models.ingredient_suggester import IngredientSuggester
+from models.spelling import SpellingCorrector
+from models.ranking import merge_top_k, select_top_k, select_top_k_rows
+from models.sharding import ShardedScorer
+from models.dataset_cache import DatasetCache
+from models.recipe_store import RecipeStore
+from models.recipe_filter import IngredientBitmaps, bitmap_count, bitmap_mask
+from models.recipe_payloads import RECIPE_FIELDS, RecipePayloads, dumps, encode_object, image_url, project_recipe
+from models.query_cache import QueryCache
+from models.metrics import COUNT_BUCKETS, metrics, stage
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_ingredients(ingredients):
+    """
+    Canonical form of a user ingredient list: lowercased, stripped, without
+    blanks or duplicates, sorted
+    
+    Scoring only depends on the set of ingredients, so equivalent queries
+    share one result cache entry.
+    """
+    return sorted({ing.strip().lower() for ing in ingredients if ing and ing.strip()})
+
 
 class RecipeRecommender:
-    def __init__(self, dataset_path):
+    # Scoring methods accepted by recommend(), mapped to their implementation
+    METHODS = {
+        'match': 'recommend_recipes_tfidf',
+        'tfidf': 'recommend_recipes_cosine',
+        'semantic': 'recommend_recipes_semantic',
+    }
+    
+    # Ranking functions behind each method, returning (recipe ids, scores)
+    RANKERS = {
+        'match': '_rank_match',
+        'tfidf': '_rank_tfidf',
+        'semantic': '_rank_semantic',
+    }
+    
+    # Longest ranking kept per query for paginated results
+    MAX_RANKED = 1000
+    
+    # TF-IDF scores only the recipes allowed by constraints, row by row,
+    # when they are fewer than this share of the dataset; otherwise every
+    # recipe is scored by column and the others masked out
+    FILTER_ROWS_SHARE = 0.01
+    
+    def __init__(self, dataset_path, cache_dir=None, use_cache=True, image_manifest=None, query_cache=None,
+                 ranking_cache=None):
         """
         Initialize the recipe recommender with a dataset
         
         Args:
             dataset_path (str): Path to the recipe dataset CSV
+            cache_dir (str): Directory for the compiled dataset; defaults to
+                ``<dataset>.compiled`` next to the CSV
+            use_cache (bool): Read and write the compiled dataset cache
+            image_manifest (ImageManifest): Available recipe images; when set,
+                recipes without an image file get image_name None
+            query_cache (QueryCache): Cache for recommendation results; defaults
+                to an in-process QueryCache()
+            ranking_cache (QueryCache): Cache of full rankings for paginated
+                results; defaults to an in-process QueryCache(max_size=256)
         """
         self.dataset_path = dataset_path
-        self.df = None
+        self.cache = DatasetCache(dataset_path, cache_dir) if use_cache else None
+        self.image_manifest = image_manifest
+        self.store = None
+        self.payloads = None
+        self.ingredient_index = None
+        self.vocabulary = None
+        self.tfidf_model = None
+        self.semantic_model = None
+        self.semantic_n_probe = None
+        self.suggester = None
+        self.speller = None
+        self.filters = None
+        self.sharded = None
+        self.delta = None
+        self.query_cache = query_cache if query_cache is not None else QueryCache()
+        self.ranking_cache = ranking_cache if ranking_cache is not None else QueryCache(max_size=256)
+        self.generation = None
+        self._image_count = None
         
     def load_data(self):
-        """Load and preprocess the recipe dataset"""
+        """
+        Load the recipe store, ingredient index and vocabulary, preferring the compiled cache
+        
+        Recipes are served from a RecipeStore over memory-mapped arrays, so no
+        DataFrame is kept once loading is done and worker processes share the
+        dataset through the page cache. pandas is only used to parse the CSV
+        when the cache is missing or stale.
+        """
         try:
             # Check if file exists
             if not os.path.exists(self.dataset_path):
-                print(f"Dataset file not found: {self.dataset_path}", file=sys.stderr)
+                logger.error("Dataset file not found: %s", self.dataset_path)
                 return False
+            
+            if self.cache is not None and self._load_compiled():
+                logger.info("Dataset loaded from compiled cache with %d recipes", len(self.store))
+                if self.payloads is None:
+                    # Caches compiled before payloads existed lack them
+                    self.payloads = RecipePayloads().build(self.store)
+                    self.cache.try_save('payloads', *self.payloads.to_arrays())
+                self._build_query_helpers()
+                self.update_image_availability()
+                self._invalidate_results()
+                return True
                 
-            # Print file size for debugging
+            # Log file size for debugging
             file_size = os.path.getsize(self.dataset_path) / (1024 * 1024)  # size in MB
-            print(f"Dataset file size: {file_size:.2f} MB")
+            logger.info("Dataset file size: %.2f MB", file_size)
             
             # Load the dataset
-            self.df = pd.read_csv(self.dataset_path)
-            print(f"Dataset loaded with shape: {self.df.shape}")
+            df = pd.read_csv(self.dataset_path)
+            logger.info("Dataset loaded with shape: %s", df.shape)
             
-            # Print column names for debugging
-            print(f"Columns in dataset: {self.df.columns.tolist()}")
+            # Log column names for debugging
+            logger.debug("Columns in dataset: %s", df.columns.tolist())
             
             # Check required columns
             required_columns = ['Title', 'Cleaned_Ingredients', 'Instructions']
-            missing_columns = [col for col in required_columns if col not in self.df.columns]
+            missing_columns = [col for col in required_columns if col not in df.columns]
             if missing_columns:
-                print(f"Missing required columns: {missing_columns}", file=sys.stderr)
+                logger.error("Missing required columns: %s", missing_columns)
                 return False
             
             # Clean and preprocess ingredients
-            self.df['ingredients_list'] = self.df['Cleaned_Ingredients'].apply(lambda x: x.lower().split(', '))
+            ingredient_lists = df['Cleaned_Ingredients'].apply(lambda x: x.lower().split(', '))
+            
+            # Build the inverted ingredient index used for candidate generation
+            self.ingredient_index = IngredientIndex().build(ingredient_lists)
+            logger.info("Ingredient index built with %d distinct ingredients", len(self.ingredient_index.terms))
+            
+            # Parse quantities, units and notes away into canonical ingredient ids
+            self.vocabulary = IngredientVocabulary().build(df['Cleaned_Ingredients'])
+            logger.info("Ingredient vocabulary built with %d canonical ingredients", len(self.vocabulary.terms))
+            
+            self.store = RecipeStore.from_dataframe(df)
+            
+            # Serialize each recipe's static fields once, for every later response
+            self.payloads = RecipePayloads().build(self.store)
+            
+            # Any previous model belongs to the previous dataset
+            self.tfidf_model = None
+            self.semantic_model = None
+            
+            # Serve from the memory-mapped copy so worker processes share its pages
+            if self.cache is not None and self._save_compiled():
+                self._load_compiled()
+            self._build_query_helpers()
+            self.update_image_availability()
+            self._invalidate_results()
             return True
         except Exception as e:
-            print(f"Error loading data: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc(file=sys.stderr)
+            logger.exception("Error loading data: %s", e)
             return False
     
+    def _build_query_helpers(self):
+        """Build the autocomplete, spelling and constraint indexes from the vocabulary"""
+        self.suggester = IngredientSuggester(self.vocabulary.terms, self.vocabulary.document_frequency)
+        self.speller = SpellingCorrector.from_vocabulary(self.vocabulary)
+        self.filters = IngredientBitmaps(self.vocabulary, self.vocabulary.recipe_lengths)
+    
+    def update_image_availability(self):
+        """
+        Precompute the has_image column from the image manifest
+        
+        Call again after refreshing the manifest. Recommendations then need
+        no filesystem access to decide whether a recipe has an image.
+        """
+        if self.store is None or self.image_manifest is None or 'Image_Name' not in self.store.columns:
+            return
+        names = self.store.values('Image_Name', range(len(self.store)))
+        manifest = self.image_manifest
+        has_image = np.fromiter(
+            (bool(name) and os.path.splitext(name)[0] in manifest for name in names),
+            dtype=bool, count=len(names)
+        )
+        self.store.set_column('has_image', has_image)
+        self._image_count = int(has_image.sum())
+        logger.info("%d of %d recipes have an image", self._image_count, len(has_image))
+        # Cached results carry image names that may have changed
+        self._invalidate_results()
+    
+    def _invalidate_results(self):
+        """
+        Drop cached recommendations and start a new cache generation
+        
+        The generation identifies the loaded dataset (CSV size and mtime,
+        recipe and image counts) and is part of every cache key, so entries
+        in a shared cache written by workers with another dataset are never
+        served.
+        """
+        stat = os.stat(self.dataset_path)
+        self.generation = f"{stat.st_size}-{stat.st_mtime_ns}-{len(self.store)}-{self._image_count}"
+        self.query_cache.clear()
+        self.ranking_cache.clear()
+    
     def build_tfidf_model(self):
-        """Placeholder for compatibility"""
+        """Build the sparse TF-IDF ingredient model used by the 'tfidf' method"""
+        if self.store is None:
+            raise ValueError("Dataset not loaded. Call load_data() first.")
+        if self.tfidf_model is not None:
+            # Already restored from the compiled cache by load_data()
+            return True
+        
+        index = self.ingredient_index
+        documents = (' '.join(index.recipe_ingredients(idx)) for idx in range(len(index)))
+        self.tfidf_model = TfidfIngredientModel().fit(documents)
+        logger.info("TF-IDF model built with %d terms", self.tfidf_model.matrix.shape[1])
+        if self.cache is not None:
+            self.cache.try_save('tfidf', *self.tfidf_model.to_arrays())
+        return True
+    
+    def build_semantic_model(self, n_components=64, n_lists=None, n_probe=8):
+        """
+        Build the LSA model and IVF index used by the 'semantic' method
+        
+        Args:
+            n_components (int): Dimensions of the latent space
+            n_lists (int): Number of inverted lists; defaults to about sqrt(recipes)
+            n_probe (int): Lists scored per query; higher finds more of the
+                exact top-k at a higher cost, None scores every recipe
+        """
+        if self.store is None:
+            raise ValueError("Dataset not loaded. Call load_data() first.")
+        self.semantic_n_probe = n_probe
+        model = self.semantic_model
+        if model is not None and (model.n_components, model.n_lists) == (n_components, n_lists):
+            # Already restored from the compiled cache by load_data()
+            return True
+        
+        self.semantic_model = SemanticIngredientModel(n_components, n_lists).fit(self.vocabulary)
+        logger.info("Semantic model built with %d dimensions and %d lists",
+                    self.semantic_model.components.shape[0], self.semantic_model.list_count)
+        if self.cache is not None:
+            self.cache.try_save('semantic', *self.semantic_model.to_arrays())
+        return True
+    
+    def enable_sharding(self, n_shards, start=True):
+        """
+        Score 'match' and 'tfidf' queries across a pool of shard processes
+        
+        Call after build_tfidf_model() so TF-IDF queries are sharded too.
+        Queries are scored in process until the pool is running.
+        
+        Args:
+            n_shards (int): Number of shard processes, about the number of
+                cores available to this worker
+            start (bool): Start the shard processes now, in this process;
+                otherwise sharded.start() or the first query (in the
+                background) starts them
+        """
+        if self.store is None:
+            raise ValueError("Dataset not loaded. Call load_data() first.")
+        self.close()
+        self.sharded = ShardedScorer(self.ingredient_index, self.tfidf_model, n_shards)
+        if start:
+            self.sharded.start()
         return True
     
+    def close(self):
+        """
+        Release the shard processes, if any
+        
+        Called when the snapshot is replaced; queries still running on it
+        fall back to scoring in process.
+        """
+        if self.sharded is not None:
+            self.sharded.close()
+    
+    def _load_compiled(self):
+        """
+        Restore the store, index, vocabulary and (if present) payloads, TF-IDF and semantic models from the cache
+        
+        Returns:
+            bool: True if the store, index and vocabulary were restored
+        """
+        dataset = self.cache.load('dataset')
+        index = self.cache.load('index')
+        vocabulary = self.cache.load('vocabulary')
+        if dataset is None or index is None or vocabulary is None:
+            return False
+        
+        self.store = RecipeStore(*dataset)
+        self.ingredient_index = IngredientIndex.from_arrays(*index)
+        self.vocabulary = IngredientVocabulary.from_arrays(*vocabulary)
+        payloads = self.cache.load('payloads')
+        self.payloads = RecipePayloads.from_arrays(*payloads) if payloads else None
+        tfidf = self.cache.load('tfidf')
+        self.tfidf_model = TfidfIngredientModel.from_arrays(*tfidf) if tfidf else None
+        semantic = self.cache.load('semantic')
+        self.semantic_model = SemanticIngredientModel.from_arrays(*semantic) if semantic else None
+        return True
+    
+    def _save_compiled(self, strict=False):
+        """
+        Write the recipe store, payloads, ingredient index and vocabulary to the cache
+        
+        Args:
+            strict (bool): Raise on write errors instead of reporting them
+            
+        Returns:
+            bool: True if every part was written
+        """
+        save = self.cache.save if strict else self.cache.try_save
+        parts = {
+            'dataset': self.store,
+            'payloads': self.payloads,
+            'index': self.ingredient_index,
+            'vocabulary': self.vocabulary,
+        }
+        saved = [save(part, *value.to_arrays()) is not False for part, value in parts.items()]
+        return all(saved)
+    
+    def recommend(self, user_ingredients, top_n=10, method='match'):
+        """
+        Recommend recipes using one of the scoring methods in METHODS
+        
+        Args:
+            user_ingredients (list): List of ingredients the user has
+            top_n (int): Number of recipes to recommend
+            method (str): Scoring method name
+            
+        Returns:
+            list: List of recommended recipe dictionaries
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method '{method}'. Expected one of: {', '.join(self.METHODS)}")
+        
+        user_ingredients = normalize_ingredients(user_ingredients)
+        key = self._cache_key(user_ingredients, top_n, method)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return self._copy_recipes(cached)
+        
+        recipes = getattr(self, self.METHODS[method])(user_ingredients, top_n=top_n)
+        self.query_cache.put(key, self._copy_recipes(recipes))
+        return recipes
+    
+    def correct_ingredients(self, user_ingredients):
+        """
+        Replace misspelt query ingredients with their closest known spelling
+        
+        Only ingredients that match nothing as typed are corrected, and a
+        correction is only applied if the corrected ingredient matches, so
+        queries that already find recipes are left alone.
+        
+        Args:
+            user_ingredients (list): Normalized user ingredients
+            
+        Returns:
+            tuple: (normalized ingredients to score, list of
+                {'original': ..., 'corrected': ...} dicts for the applied corrections)
+        """
+        if self.speller is None:
+            return user_ingredients, []
+        
+        index = self.ingredient_index
+        segment = self.delta.current if self.delta is not None else None
+        delta_index = segment.ingredient_index if segment is not None else None
+        ingredients, corrections = [], []
+        for ingredient in user_ingredients:
+            if not len(index.matching_terms(ingredient)) and not (
+                    delta_index is not None and len(delta_index.matching_terms(ingredient))):
+                corrected = self.speller.correct(ingredient)
+                if corrected != ingredient and len(index.matching_terms(corrected)):
+                    corrections.append({'original': ingredient, 'corrected': corrected})
+                    ingredient = corrected
+            ingredients.append(ingredient)
+        if not corrections:
+            return user_ingredients, []
+        return normalize_ingredients(ingredients), corrections
+    
+    def rank(self, user_ingredients, method='match', constraints=None):
+        """
+        Rank recipes for a query once and keep the ranking for later pages
+        
+        Args:
+            user_ingredients (list): List of ingredients the user has
+            method (str): Scoring method name, see METHODS
+            constraints (RecipeConstraints): Ingredients recipes must and must
+                not have and their maximum ingredient count, from
+                recipe_filter.parse_constraints(); None for no constraints
+            
+        Returns:
+            tuple: (recipe ids, scores) numpy arrays, best first, at most MAX_RANKED long
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method '{method}'. Expected one of: {', '.join(self.METHODS)}")
+        
+        user_ingredients = normalize_ingredients(user_ingredients)
+        key = (self.result_generation(), method, tuple(user_ingredients))
+        if constraints is not None:
+            key += (tuple(constraints),)
+        ranked = self.ranking_cache.get(key)
+        if ranked is None:
+            ids, scores = self._rank(method, user_ingredients, self.MAX_RANKED, constraints)
+            ranked = (np.asarray(ids, dtype=np.int32), np.asarray(scores, dtype=np.float64))
+            self.ranking_cache.put(key, ranked)
+        return ranked
+    
+    def recommend_page(self, user_ingredients, offset=0, limit=10, method='match', constraints=None):
+        """
+        One page of the ranking for a query
+        
+        Later pages slice the cached ranking from rank() instead of scoring
+        the dataset again; pages themselves go through the result cache.
+        
+        Args:
+            user_ingredients (list): List of ingredients the user has
+            offset (int): Position of the first recipe of the page
+            limit (int): Number of recipes per page
+            method (str): Scoring method name, see METHODS
+            constraints (RecipeConstraints): Constraints, see rank()
+            
+        Returns:
+            tuple: (list of recipe dictionaries, total number of ranked recipes)
+        """
+        user_ingredients = normalize_ingredients(user_ingredients)
+        page = ('page', offset, limit) if constraints is None else ('page', offset, limit, tuple(constraints))
+        key = self._cache_key(user_ingredients, page, method)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            recipes, total = cached
+            return self._copy_recipes(recipes), total
+        
+        ids, scores = self.rank(user_ingredients, method, constraints)
+        recipes = self._build_recipe_dicts(zip(ids[offset:offset + limit], scores[offset:offset + limit]))
+        self.query_cache.put(key, (self._copy_recipes(recipes), len(ids)))
+        return recipes, len(ids)
+    
+    def iter_recommendations(self, user_ingredients, offset=0, limit=None, method='match', chunk_size=20,
+                             constraints=None):
+        """
+        Yield ranked recipe dictionaries, materialising them a chunk at a time
+        
+        Args:
+            user_ingredients (list): List of ingredients the user has
+            offset (int): Position of the first recipe
+            limit (int): Maximum number of recipes; None for the whole ranking
+            method (str): Scoring method name, see METHODS
+            chunk_size (int): Recipes read from the store per step
+            constraints (RecipeConstraints): Constraints, see rank()
+            
+        Yields:
+            dict: Recipe dictionaries, best first
+        """
+        ids, scores = self.rank(user_ingredients, method, constraints)
+        end = len(ids) if limit is None else min(len(ids), offset + limit)
+        for start in range(offset, end, chunk_size):
+            stop = min(start + chunk_size, end)
+            yield from self._build_recipe_dicts(zip(ids[start:stop], scores[start:stop]))
+    
+    def render_page(self, user_ingredients, offset=0, limit=10, method='match', fields=RECIPE_FIELDS, backend_url='',
+                    constraints=None):
+        """
+        One page of the ranking for a query, serialized as a JSON array
+        
+        Like recommend_page(), but the recipes are assembled from the
+        payloads serialized at load time (see render_recipes).
+        
+        Args:
+            user_ingredients (list): List of ingredients the user has
+            offset (int): Position of the first recipe of the page
+            limit (int): Number of recipes per page
+            method (str): Scoring method name, see METHODS
+            fields (tuple): Fields to include, from parse_fields()
+            backend_url (str): Base URL of the backend, for image_url
+            constraints (RecipeConstraints): Constraints, see rank()
+        
+        Returns:
+            tuple: (JSON array bytes, total number of ranked recipes)
+        """
+        ids, scores = self.rank(user_ingredients, method, constraints)
+        recipes = self.render_recipes(zip(ids[offset:offset + limit], scores[offset:offset + limit]), fields, backend_url)
+        return b'[' + b','.join(recipes) + b']', len(ids)
+    
+    def render_recipe(self, recipe_id, fields=RECIPE_FIELDS, backend_url=''):
+        """
+        One recipe, serialized as a JSON object
+        
+        Args:
+            recipe_id (int): Recipe id, from the dataset or ingested
+            fields (tuple): Fields to include, from parse_fields(); there is
+                no similarity_score
+            backend_url (str): Base URL of the backend, for image_url
+        
+        Returns:
+            bytes: The JSON object, or None if there is no such recipe
+        """
+        if recipe_id < 0:
+            return None
+        rendered = self.render_recipes([(recipe_id, None)], fields, backend_url)
+        return rendered[0] if rendered else None
+    
+    def render_recipes(self, top_recipes, fields=RECIPE_FIELDS, backend_url=''):
+        """
+        Serialize ranked recipes to JSON objects, with the same content as
+        the dictionaries of _build_recipe_dicts plus image_url
+        
+        Static fields are sliced from the payloads serialized at load time;
+        only the id, score and image fields are encoded per request.
+        Ingested recipes, which have no payloads, are encoded as dictionaries.
+        
+        Args:
+            top_recipes (iterable): (recipe id, score or None) pairs, best first
+            fields (tuple): Fields to include, from parse_fields()
+            backend_url (str): Base URL of the backend, for image_url
+        
+        Returns:
+            list: JSON object bytes, one per recipe found
+        """
+        with stage('materialize'):
+            top_recipes = [(int(idx), score) for idx, score in top_recipes]
+            size = len(self.store)
+            main_ids = [idx for idx, _ in top_recipes if idx < size]
+            delta_records = self._delta_records([idx for idx, _ in top_recipes if idx >= size])
+            images = None
+            if ('image_name' in fields or 'image_url' in fields) and 'Image_Name' in self.store.columns:
+                images = dict(zip(main_ids, self._image_names(main_ids)))
+            payloads = self.payloads
+            
+            rendered = []
+            for idx, score in top_recipes:
+                if idx >= size:
+                    recipe = delta_records.get(idx)
+                    if recipe is None:
+                        continue
+                    if score is not None:
+                        recipe['similarity_score'] = float(score)
+                    if recipe.get('image_name'):
+                        recipe['image_url'] = image_url(backend_url, recipe['image_name'])
+                    rendered.append(dumps(project_recipe(recipe, fields)))
+                    continue
+                
+                members = []
+                for field in fields:
+                    if field == 'id':
+                        members.append((field, b'%d' % idx))
+                    elif field in payloads.fields:
+                        members.append((field, payloads.fragment(field, idx)))
+                    elif field == 'image_name' and images is not None:
+                        members.append((field, dumps(images[idx])))
+                    elif field == 'image_url' and images is not None and images[idx]:
+                        members.append((field, dumps(image_url(backend_url, images[idx]))))
+                    elif field == 'similarity_score' and score is not None:
+                        members.append((field, dumps(float(score))))
+                rendered.append(encode_object(members))
+            return rendered
+    
+    def _cache_key(self, user_ingredients, top_n, method):
+        """Result cache key for a normalized ingredient list"""
+        return (self.result_generation(), method, top_n, tuple(user_ingredients))
+    
+    def result_generation(self):
+        """
+        Cache generation of results: the dataset's, plus the ingested recipes
+        searched with it
+        
+        Ingested recipe ids are consecutive, so the end of the delta segment
+        identifies its contents in every worker.
+        """
+        segment = self.delta.current if self.delta is not None else None
+        if segment is None or segment.end_id <= len(self.store):
+            return self.generation
+        return f"{self.generation}+{segment.end_id}"
+    
+    @staticmethod
+    def _copy_recipes(recipes):
+        # Callers add fields such as image_url, which must not leak into the cache
+        return [dict(recipe) for recipe in recipes]
+    
+    def _rank(self, method, user_ingredients, top_n, constraints=None):
+        """
+        Rank the snapshot's recipes with RANKERS[method], together with the
+        recipes ingested since it was built
+        
+        Constraints are resolved to a bitmap of allowed recipes first (see
+        IngredientBitmaps), which the rankers apply before scoring.
+        
+        Returns:
+            tuple: (recipe ids, scores), best first, ties broken by recipe id
+        """
+        allowed = None
+        if constraints is not None:
+            with stage('filter'):
+                allowed = self.filters.allowed(constraints)
+                metrics.observe('recommender_allowed', bitmap_count(allowed), buckets=COUNT_BUCKETS, method=method)
+        ranked = getattr(self, self.RANKERS[method])(user_ingredients, top_n, allowed)
+        return self._merge_delta(method, [user_ingredients], [ranked], top_n, [constraints])[0]
+    
+    def _merge_delta(self, method, queries, ranked, top_n, constraints=None):
+        """
+        Merge rankings of the snapshot's recipes with rankings of the delta segment
+        
+        Ingested recipes not yet compacted into the dataset are ranked in the
+        same way by the delta segment (see DeltaSegment) and merged in by
+        score, so they are found within seconds of being added.
+        
+        Args:
+            method (str): Scoring method name, see METHODS
+            queries (list): Normalized ingredient lists
+            ranked (list): One (recipe ids, scores) tuple per query, from the snapshot
+            top_n (int): Number of recipes to return per query
+            constraints (list): One RecipeConstraints or None per query
+            
+        Returns:
+            list: One merged (recipe ids, scores) tuple per query
+        """
+        segment = self.delta.current if self.delta is not None else None
+        min_id = len(self.store)
+        if segment is None or segment.end_id <= min_id:
+            return ranked
+        
+        merged = []
+        constraints = constraints or [None] * len(queries)
+        with stage('delta'):
+            for user_ingredients, main, query_constraints in zip(queries, ranked, constraints):
+                user_ingredients = [ing.lower() for ing in user_ingredients]
+                allowed = segment.allowed(query_constraints)
+                if method == 'tfidf':
+                    delta = segment.rank_tfidf(self.tfidf_model, user_ingredients, top_n, min_id, allowed)
+                elif method == 'semantic':
+                    delta = segment.rank_semantic(self.semantic_model, self.vocabulary,
+                                                  self._semantic_weights(user_ingredients), top_n, min_id, allowed)
+                else:
+                    delta = segment.rank_match(user_ingredients, top_n, min_id, allowed)
+                merged.append(merge_top_k([main, delta], top_n) if len(delta[0]) else main)
+        return merged
+    
     def recommend_recipes_tfidf(self, user_ingredients, top_n=10):
         """
         Recommend recipes based on user ingredients using a simple matching algorithm
@@ -64,66 +651,405 @@ class RecipeRecommender:
         Returns:
             list: List of recommended recipe dictionaries
         """
-        if self.df is None:
+        ids, scores = self._rank('match', user_ingredients, top_n)
+        return self._build_recipe_dicts(zip(ids, scores))
+    
+    def _rank_match(self, user_ingredients, top_n, allowed=None):
+        """
+        Best recipes by match ratio: matched user ingredients / recipe ingredients
+        
+        Args:
+            user_ingredients (list): Normalized user ingredients
+            top_n (int): Number of recipes to return
+            allowed (numpy.ndarray): Bitmap of the recipes that may be
+                returned, from IngredientBitmaps.allowed(); None for all
+        
+        Returns:
+            tuple: (recipe ids, scores), best first, ties broken by dataset order
+        """
+        if self.store is None:
             raise ValueError("Dataset not loaded. Call load_data() first.")
         
         # Convert user ingredients to lowercase
         user_ingredients = [ing.lower() for ing in user_ingredients]
-        print(f"Looking for recipes with: {user_ingredients}")
-        
-        # Calculate a simple match score for each recipe
-        recipe_scores = []
+        logger.debug("Looking for recipes with: %s", user_ingredients)
         
-        for idx, row in self.df.iterrows():
-            try:
-                recipe_ingredients = row['ingredients_list']
-                
-                # Count how many user ingredients are in the recipe
-                matches = sum(1 for ing in user_ingredients if any(ing in recipe_ing for recipe_ing in recipe_ingredients))
-                
-                # Calculate a simple score based on the number of matches and total ingredients
-                if matches > 0:
-                    # Higher score for recipes with more matches and fewer total ingredients
-                    score = matches / len(recipe_ingredients)
-                    recipe_scores.append((idx, score))
-            except Exception as e:
-                print(f"Error processing recipe at index {idx}: {e}", file=sys.stderr)
-                continue
+        if self.sharded is not None:
+            ranked = self._rank_sharded('match', [user_ingredients], top_n, [allowed])
+            if ranked is not None:
+                return ranked[0]
         
-        print(f"Found {len(recipe_scores)} matching recipes")
+        # Only recipes sharing at least one ingredient, and allowed by the
+        # constraints, are scored
+        with stage('candidates'):
+            candidates, matches = self.ingredient_index.match_counts(user_ingredients, allowed)
+        metrics.observe('recommender_candidates', len(candidates), buckets=COUNT_BUCKETS, method='match')
+        logger.debug("Found %d matching recipes", len(candidates))
         
         # If no matches found, return empty list
-        if not recipe_scores:
-            return []
+        if not len(candidates):
+            return np.zeros(0, dtype=np.int32), np.zeros(0)
+        
+        # Higher score for recipes with more matches and fewer total ingredients
+        with stage('scoring'):
+            scores = matches / self.ingredient_index.recipe_lengths[candidates]
+        
+        # Best scores first, breaking ties by dataset order
+        with stage('topk'):
+            return select_top_k(scores, top_n, candidates)
+    
+    def recommend_recipes_cosine(self, user_ingredients, top_n=10):
+        """
+        Recommend recipes by TF-IDF cosine similarity to the user ingredients
+        
+        Args:
+            user_ingredients (list): List of ingredients the user has
+            top_n (int): Number of recipes to recommend
             
-        # Sort recipes by score (descending)
-        recipe_scores.sort(key=lambda x: x[1], reverse=True)
+        Returns:
+            list: List of recommended recipe dictionaries
+        """
+        ids, scores = self._rank('tfidf', user_ingredients, top_n)
+        return self._build_recipe_dicts(zip(ids, scores))
+    
+    def _rank_tfidf(self, user_ingredients, top_n, allowed=None):
+        """
+        Best recipes by TF-IDF cosine similarity
         
-        # Get top N recipes
-        top_recipes = recipe_scores[:top_n]
+        Args:
+            user_ingredients (list): Normalized user ingredients
+            top_n (int): Number of recipes to return
+            allowed (numpy.ndarray): Bitmap of the recipes that may be
+                returned, from IngredientBitmaps.allowed(); None for all
+        
+        Returns:
+            tuple: (recipe ids, scores), best first, ties broken by dataset order
+        """
+        if self.store is None:
+            raise ValueError("Dataset not loaded. Call load_data() first.")
+        if self.tfidf_model is None:
+            raise ValueError("TF-IDF model not built. Call build_tfidf_model() first.")
+        
+        user_ingredients = [ing.lower() for ing in user_ingredients]
+        if self.sharded is not None:
+            ranked = self._rank_sharded('tfidf', [user_ingredients], top_n, [allowed])
+            if ranked is not None:
+                return ranked[0]
+        
+        if allowed is not None:
+            mask = bitmap_mask(allowed, len(self.store))
+            if bitmap_count(allowed) < self.FILTER_ROWS_SHARE * len(mask):
+                rows = np.flatnonzero(mask)
+                with stage('scoring'):
+                    scores = self.tfidf_model.score(user_ingredients, rows)
+            else:
+                with stage('scoring'):
+                    scores = self.tfidf_model.score(user_ingredients)
+                # Top-k then only looks at allowed recipes sharing a term
+                with stage('filter'):
+                    rows = np.flatnonzero((scores > 0) & mask)
+                    scores = scores[rows]
+            with stage('topk'):
+                return select_top_k(scores, top_n, rows)
+        
+        # Every recipe is scored, so there is no separate candidate stage
+        with stage('scoring'):
+            scores = self.tfidf_model.score(user_ingredients)
+        with stage('topk'):
+            return select_top_k(scores, top_n)
+    
+    def _rank_sharded(self, method, queries, top_n, allowed=None):
+        """
+        Rank queries on the shard processes and merge their local top-k
+        
+        Query terms are resolved here, once, so shards only gather postings
+        or columns for known ids.
+        
+        Args:
+            method (str): 'match' or 'tfidf'
+            queries (list): Lowercased ingredient lists
+            top_n (int): Number of recipes to return per query
+            allowed (list): One bitmap of allowed recipes or None per query
+            
+        Returns:
+            list: One (recipe ids, scores) tuple per query, or None if the
+                method is not sharded or the pool is closed
+        """
+        if method not in self.sharded.methods:
+            return None
+        with stage('candidates'):
+            if method == 'tfidf':
+                shard_queries = [self.tfidf_model.query_vector(query) for query in queries]
+            else:
+                index = self.ingredient_index
+                shard_queries = [[index.matching_terms(ing) for ing in query] for query in queries]
+        with stage('scoring'):
+            parts = self.sharded.top_k(method, shard_queries, top_n, allowed)
+        if parts is None:
+            return None
+        with stage('topk'):
+            return [merge_top_k(query_parts, top_n) for query_parts in parts]
+    
+    def recommend_recipes_semantic(self, user_ingredients, top_n=10):
+        """
+        Recommend recipes by similarity in the latent ingredient space
+        
+        Unlike the other methods this finds recipes with related
+        ingredients, e.g. "green onion" recipes for "scallion".
+        
+        Args:
+            user_ingredients (list): List of ingredients the user has
+            top_n (int): Number of recipes to recommend
+            
+        Returns:
+            list: List of recommended recipe dictionaries
+        """
+        ids, scores = self._rank('semantic', user_ingredients, top_n)
+        return self._build_recipe_dicts(zip(ids, scores))
+    
+    def _rank_semantic(self, user_ingredients, top_n, allowed=None):
+        """
+        Best recipes by cosine similarity in the LSA space, searched through
+        the IVF index with ``semantic_n_probe`` lists
+        
+        Args:
+            user_ingredients (list): Normalized user ingredients
+            top_n (int): Number of recipes to return
+            allowed (numpy.ndarray): Bitmap of the recipes that may be
+                returned, from IngredientBitmaps.allowed(); None for all
+        
+        Returns:
+            tuple: (recipe ids, scores), best first, ties broken by dataset order
+        """
+        if self.store is None:
+            raise ValueError("Dataset not loaded. Call load_data() first.")
+        if self.semantic_model is None:
+            raise ValueError("Semantic model not built. Call build_semantic_model() first.")
+        
+        with stage('candidates'):
+            weights = self._semantic_weights(user_ingredients)
+        with stage('scoring'):
+            return self.semantic_model.top_k(weights, top_n, self.semantic_n_probe, allowed)
+    
+    def _semantic_weights(self, user_ingredients):
+        """
+        Canonical ingredient weights of a query for the semantic model
+        
+        Like 'match', an ingredient stands for every canonical name containing
+        its words ("chicken" for "chicken thigh"); each query ingredient
+        carries the same total weight however many names it expands to.
+        
+        Returns:
+            dict: Canonical ingredient id to weight
+        """
+        weights = {}
+        for ingredient in user_ingredients:
+            term_ids = self.vocabulary.matching_terms(ingredient)
+            for tid in term_ids:
+                weights[int(tid)] = weights.get(int(tid), 0.0) + 1.0 / len(term_ids)
+        return weights
+    
+    def recommend_batch(self, list_of_ingredient_lists, top_n=10, method='match'):
+        """
+        Recommend recipes for many ingredient lists in one pass
+        
+        All queries are scored together as one sparse matrix product against
+        the recipe-ingredient matrix, which amortises term lookups and avoids
+        a separate scan per query. Queries found in the result cache, and
+        repeats within the batch, are not scored again.
+        
+        Args:
+            list_of_ingredient_lists (list): One list of ingredients per query
+            top_n (int): Number of recipes to recommend per query
+            method (str): Scoring method name, see METHODS
+            
+        Returns:
+            list: One list of recommended recipe dictionaries per query, in input order
+        """
+        if self.store is None:
+            raise ValueError("Dataset not loaded. Call load_data() first.")
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method '{method}'. Expected one of: {', '.join(self.METHODS)}")
+        
+        queries = [normalize_ingredients(ingredients) for ingredients in list_of_ingredient_lists]
+        results = [None] * len(queries)
+        misses = {}
+        for i, user_ingredients in enumerate(queries):
+            key = self._cache_key(user_ingredients, top_n, method)
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                results[i] = self._copy_recipes(cached)
+            else:
+                misses.setdefault(key, []).append(i)
+        
+        if misses:
+            keys = list(misses)
+            computed = self._score_batch([list(key[3]) for key in keys], top_n, method)
+            for key, recipes in zip(keys, computed):
+                self.query_cache.put(key, self._copy_recipes(recipes))
+                positions = misses[key]
+                results[positions[0]] = recipes
+                for i in positions[1:]:
+                    results[i] = self._copy_recipes(recipes)
+        return results
+    
+    def _score_batch(self, queries, top_n, method):
+        """
+        Score normalized queries together, without consulting the result cache
+        
+        Args:
+            queries (list): Normalized ingredient lists
+            top_n (int): Number of recipes to recommend per query
+            method (str): Scoring method name, see METHODS
+            
+        Returns:
+            list: One list of recommended recipe dictionaries per query
+        """
+        ranked = None
+        if method == 'semantic':
+            # Index probes are per query; there is no shared matrix product
+            ranked = [self._rank_semantic(query, top_n) for query in queries]
+        elif self.sharded is not None:
+            # One message per shard for the whole batch
+            ranked = self._rank_sharded(method, queries, top_n)
+        if ranked is None:
+            if method == 'tfidf':
+                if self.tfidf_model is None:
+                    raise ValueError("TF-IDF model not built. Call build_tfidf_model() first.")
+                with stage('scoring'):
+                    scores = self.tfidf_model.score_batch(queries)
+            else:
+                with stage('candidates'):
+                    scores = self.ingredient_index.match_matrix(queries)
+                # Same ratio as recommend_recipes_tfidf: matches / recipe ingredient count
+                with stage('scoring'):
+                    scores.data = scores.data / self.ingredient_index.recipe_lengths[scores.indices]
+            with stage('topk'):
+                ranked = select_top_k_rows(scores, top_n)
+        ranked = self._merge_delta(method, queries, ranked, top_n)
+        
+        # Materialise each distinct recipe once for the whole batch
+        with stage('materialize'):
+            records = self._recipe_records([int(idx) for ids, _ in ranked for idx in ids])
+        return [self._build_recipe_dicts(zip(ids, values), records) for ids, values in ranked]
+    
+    def _build_recipe_dicts(self, top_recipes, records=None):
+        """
+        Materialise recipe dictionaries for ranked (recipe id, score) pairs
+        
+        Args:
+            top_recipes (iterable): (recipe id, score) pairs, best first
+            records (dict): Prefetched records from _recipe_records, if any
+            
+        Returns:
+            list: List of recipe dictionaries
+        """
+        with stage('materialize'):
+            top_recipes = [(int(idx), score) for idx, score in top_recipes]
+            if records is None:
+                records = self._recipe_records([idx for idx, _ in top_recipes])
+            
+            recommended_recipes = []
+            for idx, score in top_recipes:
+                if idx not in records:
+                    continue
+                recipe = dict(records[idx])
+                recipe['similarity_score'] = float(score)
+                recommended_recipes.append(recipe)
+            return recommended_recipes
+    
+    def _recipe_records(self, ids):
+        """
+        Build the score-independent part of the recipe dictionaries
+        
+        Args:
+            ids (list): Recipe ids
+            
+        Returns:
+            dict: Recipe id to recipe dictionary (without similarity_score)
+        """
+        ids = list(dict.fromkeys(ids))
+        delta_ids = [idx for idx in ids if idx >= len(self.store)]
+        if delta_ids:
+            ids = [idx for idx in ids if idx < len(self.store)]
+        records = self._delta_records(delta_ids)
+        if not ids:
+            return records
+        
+        store = self.store
+        titles = store.values('Title', ids)
+        ingredients = store.values('Cleaned_Ingredients', ids)
+        instructions = store.values('Instructions', ids)
+        ratings = store.values('Rating', ids) if 'Rating' in store.columns else None
+        image_names = self._image_names(ids) if 'Image_Name' in store.columns else None
         
         # Create recipe dictionaries
-        recommended_recipes = []
-        for idx, score in top_recipes:
+        for pos, idx in enumerate(ids):
             try:
                 recipe = {
-                    'id': int(idx),
-                    'title': self.df.iloc[idx]['Title'],
-                    'ingredients': self.df.iloc[idx]['Cleaned_Ingredients'].split(', '),
-                    'instructions': self.df.iloc[idx]['Instructions'],
+                    'id': idx,
+                    'title': titles[pos],
+                    'ingredients': ingredients[pos].split(', '),
+                    'instructions': instructions[pos],
                 }
                 
                 # Add optional fields if they exist
-                if 'Rating' in self.df.columns:
-                    recipe['rating'] = float(self.df.iloc[idx]['Rating'])
+                if ratings is not None:
+                    recipe['rating'] = float(ratings[pos])
                     
-                if 'Image_Name' in self.df.columns:
-                    recipe['image_name'] = self.df.iloc[idx]['Image_Name']
+                if image_names is not None:
+                    recipe['image_name'] = image_names[pos]
                 
-                recipe['similarity_score'] = float(score)
-                recommended_recipes.append(recipe)
+                records[idx] = recipe
             except Exception as e:
-                print(f"Error creating recipe dict at index {idx}: {e}", file=sys.stderr)
+                logger.warning("Error creating recipe dict at index %d: %s", idx, e)
                 continue
         
-        return recommended_recipes 
\ No newline at end of file
+        return records
+    
+    def _image_names(self, ids):
+        """Image names of dataset recipes; None for recipes whose image file is missing"""
+        image_names = self.store.values('Image_Name', ids)
+        if 'has_image' in self.store.columns:
+            # Let the frontend use its embedded fallback for missing images
+            image_names = [
+                name if available else None
+                for name, available in zip(image_names, self.store.values('has_image', ids))
+            ]
+        return image_names
+    
+    def _delta_records(self, ids):
+        """
+        Recipe dictionaries of ingested recipes, in the form of _recipe_records
+        
+        Args:
+            ids (list): Ids of recipes held by the delta segment
+            
+        Returns:
+            dict: Recipe id to recipe dictionary; ids no longer held are left out
+        """
+        segment = self.delta.current if self.delta is not None and ids else None
+        if segment is None:
+            return {}
+        
+        columns = self.store.columns
+        records = {}
+        for idx in ids:
+            row = segment.recipe(idx)
+            if row is None:
+                continue
+            recipe = {
+                'id': idx,
+                'title': row['Title'],
+                'ingredients': row['Cleaned_Ingredients'].split(', '),
+                'instructions': row['Instructions'],
+            }
+            if 'Rating' in columns and row.get('Rating') is not None:
+                recipe['rating'] = float(row['Rating'])
+            if 'Image_Name' in columns:
+                name = row.get('Image_Name') or None
+                if name and self.image_manifest is not None and os.path.splitext(name)[0] not in self.image_manifest:
+                    name = None
+                recipe['image_name'] = name
+            records[idx] = recipe
+        return records
@@ -0,0 +1,203 @@
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+from models.ranking import select_top_k
+from models.recipe_filter import bitmap_contains
+
+# Sample points per inverted list used to train the list centroids
+TRAIN_POINTS_PER_LIST = 64
+
+
+class SemanticIngredientModel:
+    """
+    Latent semantic (LSA) model of recipe ingredients with an IVF index.
+
+    The recipe by canonical-ingredient matrix (IDF weighted, rows L2
+    normalised) is reduced with a truncated SVD, so ingredients that appear
+    in similar recipes, such as "scallion" and "green onion", get similar
+    directions and a recipe can score without sharing a literal ingredient
+    with the query.
+
+    Recipe vectors are unit length and partitioned by k-means into
+    ``n_lists`` inverted lists (about sqrt(recipes) by default), stored
+    contiguously list by list. A query is compared with the list centroids
+    and only the ``n_probe`` closest lists are scored, so its cost grows
+    with the list size rather than the dataset. ``n_probe`` is the recall
+    and latency knob: more lists find more of the exact top-k, and probing
+    every list is exact search.
+    """
+
+    def __init__(self, n_components=64, n_lists=None, seed=0):
+        """
+        ``n_components`` and ``n_lists`` are upper bounds on small datasets,
+        and are kept as given so a cached model can be matched against the
+        requested settings.
+
+        Args:
+            n_components (int): Dimensions of the latent space
+            n_lists (int): Number of inverted lists; defaults to about sqrt(recipes)
+            seed (int): Random seed for the SVD and k-means
+        """
+        self.n_components = n_components
+        self.n_lists = n_lists
+        self.seed = seed
+        self.components = None
+        self.idf = None
+        self.centroids = None
+        self.vectors = None
+        self.list_ids = None
+        self.list_indptr = None
+
+    def fit(self, vocabulary):
+        """
+        Build the latent space and the inverted lists
+
+        Args:
+            vocabulary (IngredientVocabulary): Canonical ingredients of every recipe
+
+        Returns:
+            SemanticIngredientModel: The model itself, for chaining
+        """
+        n_recipes, n_terms = len(vocabulary), len(vocabulary.terms)
+        self.idf = (np.log((1 + n_recipes) / (1 + vocabulary.document_frequency)) + 1).astype(np.float32)
+        matrix = sparse.csr_matrix(
+            (self.idf[vocabulary.recipe_ids], vocabulary.recipe_ids, vocabulary.recipe_indptr),
+            shape=(n_recipes, n_terms)
+        )
+        matrix = normalize(matrix)
+
+        n_components = max(1, min(self.n_components, n_terms - 1, n_recipes - 1))
+        svd = TruncatedSVD(n_components=n_components, random_state=self.seed)
+        embeddings = normalize(svd.fit_transform(matrix)).astype(np.float32)
+        self.components = svd.components_.astype(np.float32)
+        self._build_lists(embeddings)
+        return self
+
+    def _build_lists(self, embeddings):
+        """Partition unit recipe vectors into inverted lists by nearest centroid"""
+        n_recipes = len(embeddings)
+        n_lists = self.n_lists or int(round(np.sqrt(n_recipes)))
+        n_lists = max(1, min(n_lists, n_recipes))
+
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(n_recipes, n_lists * TRAIN_POINTS_PER_LIST)
+        sample = embeddings[rng.choice(n_recipes, sample_size, replace=False)]
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, n_init=1, random_state=self.seed, batch_size=4096)
+        centroids = normalize(kmeans.fit(sample).cluster_centers_).astype(np.float32)
+
+        # Assign by cosine, in chunks to bound the temporary score matrix
+        assignment = np.empty(n_recipes, dtype=np.int32)
+        for start in range(0, n_recipes, 65536):
+            chunk = embeddings[start:start + 65536]
+            assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+
+        order = np.argsort(assignment, kind='stable')
+        self.centroids = centroids
+        self.list_ids = order.astype(np.int32)
+        self.list_indptr = np.zeros(n_lists + 1, dtype=np.int64)
+        self.list_indptr[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+        self.vectors = np.ascontiguousarray(embeddings[order])
+
+    @property
+    def list_count(self):
+        """Number of inverted lists actually built"""
+        return len(self.centroids)
+
+    def to_arrays(self):
+        """
+        Export the fitted model as flat arrays for the dataset cache
+
+        Returns:
+            tuple: (dict of numpy arrays, dict of JSON-serialisable metadata)
+        """
+        arrays = {
+            'components': self.components,
+            'idf': self.idf,
+            'centroids': self.centroids,
+            'vectors': self.vectors,
+            'list_ids': self.list_ids,
+            'list_indptr': self.list_indptr,
+        }
+        return arrays, {'n_components': self.n_components, 'n_lists': self.n_lists, 'seed': self.seed}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """
+        Rebuild a model exported with to_arrays()
+
+        Args:
+            arrays (dict): Arrays as returned by to_arrays(), possibly memory-mapped
+            meta (dict): Metadata as returned by to_arrays()
+
+        Returns:
+            SemanticIngredientModel: The restored model
+        """
+        model = cls(n_components=meta['n_components'], n_lists=meta['n_lists'], seed=meta['seed'])
+        model.components = arrays['components']
+        model.idf = arrays['idf']
+        model.centroids = arrays['centroids']
+        model.vectors = arrays['vectors']
+        model.list_ids = arrays['list_ids']
+        model.list_indptr = arrays['list_indptr']
+        return model
+
+    def query_vector(self, term_weights):
+        """
+        Project a query into the latent space
+
+        Args:
+            term_weights (dict): Canonical ingredient id to weight; weights
+                are multiplied by the ingredient's IDF
+
+        Returns:
+            numpy.ndarray: Unit query vector, or None if it is empty
+        """
+        if not term_weights:
+            return None
+        term_ids = np.fromiter(term_weights, dtype=np.int64, count=len(term_weights))
+        weights = np.fromiter(term_weights.values(), dtype=np.float32, count=len(term_weights))
+        vector = self.components[:, term_ids] @ (weights * self.idf[term_ids])
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def top_k(self, term_weights, top_n=10, n_probe=None, allowed=None):
+        """
+        Recipes closest to a query
+
+        Args:
+            term_weights (dict): Canonical ingredient id to weight
+            top_n (int): Number of recipes to return
+            n_probe (int): Inverted lists to score; None or list_count or more
+                scores every recipe (exact search)
+            allowed (numpy.ndarray): Bitmap of the recipes that may be
+                returned (see recipe_filter); the others are not scored
+
+        Returns:
+            tuple: (recipe ids, cosine scores) of recipes with a positive score, best first
+        """
+        vector = self.query_vector(term_weights)
+        if vector is None:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        if n_probe is None or n_probe >= self.list_count:
+            if allowed is None:
+                return select_top_k(self.vectors @ vector, top_n, self.list_ids)
+            rows = np.flatnonzero(bitmap_contains(allowed, self.list_ids))
+            return select_top_k(self.vectors[rows] @ vector, top_n, self.list_ids[rows])
+
+        n_probe = max(1, n_probe)
+        closeness = self.centroids @ vector
+        probed = np.argpartition(-closeness, n_probe - 1)[:n_probe]
+        ids, scores = [], []
+        for list_id in probed:
+            start, end = self.list_indptr[list_id], self.list_indptr[list_id + 1]
+            list_ids = self.list_ids[start:end]
+            if allowed is None:
+                ids.append(list_ids)
+                scores.append(self.vectors[start:end] @ vector)
+            else:
+                rows = np.flatnonzero(bitmap_contains(allowed, list_ids))
+                ids.append(list_ids[rows])
+                scores.append(self.vectors[start + rows] @ vector)
+        return select_top_k(np.concatenate(scores), top_n, np.concatenate(ids))
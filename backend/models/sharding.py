@@ -0,0 +1,468 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import numpy as np
+from multiprocessing import connection, shared_memory
+from scipy import sparse
+from models.ranking import select_top_k
+from models.recipe_filter import bitmap_contains, bitmap_mask
+
+logger = logging.getLogger(__name__)
+
+# Array offsets within a shard's shared memory segment are aligned to this
+ALIGNMENT = 64
+
+
+def shard_bounds(n_recipes, n_shards):
+    """
+    Split recipe ids into contiguous, nearly equal ranges
+
+    Args:
+        n_recipes (int): Number of recipes
+        n_shards (int): Number of shards
+
+    Returns:
+        numpy.ndarray: ``n_shards + 1`` boundaries; shard i holds ids
+            ``bounds[i]`` up to but excluding ``bounds[i + 1]``
+    """
+    return np.linspace(0, n_recipes, n_shards + 1).astype(np.int64)
+
+
+def split_postings(indptr, indices, bounds, data=None):
+    """
+    Split CSR posting lists of recipe ids by recipe range
+
+    Args:
+        indptr (numpy.ndarray): Offsets of each row (term) into ``indices``
+        indices (numpy.ndarray): Recipe ids
+        bounds (numpy.ndarray): Shard boundaries from shard_bounds()
+        data (numpy.ndarray): Values aligned with ``indices``, if any
+
+    Returns:
+        list: One (indptr, local recipe ids, data or None) tuple per shard;
+            ids are relative to the start of the shard
+    """
+    n_rows = len(indptr) - 1
+    rows = np.repeat(np.arange(n_rows, dtype=np.int32), np.diff(indptr))
+    shard_of = np.searchsorted(bounds, indices, side='right') - 1
+    shards = []
+    for shard in range(len(bounds) - 1):
+        mask = shard_of == shard
+        local_indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        local_indptr[1:] = np.cumsum(np.bincount(rows[mask], minlength=n_rows))
+        local_indices = (indices[mask] - bounds[shard]).astype(np.int32)
+        shards.append((local_indptr, local_indices, data[mask] if data is not None else None))
+    return shards
+
+
+class Shard:
+    """
+    Scoring state of one recipe range, as plain arrays.
+
+    ``term_indptr``/``term_indices`` are the ingredient index posting lists
+    restricted to the shard and ``recipe_lengths`` its recipes' ingredient
+    counts, for the 'match' method. ``col_*`` are the TF-IDF matrix columns
+    restricted to the shard's rows, for 'tfidf'. Recipe ids in the arrays
+    are local; results are returned with global ids.
+    """
+
+    def __init__(self, arrays, first_id):
+        """
+        Args:
+            arrays (dict): Shard arrays, possibly views of shared memory
+            first_id (int): Global id of the shard's first recipe
+        """
+        self.arrays = arrays
+        self.first_id = first_id
+        self.columns = None
+        if 'col_data' in arrays:
+            self.columns = sparse.csc_matrix(
+                (arrays['col_data'], arrays['col_indices'], arrays['col_indptr']),
+                shape=(len(arrays['recipe_lengths']), len(arrays['col_indptr']) - 1)
+            )
+
+    def score(self, method, queries, top_n, allowed=None):
+        """
+        Local top-k of each query
+
+        Args:
+            method (str): 'match' or 'tfidf'
+            queries (list): Per query, a list of matching term id arrays
+                (one per ingredient) for 'match', or (columns, weights) of
+                the TF-IDF query vector for 'tfidf'
+            top_n (int): Number of recipes to return per query
+            allowed (list): Per query, a bitmap of the shard's recipes that
+                may be returned (see recipe_filter), or None
+
+        Returns:
+            list: One (global recipe ids, scores) tuple per query, best first
+        """
+        rank = self._rank_tfidf if method == 'tfidf' else self._rank_match
+        allowed = allowed or [None] * len(queries)
+        return [rank(query, top_n, bitmap) for query, bitmap in zip(queries, allowed)]
+
+    def _rank_match(self, ingredient_terms, top_n, allowed=None):
+        # Same as IngredientIndex.match_counts, over this shard's postings
+        indptr, indices = self.arrays['term_indptr'], self.arrays['term_indices']
+        postings = []
+        for term_ids in ingredient_terms:
+            parts = [indices[indptr[tid]:indptr[tid + 1]] for tid in term_ids]
+            parts = [part for part in parts if len(part)]
+            if parts:
+                ids = np.concatenate(parts)
+                if allowed is not None:
+                    ids = ids[bitmap_contains(allowed, ids)]
+                postings.append(np.unique(ids))
+        if not postings:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        candidates, matches = np.unique(np.concatenate(postings), return_counts=True)
+        scores = matches / self.arrays['recipe_lengths'][candidates]
+        return select_top_k(scores, top_n, candidates.astype(np.int64) + self.first_id)
+
+    def _rank_tfidf(self, query, top_n, allowed=None):
+        columns, weights = query
+        if not len(columns):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self.columns[:, columns] @ weights
+        if allowed is not None:
+            rows = np.flatnonzero((scores > 0) & bitmap_mask(allowed, len(scores)))
+            ids, scores = select_top_k(scores[rows], top_n, rows)
+        else:
+            ids, scores = select_top_k(scores, top_n)
+        return ids + self.first_id, scores
+
+
+def _attach(name, layout):
+    """Map a shard's arrays from its shared memory segment without copying"""
+    segment = shared_memory.SharedMemory(name=name)
+    arrays = {
+        key: np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=offset)
+        for key, (offset, dtype, shape) in layout.items()
+    }
+    return segment, arrays
+
+
+def _shard_main(conns, name, layout, first_id):
+    """Entry point of a shard process: score requests from ``conns`` until told to stop"""
+    segment, arrays = _attach(name, layout)
+    shard = Shard(arrays, first_id)
+    conns[0].send('ready')
+    open_conns = list(conns)
+    while open_conns:
+        for conn in connection.wait(open_conns):
+            try:
+                message = conn.recv()
+            except EOFError:
+                # The serving process is gone
+                message = None
+            if message is None:
+                open_conns.remove(conn)
+                continue
+            try:
+                conn.send(('ok', shard.score(*message)))
+            except Exception as e:
+                conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class ShardPool:
+    """
+    Shard processes started by one process, and the pipes to them.
+
+    Each channel is one pipe per shard, so a query sent on a channel goes to
+    every shard and its replies come back on the same channel. Up to
+    ``len(channels)`` queries are in flight at once, each holding one
+    channel for a single exchange; every shard answers its channels in
+    turn. A pool whose pipe to a shard failed is marked broken and must be
+    replaced.
+    """
+
+    def __init__(self, processes, channels):
+        """
+        Args:
+            processes (list): Shard processes
+            channels (list): Channels, each a list of one connection per shard
+        """
+        self.pid = os.getpid()
+        self.processes = processes
+        self.channels = channels
+        self.broken = False
+        self._idle = queue.Queue()
+        for channel in channels:
+            self._idle.put(channel)
+
+    def exchange(self, messages):
+        """
+        Send one message to each shard and wait for their replies
+
+        Args:
+            messages (list): One message per shard
+
+        Returns:
+            list: One reply per shard
+
+        Raises:
+            EOFError, OSError: If the pipe to a shard failed; the pool is
+                then marked broken
+        """
+        channel = self._idle.get()
+        try:
+            for conn, message in zip(channel, messages):
+                conn.send(message)
+            return [conn.recv() for conn in channel]
+        except (EOFError, OSError):
+            self.broken = True
+            raise
+        finally:
+            self._idle.put(channel)
+
+    def stop(self, timeout=5):
+        """Stop the shard processes once the exchanges in flight are over (or ``timeout`` passed)"""
+        # Hold every channel so no connection is closed under a reader
+        for _ in self.channels:
+            try:
+                self._idle.get(timeout=timeout)
+            except queue.Empty:
+                break
+        for channel in self.channels:
+            for conn in channel:
+                try:
+                    conn.send(None)
+                    conn.close()
+                except OSError:
+                    pass
+        for process in self.processes:
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+class ShardedScorer:
+    """
+    Scores 'match' and 'tfidf' queries across a pool of shard processes.
+
+    Recipes are split into ``n_shards`` contiguous id ranges. Each range's
+    posting lists and TF-IDF columns are copied once into a shared memory
+    segment, which one long-lived process maps without copying and scores
+    against; the serving process unlinks the segments as soon as every shard
+    has attached, so nothing is left behind if it dies. A query is resolved
+    to term ids or a query vector by the caller, sent to every shard, and
+    each shard returns its local top-k for the caller to merge
+    (ranking.merge_top_k). Scoring a query thus runs on ``n_shards`` cores
+    while the merge only touches ``n_shards * top_n`` entries. Up to
+    ``channels`` queries from different threads are in flight at once (see
+    ShardPool).
+
+    Shard processes are started with 'spawn', so nothing is inherited from
+    the threads of the serving process, and belong to the process that
+    started them. Starting takes a while, so it never happens on the request
+    path: start() it in each process that serves (gunicorn's post_fork), or
+    let top_k() start it in the background. Until the pool is running, and
+    while a pool whose shard died is replaced in the background, top_k()
+    returns None and callers score in process.
+    """
+
+    START_TIMEOUT = 120
+
+    # Seconds before starting again after a failed start
+    RESTART_DELAY = 30
+
+    def __init__(self, index, tfidf_model=None, n_shards=2, channels=4):
+        """
+        Args:
+            index (IngredientIndex): Ingredient index of the snapshot
+            tfidf_model (TfidfIngredientModel): TF-IDF model, if 'tfidf'
+                queries should be sharded too
+            n_shards (int): Number of shard processes
+            channels (int): Queries that may be in flight at once
+        """
+        if n_shards < 1:
+            raise ValueError("n_shards must be at least 1")
+        if channels < 1:
+            raise ValueError("channels must be at least 1")
+        self.index = index
+        self.tfidf_model = tfidf_model
+        self.n_shards = n_shards
+        self.n_channels = channels
+        self.methods = {'match', 'tfidf'} if tfidf_model is not None else {'match'}
+        self.pool = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._starting = None
+        self._retry_at = 0.0
+        self._closed = False
+
+    @property
+    def running(self):
+        """Whether this process has a working pool"""
+        return self._usable(self.pool)
+
+    def _usable(self, pool):
+        return pool is not None and pool.pid == os.getpid() and not pool.broken and not self._closed
+
+    def _shard_arrays(self):
+        """Per-shard dicts of the arrays each shard process needs"""
+        index = self.index
+        bounds = shard_bounds(len(index), self.n_shards)
+        shards = [
+            {'term_indptr': indptr, 'term_indices': indices,
+             'recipe_lengths': index.recipe_lengths[bounds[i]:bounds[i + 1]]}
+            for i, (indptr, indices, _) in enumerate(split_postings(index.term_indptr, index.term_indices, bounds))
+        ]
+        if self.tfidf_model is not None:
+            columns = self.tfidf_model.columns
+            split = split_postings(columns.indptr, columns.indices, bounds, columns.data)
+            for arrays, (indptr, indices, data) in zip(shards, split):
+                arrays.update(col_indptr=indptr, col_indices=indices, col_data=data)
+        return bounds, shards
+
+    @staticmethod
+    def _to_shared_memory(arrays):
+        """Copy arrays into one new shared memory segment; returns it and its layout"""
+        layout, offset = {}, 0
+        for key, array in arrays.items():
+            layout[key] = (offset, array.dtype.str, array.shape)
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        segment = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for key, array in arrays.items():
+            start, dtype, shape = layout[key]
+            np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=start)[...] = array
+        return segment, layout
+
+    def _spawn(self):
+        """Start a new ShardPool"""
+        bounds, shards = self._shard_arrays()
+        context = multiprocessing.get_context('spawn')
+        segments, processes = [], []
+        channels = [[] for _ in range(self.n_channels)]
+        pool = ShardPool(processes, channels)
+        try:
+            for i, arrays in enumerate(shards):
+                segment, layout = self._to_shared_memory(arrays)
+                segments.append(segment)
+                pipes = [context.Pipe() for _ in channels]
+                process = context.Process(
+                    target=_shard_main, args=([child for _, child in pipes], segment.name, layout, int(bounds[i])),
+                    name=f'recipe-shard-{i}', daemon=True
+                )
+                process.start()
+                processes.append(process)
+                for channel, (parent, child) in zip(channels, pipes):
+                    child.close()
+                    channel.append(parent)
+            for conn in channels[0]:
+                if not conn.poll(self.START_TIMEOUT) or conn.recv() != 'ready':
+                    raise RuntimeError("Shard process failed to start")
+        except Exception:
+            pool.stop(timeout=0)
+            raise
+        finally:
+            # Attached shards keep their mappings; the names are no longer needed
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+        logger.info("Started %d scoring shards of about %d recipes", self.n_shards, bounds[1])
+        return pool
+
+    def start(self):
+        """
+        Start the shard processes, unless this process already has a working pool
+
+        Replaces a broken pool. Blocks until every shard is ready.
+
+        Returns:
+            ShardedScorer: The scorer itself, for chaining
+
+        Raises:
+            RuntimeError: If a shard process fails to start
+        """
+        with self._start_lock:
+            if self._closed or self.running:
+                return self
+            pool = self._spawn()
+            with self._lock:
+                previous, self.pool = self.pool, pool
+                closed = self._closed
+            if closed:
+                self.pool = None
+                pool.stop()
+            # A pool inherited through a fork belongs to the parent: leave it alone
+            if previous is not None and previous.pid == os.getpid():
+                previous.stop()
+        return self
+
+    def start_in_background(self):
+        """
+        Start (or replace a broken pool) on a background thread
+
+        Returns at once. Does nothing if the pool is running, a start is
+        under way, or the last one failed less than RESTART_DELAY seconds ago.
+        """
+        pid = os.getpid()
+        with self._lock:
+            if self._closed or self.running or self._starting == pid or time.monotonic() < self._retry_at:
+                return
+            self._starting = pid
+        threading.Thread(target=self._start_quietly, name='recipe-shards-start', daemon=True).start()
+
+    def _start_quietly(self):
+        try:
+            self.start()
+        except Exception as e:
+            logger.exception("Could not start scoring shards, scoring in process: %s", e)
+            self._retry_at = time.monotonic() + self.RESTART_DELAY
+        finally:
+            self._starting = None
+
+    def top_k(self, method, queries, top_n, allowed=None):
+        """
+        Score queries on every shard
+
+        Args:
+            method (str): 'match' or 'tfidf', see Shard.score
+            queries (list): Queries in the form Shard.score expects
+            top_n (int): Number of recipes to return per query and shard
+            allowed (list): Per query, a bitmap of the recipes that may be
+                returned, or None; each shard is sent its own slice
+
+        Returns:
+            list: Per query, the list of each shard's (recipe ids, scores),
+                or None if there is no working pool and the caller should
+                score in process
+        """
+        pool = self.pool
+        if not self._usable(pool):
+            self.start_in_background()
+            return None
+        shard_allowed = [None] * self.n_shards
+        if allowed is not None and any(bitmap is not None for bitmap in allowed):
+            bounds = shard_bounds(len(self.index), self.n_shards)
+            masks = [bitmap_mask(bitmap, len(self.index)) if bitmap is not None else None for bitmap in allowed]
+            shard_allowed = [
+                [np.packbits(mask[bounds[i]:bounds[i + 1]], bitorder='little') if mask is not None else None
+                 for mask in masks]
+                for i in range(self.n_shards)
+            ]
+        try:
+            replies = pool.exchange([(method, queries, top_n, bitmaps) for bitmaps in shard_allowed])
+        except (EOFError, OSError) as e:
+            logger.warning("Lost a scoring shard (%s: %s), scoring in process until it is restarted",
+                           type(e).__name__, e)
+            self.start_in_background()
+            return None
+        errors = [reply for status, reply in replies if status != 'ok']
+        if errors:
+            raise RuntimeError(f"Shard scoring failed: {errors[0]}")
+        return [list(parts) for parts in zip(*(reply for _, reply in replies))]
+
+    def close(self):
+        """Stop the shard processes; later calls to top_k() return None"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            pool, self.pool = self.pool, None
+        if pool is not None and pool.pid == os.getpid():
+            pool.stop()
@@ -0,0 +1,155 @@
+import numpy as np
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions)
+
+    Only a band of width ``max_distance`` around the diagonal is computed,
+    and the computation stops as soon as the distance must exceed it.
+
+    Args:
+        a (str): First string
+        b (str): Second string
+        max_distance (int): Largest distance of interest
+
+    Returns:
+        int: The distance, or ``max_distance + 1`` if it is larger
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    too_far = max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        current[0] = i
+        lo, hi = max(1, i - max_distance), min(len(b), i + max_distance)
+        for j in range(lo, hi + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+        if min(current[lo - 1:hi + 1]) > max_distance:
+            return too_far
+        previous2, previous = previous, current
+    return min(previous[len(b)], too_far)
+
+
+class SpellingCorrector:
+    """
+    Typo-tolerant lookup of ingredient words, via trigram postings.
+
+    Each known word is indexed by the trigrams of ``$word$``. A misspelt word
+    shares most of its trigrams with the intended one (one edit changes at
+    most four), so candidates come from counting shared trigrams over a
+    few posting lists and only those are checked with a bounded edit
+    distance. The work depends on the size of the ingredient vocabulary,
+    never on the number of recipes.
+    """
+
+    CACHE_SIZE = 10000
+
+    def __init__(self, word_frequency, min_length=4):
+        """
+        Args:
+            word_frequency (dict): Known word to frequency, used to break ties
+            min_length (int): Shorter words are never corrected
+        """
+        self.words = sorted(word_frequency)
+        self.frequency = np.asarray([word_frequency[word] for word in self.words], dtype=np.int64)
+        self.lengths = np.asarray([len(word) for word in self.words], dtype=np.int32)
+        self.known = set(self.words)
+        self.min_length = min_length
+        grams = {}
+        for word_id, word in enumerate(self.words):
+            for gram in set(self._grams(word)):
+                grams.setdefault(gram, []).append(word_id)
+        self.gram_postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in grams.items()}
+        self._cache = {}
+
+    @classmethod
+    def from_vocabulary(cls, vocabulary, **kwargs):
+        """
+        Index the words of every canonical ingredient name
+
+        Args:
+            vocabulary (IngredientVocabulary): Canonical ingredient names
+
+        Returns:
+            SpellingCorrector: The corrector
+        """
+        word_frequency = {}
+        for term, frequency in zip(vocabulary.terms, vocabulary.document_frequency):
+            for word in term.split():
+                if word.isalpha():
+                    word_frequency[word] = word_frequency.get(word, 0) + int(frequency)
+        return cls(word_frequency, **kwargs)
+
+    @staticmethod
+    def _grams(word):
+        padded = f"${word}$"
+        return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    def max_distance(self, word):
+        """Edits allowed for a word: one up to 7 letters, two from 8"""
+        return 1 if len(word) < 8 else 2
+
+    def correct_word(self, word):
+        """
+        Closest known word within the allowed edit distance
+
+        Args:
+            word (str): Lowercased word
+
+        Returns:
+            str: The word itself if known or not correctable, otherwise the
+                closest known word, most frequent on ties
+        """
+        if word in self.known or len(word) < self.min_length or not word.isalpha():
+            return word
+        cached = self._cache.get(word)
+        if cached is not None:
+            return cached
+
+        max_distance = self.max_distance(word)
+        grams = self._grams(word)
+        postings = [self.gram_postings[gram] for gram in set(grams) if gram in self.gram_postings]
+        best = word
+        if postings:
+            candidates, shared = np.unique(np.concatenate(postings), return_counts=True)
+            # Each edit changes at most four trigrams (three, or four for a
+            # transposition) and the length by at most one
+            keep = (shared >= len(grams) - 4 * max_distance) & \
+                (np.abs(self.lengths[candidates] - len(word)) <= max_distance)
+            candidates = candidates[keep]
+            best_key = None
+            for word_id in candidates:
+                candidate = self.words[word_id]
+                distance = edit_distance(word, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self.frequency[word_id], candidate)
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+
+        if len(self._cache) >= self.CACHE_SIZE:
+            self._cache.clear()
+        self._cache[word] = best
+        return best
+
+    def correct(self, text):
+        """
+        Correct every word of a query ingredient
+
+        Args:
+            text (str): Lowercased query ingredient, e.g. "parmesean cheese"
+
+        Returns:
+            str: The corrected ingredient ("parmesan cheese"), or ``text``
+                unchanged if no word needed or allowed a correction
+        """
+        words = text.split()
+        corrected = [self.correct_word(word) for word in words]
+        return ' '.join(corrected) if corrected != words else text
@@ -0,0 +1,193 @@
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from models.ranking import select_top_k, select_top_k_rows
+from models.dataset_cache import pack_strings, unpack_strings
+
+
+class TfidfIngredientModel:
+    """
+    Sparse TF-IDF model of recipe ingredients.
+
+    Each recipe is a document made of its ingredient words. Rows are L2
+    normalised, so scoring a query is a single sparse matrix-vector product
+    yielding cosine similarities, followed by an ``argpartition`` top-k.
+    """
+
+    def __init__(self):
+        self.vectorizer = TfidfVectorizer(
+            token_pattern=r"(?u)\b[a-z][a-z]+\b",
+            stop_words='english',
+            sublinear_tf=True,
+            dtype=np.float32,
+        )
+        self.matrix = None
+        self._columns = None
+        self._analyzer = None
+        self._vocabulary = None
+        self._idf = None
+
+    def fit(self, documents):
+        """
+        Fit the vocabulary and build the recipe-term matrix
+
+        Args:
+            documents (iterable): One ingredient text per recipe, in recipe id order
+
+        Returns:
+            TfidfIngredientModel: The model itself, for chaining
+        """
+        self.matrix = self.vectorizer.fit_transform(documents).tocsr()
+        # Column-major copy so a query only touches the columns of its terms
+        self._columns = self.matrix.tocsc()
+        self._analyzer = self.vectorizer.build_analyzer()
+        self._vocabulary = self.vectorizer.vocabulary_
+        self._idf = self.vectorizer.idf_.astype(np.float32)
+        return self
+
+    @property
+    def columns(self):
+        """Column-major (CSC) copy of the recipe-term matrix"""
+        return self._columns
+
+    def to_arrays(self):
+        """
+        Export the fitted model as flat arrays for the dataset cache
+
+        Returns:
+            tuple: (dict of numpy arrays, dict of JSON-serialisable metadata)
+        """
+        vocabulary = sorted(self._vocabulary, key=self._vocabulary.get)
+        vocab_blob, vocab_offsets = pack_strings(vocabulary)
+        arrays = {
+            'data': self.matrix.data,
+            'indices': self.matrix.indices,
+            'indptr': self.matrix.indptr,
+            'col_data': self._columns.data,
+            'col_indices': self._columns.indices,
+            'col_indptr': self._columns.indptr,
+            'idf': self._idf,
+            'vocab_blob': vocab_blob,
+            'vocab_offsets': vocab_offsets,
+        }
+        return arrays, {'shape': list(self.matrix.shape)}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """
+        Rebuild a model exported with to_arrays()
+
+        Args:
+            arrays (dict): Arrays as returned by to_arrays(), possibly memory-mapped
+            meta (dict): Metadata as returned by to_arrays()
+
+        Returns:
+            TfidfIngredientModel: The restored model
+        """
+        model = cls()
+        shape = tuple(meta['shape'])
+        model.matrix = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=shape)
+        model._columns = sparse.csc_matrix(
+            (arrays['col_data'], arrays['col_indices'], arrays['col_indptr']), shape=shape
+        )
+        model._analyzer = model.vectorizer.build_analyzer()
+        vocabulary = unpack_strings(arrays['vocab_blob'], arrays['vocab_offsets'])
+        model._vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        model._idf = arrays['idf']
+        return model
+
+    def transform(self, queries):
+        """
+        Vectorise queries into the model's term space
+
+        Args:
+            queries (list): List of ingredient lists
+
+        Returns:
+            scipy.sparse.csr_matrix: One L2-normalised row per query
+        """
+        vectors = [self.query_vector(ingredients) for ingredients in queries]
+        indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(columns) for columns, _ in vectors])
+        indices = np.concatenate([columns for columns, _ in vectors] or [np.zeros(0, dtype=np.int64)])
+        data = np.concatenate([weights for _, weights in vectors] or [np.zeros(0, dtype=np.float32)])
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(vectors), self.matrix.shape[1]))
+
+    def score(self, user_ingredients, rows=None):
+        """
+        Cosine similarity between a query and every recipe
+
+        Args:
+            user_ingredients (list): Lowercased user ingredients
+            rows (numpy.ndarray): Only score these recipe ids; reading their
+                rows costs less than the query's columns when they are few
+
+        Returns:
+            numpy.ndarray: One score per recipe, or per id in ``rows``
+        """
+        columns, weights = self.query_vector(user_ingredients)
+        if not len(columns):
+            return np.zeros(self.matrix.shape[0] if rows is None else len(rows), dtype=np.float32)
+        if rows is not None:
+            return self.matrix[rows][:, columns] @ weights
+        return self._columns[:, columns] @ weights
+
+    def query_vector(self, user_ingredients):
+        """
+        TF-IDF weights of one query, matching the vectorizer's own transform
+        but without the per-call overhead of going through sklearn
+
+        Returns:
+            tuple: (column ids, L2-normalised weights) numpy arrays
+        """
+        counts = {}
+        for token in self._analyzer(' '.join(user_ingredients)):
+            column = self._vocabulary.get(token)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        columns = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        weights = (1 + np.log(tf)) * self._idf[columns]
+        norm = np.linalg.norm(weights)
+        return columns, weights / norm if norm else weights
+
+    def top_k(self, user_ingredients, top_n=10):
+        """
+        Highest scoring recipes for a query
+
+        Args:
+            user_ingredients (list): Lowercased user ingredients
+            top_n (int): Number of recipes to return
+
+        Returns:
+            tuple: (recipe ids, scores) of recipes with a positive score, best first
+        """
+        return select_top_k(self.score(user_ingredients), top_n)
+
+    def score_batch(self, queries):
+        """
+        Cosine similarity of every recipe to each of many queries
+
+        Args:
+            queries (list): List of lowercased ingredient lists
+
+        Returns:
+            scipy.sparse.csr_matrix: One row of recipe scores per query
+        """
+        return self.transform(queries) @ self.matrix.T
+
+    def top_k_batch(self, queries, top_n=10):
+        """
+        Highest scoring recipes for many queries at once
+
+        All queries are scored together with one sparse matrix product
+        against the recipe-term matrix.
+
+        Args:
+            queries (list): List of lowercased ingredient lists
+            top_n (int): Number of recipes to return per query
+
+        Returns:
+            list: One (recipe ids, scores) tuple per query, in input order
+        """
+        return select_top_k_rows(self.score_batch(queries), top_n)
@@ -0,0 +1,31 @@
+import os
+import shutil
+import sys
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SAMPLE_DATASET = os.path.join(BACKEND_DIR, 'data', 'recipes_sample.csv')
+
+
+@pytest.fixture(scope='session')
+def sample_dataset(tmp_path_factory):
+    """A copy of the sample dataset, so that compiled caches and journals stay out of the tree"""
+    path = tmp_path_factory.mktemp('data') / 'recipes.csv'
+    shutil.copy(SAMPLE_DATASET, path)
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def load_recommender(sample_dataset):
+    """Returns a new recommender with the sample dataset and TF-IDF model loaded"""
+    from models.recommendation_model import RecipeRecommender
+
+    def load(path=sample_dataset):
+        recommender = RecipeRecommender(path)
+        assert recommender.load_data()
+        recommender.build_tfidf_model()
+        return recommender
+
+    return load
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import threading
+import pytest
+from flask import Flask, jsonify, request, send_file
+from models.async_serving import AsyncWsgiApp, FileWrapper, RecommendCoalescing
+
+IMAGE = bytes(range(256)) * 1024
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Sizes of the blocks read by FileWrapper"""
+    reads = []
+    read_block = FileWrapper.__next__
+
+    def next_block(self):
+        block = read_block(self)
+        reads.append(len(block))
+        return block
+
+    monkeypatch.setattr(FileWrapper, '__next__', next_block)
+    return reads
+
+
+def make_app(tmp_path, release):
+    image_path = tmp_path / 'image.jpg'
+    image_path.write_bytes(IMAGE)
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/ingest', methods=['POST'])
+    def ingest():
+        lines = [len(line) for line in request.stream]
+        return jsonify(lines=lines)
+
+    @app.route('/api/recommend', methods=['POST'])
+    def recommend():
+        calls.append(request.get_json())
+        release.wait(5)
+        return jsonify(calls=len(calls))
+
+    @app.route('/image')
+    def image():
+        return send_file(str(image_path), mimetype='image/jpeg', conditional=True)
+
+    return app, calls
+
+
+async def call(application, method, path, chunks=(b'',), headers=(), on_receive=None):
+    """Drive one request through the ASGI app; returns (status, headers, body)"""
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+             'headers': [(name.encode(), value.encode()) for name, value in headers]}
+    sent = []
+
+    async def receive():
+        if on_receive is not None:
+            on_receive(len(messages))
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    return sent[0]['status'], dict(sent[0]['headers']), b''.join(m.get('body', b'') for m in sent[1:])
+
+
+def test_request_body_is_streamed(tmp_path):
+    app, _ = make_app(tmp_path, threading.Event())
+    application = AsyncWsgiApp(app, coalescing=RecommendCoalescing())
+    chunks = [b'{"a": 1}\n{"b"', b': 2}\n', b'{"c": 3}\n']
+    remaining = []
+
+    status, _, body = asyncio.run(call(application, 'POST', '/ingest', chunks,
+                                       headers=[('content-type', 'application/x-ndjson')],
+                                       on_receive=remaining.append))
+    assert status == 200
+    assert json.loads(body)['lines'] == [9, 9, 9]
+    # Pulled from the client one message at a time, not read ahead in full
+    assert remaining == [3, 2, 1]
+
+
+def test_range_request_seeks(tmp_path, reads):
+    app, _ = make_app(tmp_path, threading.Event())
+    application = AsyncWsgiApp(app)
+    start, end = 200000, 200999
+
+    status, headers, body = asyncio.run(call(application, 'GET', '/image',
+                                             headers=[('range', f"bytes={start}-{end}")]))
+    assert status == 206
+    assert headers[b'content-range'] == f"bytes {start}-{end}/{len(IMAGE)}".encode()
+    assert body == IMAGE[start:end + 1]
+    assert sum(reads) < 2 * 64 * 1024
+
+
+def test_file_is_read_in_large_blocks(tmp_path, reads):
+    app, _ = make_app(tmp_path, threading.Event())
+
+    status, _, body = asyncio.run(call(AsyncWsgiApp(app), 'GET', '/image'))
+    assert status == 200
+    assert body == IMAGE
+    assert max(reads) == 64 * 1024
+
+
+def test_file_wrapper_seeks(tmp_path):
+    path = tmp_path / 'file'
+    path.write_bytes(b'0123456789')
+    wrapper = FileWrapper(open(path, 'rb'))
+    assert wrapper.seekable()
+    wrapper.seek(4)
+    assert wrapper.tell() == 4
+    assert list(wrapper) == [b'456789']
+    wrapper.close()
+
+
+def test_identical_requests_are_coalesced(tmp_path):
+    release = threading.Event()
+    app, calls = make_app(tmp_path, release)
+    application = AsyncWsgiApp(app, coalescing=RecommendCoalescing())
+
+    def recommend(body):
+        return call(application, 'POST', '/api/recommend', [body],
+                    headers=[('content-type', 'application/json'), ('content-length', str(len(body)))])
+
+    async def burst():
+        requests = [asyncio.ensure_future(recommend(b'{"ingredients": ["egg"], "top_n": 5}')),
+                    asyncio.ensure_future(recommend(b'{"top_n": 5, "ingredients": ["egg"]}'))]
+        await asyncio.sleep(0.2)
+        release.set()
+        return await asyncio.gather(*requests)
+
+    responses = asyncio.run(burst())
+    assert [status for status, _, _ in responses] == [200, 200]
+    assert len(calls) == 1
+    assert application.coalescer.stats()['followers'] == 1
+
+
+def test_only_small_recommend_requests_are_candidates():
+    coalescing = RecommendCoalescing(max_body=100)
+
+    def scope(method='POST', path='/api/recommend', length='50'):
+        headers = [] if length is None else [(b'content-length', length.encode())]
+        return {'method': method, 'path': path, 'headers': headers}
+
+    assert coalescing.candidate(scope())
+    assert not coalescing.candidate(scope(length='101'))
+    assert not coalescing.candidate(scope(length=None))
+    assert not coalescing.candidate(scope(path='/api/recipes'))
+    assert not coalescing.candidate(scope(method='GET'))
+
+
+def test_key_depends_on_scheme_and_mount_point():
+    coalescing = RecommendCoalescing()
+    body = b'{"ingredients": ["egg"]}'
+
+    def key(**scope):
+        return coalescing.key(dict({'method': 'POST', 'path': '/api/recommend', 'headers': []}, **scope), body)
+
+    assert key(scheme='http') == key()
+    assert key(scheme='https') != key(scheme='http')
+    assert key(root_path='/recipes') != key()
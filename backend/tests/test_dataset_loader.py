@@ -0,0 +1,128 @@
+import threading
+import time
+from models.dataset_loader import DatasetLoader
+
+
+class Snapshot:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class SlowFactory:
+    """Builds numbered snapshots, each held until released, and records overlapping builds"""
+
+    def __init__(self):
+        self.started = 0
+        self.running = 0
+        self.overlapped = False
+        self.release = threading.Semaphore(0)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.started += 1
+            number = self.started
+            self.running += 1
+            self.overlapped = self.overlapped or self.running > 1
+        self.release.acquire(timeout=5)
+        with self._lock:
+            self.running -= 1
+        return Snapshot(number)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_reloads_during_a_build_are_queued_behind_it():
+    factory = SlowFactory()
+    loader = DatasetLoader(factory)
+    assert loader.reload()
+    wait_for(lambda: factory.started == 1)
+    assert not loader.reload()
+    assert not loader.reload()
+
+    factory.release.release()
+    wait_for(lambda: factory.started == 2)
+    # Still loading between the first publish and the queued build
+    assert loader.current.number == 1 and loader.loading
+    assert not loader.reload()
+
+    factory.release.release()
+    factory.release.release()
+    wait_for(lambda: not loader.loading)
+    assert factory.started == 3
+    assert loader.current.number == 3
+    assert not factory.overlapped
+
+
+def test_loading_until_the_snapshot_is_published():
+    seen = []
+    loader = DatasetLoader(lambda: Snapshot(len(seen)))
+
+    class Recording(Snapshot):
+        def close(self):
+            # Called after the next snapshot is published
+            seen.append(loader.loading)
+
+    loader.current = Recording(-1)
+    assert loader.load_now()
+    assert seen == [True]
+    assert not loader.loading
+
+
+def test_load_now_waits_for_a_running_build():
+    factory = SlowFactory()
+    loader = DatasetLoader(factory)
+    loader.reload()
+    wait_for(lambda: factory.started == 1)
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(loader.load_now()))
+    thread.start()
+    time.sleep(0.2)
+    assert factory.started == 1
+
+    factory.release.release()
+    factory.release.release()
+    thread.join(5)
+    assert results == [True]
+    assert factory.started == 2 and loader.current.number == 2
+    assert not factory.overlapped and not loader.loading
+
+
+def test_reload_during_load_now_runs_after_it():
+    factory = SlowFactory()
+    loader = DatasetLoader(factory)
+    thread = threading.Thread(target=loader.load_now)
+    thread.start()
+    wait_for(lambda: factory.started == 1)
+    assert not loader.reload()
+
+    factory.release.release()
+    thread.join(5)
+    wait_for(lambda: factory.started == 2)
+    factory.release.release()
+    wait_for(lambda: not loader.loading)
+    assert loader.current.number == 2
+    assert not factory.overlapped
+
+
+def test_failed_build_clears_loading():
+    def factory():
+        raise RuntimeError("no data")
+
+    loader = DatasetLoader(factory)
+    assert not loader.load_now()
+    assert not loader.loading
+    assert loader.last_error == "no data"
+    assert loader.reload()
+    wait_for(lambda: not loader.loading)
+    assert not loader.ready
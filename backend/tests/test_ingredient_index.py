@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+from models.ingredient_index import IngredientIndex
+
+QUERIES = [
+    ['chicken', 'garlic'],
+    ['chick'],
+    ['egg', 'flour', 'sugar'],
+    ['salt'],
+    ['oi'],
+    ['lemon', 'parmesan', 'olive oil'],
+    ['no such ingredient'],
+]
+
+
+def scan_ranking(ingredient_lists, user_ingredients):
+    """The original scorer: a substring test against every recipe, in a stable sort"""
+    scores = []
+    for idx, recipe_ingredients in enumerate(ingredient_lists):
+        matches = sum(1 for ing in user_ingredients if any(ing in recipe_ing for recipe_ing in recipe_ingredients))
+        if matches > 0:
+            scores.append((idx, matches / len(recipe_ingredients)))
+    scores.sort(key=lambda x: x[1], reverse=True)
+    return scores
+
+
+@pytest.fixture(scope='module')
+def ingredient_lists(sample_dataset):
+    df = pd.read_csv(sample_dataset)
+    return list(df['Cleaned_Ingredients'].apply(lambda x: x.lower().split(', ')))
+
+
+@pytest.mark.parametrize('user_ingredients', QUERIES)
+def test_ranking_matches_the_scan(load_recommender, ingredient_lists, user_ingredients):
+    recommender = load_recommender()
+    expected = scan_ranking(ingredient_lists, sorted(user_ingredients))
+    ids, scores = recommender.rank(user_ingredients, 'match')
+    assert list(zip(ids.tolist(), scores.tolist())) == expected[:recommender.MAX_RANKED]
+
+
+@pytest.mark.parametrize('user_ingredients', QUERIES)
+def test_match_counts_survive_export(ingredient_lists, user_ingredients):
+    index = IngredientIndex().build(ingredient_lists)
+    restored = IngredientIndex.from_arrays(*index.to_arrays())
+    candidates, counts = restored.match_counts(user_ingredients)
+    expected = {idx: sum(1 for ing in user_ingredients if any(ing in item for item in ingredient_lists[idx]))
+                for idx in range(len(ingredient_lists))}
+    assert dict(zip(candidates.tolist(), counts.tolist())) == {idx: n for idx, n in expected.items() if n}
@@ -0,0 +1,58 @@
+import pytest
+from models.ingredient_parser import canonicalize, parse_ingredient_list, singularize
+
+
+@pytest.mark.parametrize('line, name', [
+    # Quantities, fractions and units
+    ('2 cups all-purpose flour', 'all purpose flour'),
+    ('1/2 teaspoon salt', 'salt'),
+    ('1 1/2 tablespoons olive oil', 'olive oil'),
+    ('½ cup sugar', 'sugar'),
+    ('3 ears of corn', 'corn'),
+    ('2 to 3 tablespoons extra-virgin olive oil', 'extra virgin olive oil'),
+    ('1 stick (1/2 cup) cold unsalted butter, cut into small pieces', 'unsalted butter'),
+    # Descriptors, including at the start once the quantity is gone
+    ('1/4 cup finely grated Parmesan', 'parmesan'),
+    ('1/2 cup finely grated Parmesan, divided', 'parmesan'),
+    ('1 cup thinly sliced scallions', 'scallion'),
+    ('Kosher salt and freshly ground black pepper', 'kosher salt and black pepper'),
+    ('1 teaspoon freshly ground black pepper', 'black pepper'),
+    ('2 large eggs', 'egg'),
+    ('1 pound skinless, boneless chicken thighs', 'chicken thigh'),
+    # Hyphenated sizes and the container after them
+    ('1 14-ounce can hearts of palm', 'heart of palm'),
+    ('2-inch piece ginger', 'ginger'),
+    ('1 15.2-ounce can black beans', 'black bean'),
+    ('1/2 cup 1/4-inch-cubed butternut squash', 'butternut squash'),
+    ('1 (15-ounce) can chickpeas, drained', 'chickpea'),
+    # Alternatives
+    ('butter or margarine', 'butter'),
+    ('1 cup fresh or frozen corn', 'corn'),
+    # Plurals and trailing parts
+    ('4 garlic cloves', 'garlic'),
+    ('3 tomatoes', 'tomato'),
+    ('1 cup blueberries', 'blueberry'),
+    ('2 cups asparagus', 'asparagus'),
+    ('1 tablespoon molasses', 'molasses'),
+    # Notes name nothing
+    ('for serving', ''),
+    ('thinly sliced', ''),
+    ('cut into 1/2-inch-thick slices', ''),
+    ('salt to taste', 'salt'),
+])
+def test_canonicalize(line, name):
+    assert canonicalize(line) == name
+
+
+@pytest.mark.parametrize('word, singular', [
+    ('leaves', 'leaf'), ('cherries', 'cherry'), ('peaches', 'peach'), ('potatoes', 'potato'),
+    ('onions', 'onion'), ('swiss', 'swiss'), ('hummus', 'hummus'), ('peas', 'pea'),
+])
+def test_singularize(word, singular):
+    assert singularize(word) == singular
+
+
+def test_parse_ingredient_list():
+    assert parse_ingredient_list("['1 cup flour', '2 eggs, beaten']") == ['1 cup flour', '2 eggs, beaten']
+    assert parse_ingredient_list('1 cup flour, 2 eggs') == ['1 cup flour', '2 eggs']
+    assert parse_ingredient_list(float('nan')) == []
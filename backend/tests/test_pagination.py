@@ -0,0 +1,72 @@
+import os
+import shutil
+import pytest
+from conftest import SAMPLE_DATASET
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    """The Flask app serving a private copy of the sample dataset"""
+    path = tmp_path_factory.mktemp('app') / 'recipes.csv'
+    shutil.copy(SAMPLE_DATASET, path)
+    environ = pytest.MonkeyPatch()
+    environ.setenv('DATASET_PATH', str(path))
+    environ.setenv('IMAGE_CACHE_DIR', str(path.parent / 'variants'))
+    import app as app_module
+    assert app_module.dataset_path == str(path), "app was imported before this fixture"
+    assert app_module.ensure_dataset_loaded() is None
+    yield app_module
+    environ.undo()
+
+
+def recommend(client, **body):
+    response = client.post('/api/recommend', json=body)
+    return response.status_code, response.get_json()
+
+
+def test_cursor_round_trip(app_module):
+    from app import decode_cursor, encode_cursor
+    from models.recipe_filter import parse_constraints
+
+    constraints = parse_constraints(['egg'], ['nuts'], 8)
+    cursor = encode_cursor(['flour', 'sugar'], 'tfidf', 20, 10, ('id', 'title'), constraints, 'gen-1')
+    assert decode_cursor(cursor) == (['flour', 'sugar'], 'tfidf', 20, 10, ['id', 'title'], constraints, 'gen-1')
+    with pytest.raises(ValueError):
+        decode_cursor('not a cursor')
+
+
+def test_pages_follow_the_ranking(app_module):
+    client = app_module.app.test_client()
+    status, whole = recommend(client, ingredients=['chicken', 'garlic'], limit=10, fields='id')
+    assert status == 200 and whole['total'] > 10
+
+    status, first = recommend(client, ingredients=['chicken', 'garlic'], limit=5, fields='id')
+    assert status == 200 and first['next_cursor']
+    status, second = recommend(client, cursor=first['next_cursor'])
+    assert status == 200
+    # The cursor keeps the field projection of the first page
+    assert all(set(recipe) == {'id'} for recipe in second['recipes'])
+    assert first['recipes'] + second['recipes'] == whole['recipes']
+
+
+def test_malformed_cursor_is_rejected(app_module):
+    status, body = recommend(app_module.app.test_client(), cursor='bm90IGpzb24')
+    assert status == 400 and body['error'] == 'Invalid cursor'
+
+
+def test_cursor_expires_when_the_dataset_is_reloaded(app_module):
+    client = app_module.app.test_client()
+    status, first = recommend(client, ingredients=['butter'], limit=5)
+    assert status == 200 and first['next_cursor']
+
+    stat = os.stat(app_module.dataset_path)
+    os.utime(app_module.dataset_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert app_module.dataset_loader.load_now()
+
+    status, body = recommend(client, cursor=first['next_cursor'])
+    assert status == 410
+    assert 'reloaded' in body['error']
+    # Cursors from the new snapshot work
+    status, first = recommend(client, ingredients=['butter'], limit=5)
+    status, second = recommend(client, cursor=first['next_cursor'])
+    assert status == 200 and len(second['recipes']) == 5
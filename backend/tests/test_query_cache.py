@@ -0,0 +1,95 @@
+import os
+import shutil
+import pytest
+from models import query_cache
+from models.query_cache import QueryCache, SharedQueryCache
+from models.recommendation_model import RecipeRecommender
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryCache(max_size=10, ttl=60)
+    cache.put('a', 1)
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 2
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_size=2, ttl=0)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = QueryCache(max_size=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+
+
+def test_shared_level_serves_other_processes(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    QueryCache(shared=SharedQueryCache(path)).put(('gen', 'match', 10, ('egg',)), [{'id': 1}])
+    other = QueryCache(shared=SharedQueryCache(path))
+    assert other.get(('gen', 'match', 10, ('egg',))) == [{'id': 1}]
+    assert other.stats()['shared_hits'] == 1
+
+
+@pytest.fixture
+def recommender(sample_dataset, tmp_path):
+    path = tmp_path / 'recipes.csv'
+    shutil.copy(sample_dataset, path)
+    recommender = RecipeRecommender(str(path), use_cache=False,
+                                    query_cache=QueryCache(shared=SharedQueryCache(str(tmp_path / 'results.sqlite'))))
+    assert recommender.load_data()
+    return recommender
+
+
+def test_equivalent_queries_share_an_entry(recommender):
+    first = recommender.recommend(['Garlic', 'chicken'], top_n=5)
+    second = recommender.recommend([' chicken', 'garlic ', 'GARLIC', ''], top_n=5)
+    assert second == first
+    stats = recommender.query_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+
+
+def test_cached_results_are_not_shared_mutably(recommender):
+    recommender.recommend(['egg'], top_n=3)[0]['image_url'] = 'x'
+    assert 'image_url' not in recommender.recommend(['egg'], top_n=3)[0]
+
+
+def test_reload_starts_a_new_generation(recommender):
+    recommender.recommend(['egg'], top_n=5)
+    generation = recommender.generation
+    stat = os.stat(recommender.dataset_path)
+    os.utime(recommender.dataset_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert recommender.load_data()
+
+    assert recommender.generation != generation
+    assert recommender.query_cache.stats()['size'] == 0
+    recommender.recommend(['egg'], top_n=5)
+    # Neither level answered from the previous dataset's entry
+    stats = recommender.query_cache.stats()
+    assert (stats['hits'], stats['shared_hits']) == (0, 0)
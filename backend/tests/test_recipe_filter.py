@@ -0,0 +1,76 @@
+import csv
+import pytest
+from models.recipe_filter import bitmap_mask, constraint_mask, parse_constraints
+from models.recommendation_model import RecipeRecommender
+
+RECIPES = [
+    ['1 (14 oz) can tomatoes, drained', '1 onion, chopped', '2 tablespoons olive oil'],
+    ['1 cup unsweetened coconut milk', '2 tablespoons creamy peanut butter', '1 teaspoon cream of tartar'],
+    ['1 cup almond milk', '2 tablespoons cocoa butter', '1 head butter lettuce'],
+    ['1 cup whole milk', '1 egg'],
+    ['1 cup heavy cream', 'salt'],
+    ['1/2 cup grated parmesan cheese', '1 lemon'],
+    ['1 cup rice flour', '1 cup water'],
+    ['2 cups all-purpose flour', '1 cup water'],
+    ['1 tablespoon vegan butter', '1 cup oat milk', '1 apple'],
+]
+
+
+@pytest.fixture(scope='module')
+def recommender(tmp_path_factory):
+    path = tmp_path_factory.mktemp('filter') / 'recipes.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['Unnamed: 0', 'Title', 'Ingredients', 'Instructions', 'Image_Name', 'Cleaned_Ingredients'])
+        for i, ingredients in enumerate(RECIPES):
+            writer.writerow([i, f"Recipe {i}", str(ingredients), 'Cook.', '', str(ingredients)])
+    recommender = RecipeRecommender(str(path), use_cache=False)
+    assert recommender.load_data()
+    return recommender
+
+
+def allowed_ids(recommender, **constraints):
+    """Allowed recipes from the bitmaps, checked against the per-recipe path used for ingested recipes"""
+    constraints = parse_constraints(**constraints)
+    size = len(RECIPES)
+    from_bitmaps = bitmap_mask(recommender.filters.allowed(constraints), size)
+    vocabulary = recommender.vocabulary
+    names = [set(vocabulary.recipe_ingredients(i)) for i in range(size)]
+    assert list(constraint_mask(names, [len(n) for n in names], constraints)) == list(from_bitmaps)
+    return {i for i in range(size) if from_bitmaps[i]}
+
+
+def test_max_ingredients_counts_parsed_ingredients(recommender):
+    # "1 (14 oz) can tomatoes, drained" is one ingredient, not two
+    assert list(recommender.vocabulary.recipe_lengths) == [len(ingredients) for ingredients in RECIPES]
+    assert 0 in allowed_ids(recommender, max_ingredients=3)
+    assert allowed_ids(recommender, max_ingredients=2) == {3, 4, 5, 6, 7}
+
+
+def test_dairy_exclusion_keeps_dairy_free_lookalikes(recommender):
+    # Coconut/almond/oat milk, peanut/cocoa/vegan butter, cream of tartar and butter lettuce are not dairy
+    assert allowed_ids(recommender, exclude=['dairy']) == {0, 1, 2, 6, 7, 8}
+
+
+def test_dairy_inclusion_finds_dairy(recommender):
+    assert allowed_ids(recommender, include=['dairy']) == {3, 4, 5}
+
+
+def test_gluten_exclusion_keeps_rice_flour(recommender):
+    assert allowed_ids(recommender, exclude=['gluten']) == set(range(len(RECIPES))) - {7}
+
+
+def test_plain_ingredient_constraints_match_by_word(recommender):
+    # Exceptions only apply to groups: "butter" names every butter
+    assert allowed_ids(recommender, exclude=['butter']) == {0, 3, 4, 5, 6, 7}
+    assert allowed_ids(recommender, include=['milk'], exclude=['coconut']) == {2, 3, 8}
+
+
+def test_dairy_exclusion_catches_descriptor_led_lines(load_recommender):
+    # Sample recipes whose only dairy is "1/2 cup finely grated Parmesan, divided"
+    # and "2 tablespoons finely grated Parmesan, plus more for serving"
+    recommender = load_recommender()
+    size = len(recommender.vocabulary.recipe_lengths)
+    allowed = bitmap_mask(recommender.filters.allowed(parse_constraints(exclude=['dairy'])), size)
+    assert not allowed[31] and not allowed[198]
+    assert allowed.any()
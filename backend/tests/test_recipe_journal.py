@@ -0,0 +1,181 @@
+import csv
+import multiprocessing
+import os
+import pytest
+from models import recipe_journal
+from models.delta_index import DeltaIndex
+from models.recipe_journal import RecipeJournal, count_csv_rows, parse_recipe
+
+COLUMNS = ['Unnamed: 0', 'Title', 'Ingredients', 'Instructions', 'Image_Name', 'Cleaned_Ingredients']
+
+
+def make_recipe(title):
+    return parse_recipe({'title': title, 'ingredients': ['1 egg', 'salt, to taste'], 'instructions': 'Mix.'})
+
+
+@pytest.fixture
+def journal(tmp_path):
+    dataset = tmp_path / 'recipes.csv'
+    with open(dataset, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(COLUMNS)
+        for i in range(3):
+            writer.writerow([i, f"Base {i}", "['1 egg']", 'Boil.', '', "['1 egg']"])
+    return RecipeJournal(str(tmp_path / 'recipes.csv.ingested.jsonl'), str(dataset))
+
+
+def csv_titles(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [int(row['Unnamed: 0']) for row in rows] == list(range(len(rows)))
+    return [row['Title'] for row in rows]
+
+
+def journal_titles(journal):
+    header, _, entries = journal.read()
+    assert [recipe_id for recipe_id, _ in entries] == list(range(header['base'], header['base'] + len(entries)))
+    return [recipe['Title'] for _, recipe in entries]
+
+
+def _append_many(path, dataset_path, writer, appends, results):
+    journal = RecipeJournal(path, dataset_path)
+    for i in range(appends):
+        recipes = [make_recipe(f"w{writer}-{i}-{j}") for j in range(3)]
+        ids = journal.append(recipes)
+        results.put([(recipe_id, recipe['Title']) for recipe_id, recipe in zip(ids, recipes)])
+
+
+def test_concurrent_appends_from_processes(journal):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    writers = [
+        context.Process(target=_append_many, args=(journal.path, journal.dataset_path, w, 20, results))
+        for w in range(4)
+    ]
+    for process in writers:
+        process.start()
+    assigned = dict(pair for _ in range(4 * 20) for pair in results.get(timeout=60))
+    for process in writers:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    # Every recipe got a distinct id, and the id is its position in the journal
+    assert sorted(assigned) == list(range(3, 3 + 4 * 20 * 3))
+    header, _, entries = journal.read()
+    assert header['base'] == 3
+    assert {recipe_id: recipe['Title'] for recipe_id, recipe in entries} == assigned
+    # Each append is contiguous
+    for w in range(4):
+        for i in range(20):
+            ids = sorted(rid for rid, title in assigned.items() if title.startswith(f"w{w}-{i}-"))
+            assert ids == list(range(ids[0], ids[0] + 3))
+
+
+def test_compaction_moves_recipes_once(journal):
+    ids = journal.append([make_recipe('A'), make_recipe('B')])
+    assert ids == [3, 4]
+    assert journal.compact() == 2
+    assert journal.compact() == 0
+    assert csv_titles(journal.dataset_path) == ['Base 0', 'Base 1', 'Base 2', 'A', 'B']
+    assert journal.read_header()['base'] == 5
+    assert journal.append([make_recipe('C')]) == [5]
+    assert journal.compact() == 1
+    assert csv_titles(journal.dataset_path) == ['Base 0', 'Base 1', 'Base 2', 'A', 'B', 'C']
+    assert not os.path.exists(journal.marker_path)
+
+
+def fail_after_csv_append(monkeypatch, journal):
+    def crash(base):
+        raise KeyboardInterrupt("killed")
+    monkeypatch.setattr(journal, '_write_header', crash)
+    with pytest.raises(KeyboardInterrupt):
+        journal.compact()
+    monkeypatch.undo()
+
+
+def test_compaction_interrupted_after_csv_append_is_redone_once(monkeypatch, journal):
+    journal.append([make_recipe('A'), make_recipe('B')])
+    fail_after_csv_append(monkeypatch, journal)
+    assert csv_titles(journal.dataset_path)[-2:] == ['A', 'B']
+    assert os.path.exists(journal.marker_path)
+
+    assert journal.compact() == 2
+    assert csv_titles(journal.dataset_path) == ['Base 0', 'Base 1', 'Base 2', 'A', 'B']
+    assert journal.compact() == 0
+    assert not os.path.exists(journal.marker_path)
+
+
+@pytest.mark.parametrize('cut', [1, 15, 40])
+def test_compaction_interrupted_mid_row_is_redone_once(monkeypatch, journal, cut):
+    journal.append([make_recipe('A'), make_recipe('B, "quoted"')])
+    fail_after_csv_append(monkeypatch, journal)
+    # A torn write: the last row only partly reached the disk
+    os.truncate(journal.dataset_path, os.path.getsize(journal.dataset_path) - cut)
+
+    assert journal.compact() == 2
+    assert csv_titles(journal.dataset_path) == ['Base 0', 'Base 1', 'Base 2', 'A', 'B, "quoted"']
+    assert count_csv_rows(journal.dataset_path) == 5
+
+
+def test_stale_marker_of_a_finished_compaction_is_ignored(journal):
+    journal.append([make_recipe('A')])
+    assert journal.compact() == 1
+    # Died after replacing the journal, before removing the marker
+    journal._write_marker(3)
+    journal.append([make_recipe('B')])
+    assert journal.compact() == 1
+    assert csv_titles(journal.dataset_path) == ['Base 0', 'Base 1', 'Base 2', 'A', 'B']
+
+
+def test_compaction_refuses_a_replaced_csv(journal):
+    journal.append([make_recipe('A')])
+    with open(journal.dataset_path, 'a', encoding='utf-8') as f:
+        f.write("3,Other,['x'],Stir.,,['x']\n")
+    assert journal.compact() == 0
+    assert csv_titles(journal.dataset_path)[-1] == 'Other'
+    assert journal_titles(journal) == ['A']
+
+
+def test_partial_line_of_a_dead_writer_is_dropped(journal):
+    journal.append([make_recipe('A')])
+    with open(journal.path, 'ab') as f:
+        f.write(b'{"Title": "half')
+    # Readers stop at the last whole line
+    assert journal_titles(journal) == ['A']
+    assert RecipeJournal(journal.path, journal.dataset_path).append([make_recipe('B')]) == [4]
+    assert journal_titles(journal) == ['A', 'B']
+
+
+def test_failed_append_is_rolled_back(monkeypatch, journal):
+    journal.append([make_recipe('A')])
+    real_write = os.write
+
+    def failing_write(fd, data):
+        real_write(fd, bytes(data[:len(data) // 2]))
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(recipe_journal.os, 'write', failing_write)
+    with pytest.raises(OSError):
+        journal.append([make_recipe('B'), make_recipe('C')])
+    monkeypatch.undo()
+
+    # Nothing of the failed append is visible, so a retry does not ingest it twice
+    assert journal_titles(journal) == ['A']
+    assert journal.append([make_recipe('B'), make_recipe('C')]) == [4, 5]
+    assert journal_titles(journal) == ['A', 'B', 'C']
+
+
+def test_delta_does_not_serve_compacted_recipes_twice(journal):
+    main_size = [3]
+    delta = DeltaIndex(journal, main_size=lambda: main_size[0], poll_interval=0, compact_threshold=2)
+    delta.ingest([make_recipe('A'), make_recipe('B')])
+    assert (delta.current.first_id, len(delta.current)) == (3, 2)
+    assert delta.maybe_compact() == 2
+    # Until the reloaded snapshot holds them, the delta keeps serving them
+    assert (delta.current.first_id, len(delta.current)) == (3, 2)
+    main_size[0] = count_csv_rows(journal.dataset_path)
+    delta.ingest([make_recipe('C')])
+    assert (delta.current.first_id, len(delta.current)) == (5, 1)
+    main_size[0] = 6
+    delta.refresh()
+    assert delta.current is None
@@ -0,0 +1,74 @@
+import csv
+import itertools
+import json
+import math
+import pytest
+from models.recipe_payloads import RECIPE_FIELDS, image_url, parse_fields, project_recipe
+from models.recommendation_model import RecipeRecommender
+
+BACKEND_URL = 'http://localhost:5000'
+
+ROWS = [
+    ['Tomato Soup', "['2 cups tomatoes', '1 onion']", 'Simmer.', 'tomato-soup', '4.5'],
+    ['Crème brûlée', "['4 egg yolks', '2 cups cream']", 'Bake "low", then torch.\nServe ☕.', 'creme', ''],
+    ['Plain Toast', "['1 slice bread']", 'Toast it.', '', 'nan'],
+    ['Garlic Bread', "['1 baguette', '4 cloves garlic, minced']", 'Bake at 180°C.', 'garlic-bread', '3'],
+]
+
+OPTIONAL_FIELDS = [field for field in RECIPE_FIELDS if field != 'id']
+
+
+@pytest.fixture(scope='module', params=[False, True], ids=['from_csv', 'compiled'])
+def recommender(request, tmp_path_factory):
+    path = tmp_path_factory.mktemp('payloads') / 'recipes.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['Title', 'Cleaned_Ingredients', 'Instructions', 'Image_Name', 'Rating'])
+        writer.writerows(ROWS)
+    if request.param:
+        # Compile first, so the recommender under test maps the cached payloads
+        assert RecipeRecommender(str(path)).load_data()
+    recommender = RecipeRecommender(str(path), use_cache=request.param)
+    assert recommender.load_data()
+    return recommender
+
+
+def expected_json(recipe, fields):
+    """What the API sent before payloads: the recipe dictionary plus image_url, NaN as null"""
+    recipe = dict(recipe)
+    if recipe.get('image_name'):
+        recipe['image_url'] = image_url(BACKEND_URL, recipe['image_name'])
+    if isinstance(recipe.get('rating'), float) and math.isnan(recipe['rating']):
+        recipe['rating'] = None
+    return project_recipe(recipe, fields)
+
+
+@pytest.mark.parametrize('chosen', [
+    combination for size in range(len(OPTIONAL_FIELDS) + 1)
+    for combination in itertools.combinations(OPTIONAL_FIELDS, size)
+], ids=lambda chosen: ','.join(chosen) or 'id')
+def test_rendered_recipes_match_recipe_dicts(recommender, chosen):
+    fields = parse_fields(list(chosen))
+    ranked = [(idx, 1.0 / (idx + 1)) for idx in range(len(ROWS))]
+    rendered = recommender.render_recipes(ranked, fields, BACKEND_URL)
+    dicts = recommender._build_recipe_dicts(ranked)
+    assert len(rendered) == len(dicts) == len(ROWS)
+    for text, recipe in zip(rendered, dicts):
+        expected = expected_json(recipe, fields)
+        decoded = json.loads(text)
+        assert decoded == expected
+        # Keys in RECIPE_FIELDS order, as jsonify's sorted keys were
+        assert list(decoded) == list(expected)
+
+
+def test_missing_ratings_are_null(recommender):
+    ratings = [json.loads(recommender.render_recipe(idx, ('id', 'rating')))['rating'] for idx in range(len(ROWS))]
+    assert ratings == [4.5, None, None, 3.0]
+
+
+def test_render_recipe_has_no_score(recommender):
+    recipe = json.loads(recommender.render_recipe(1))
+    assert 'similarity_score' not in recipe
+    assert recipe['title'] == 'Crème brûlée'
+    assert recommender.render_recipe(len(ROWS)) is None
+    assert recommender.render_recipe(-1) is None
@@ -0,0 +1,120 @@
+import time
+import numpy as np
+import pytest
+from models.recipe_filter import parse_constraints
+
+QUERIES = [
+    ['chicken', 'garlic'],
+    ['butter', 'sugar', 'flour'],
+    ['salt'],
+    ['tomato', 'basil', 'olive oil'],
+    ['no such ingredient'],
+]
+
+CONSTRAINTS = [
+    None,
+    parse_constraints(exclude=['dairy']),
+    parse_constraints(include=['garlic'], max_ingredients=12),
+    parse_constraints(exclude=['nuts', 'meat'], max_ingredients=8),
+]
+
+
+@pytest.fixture(scope='module')
+def in_process(load_recommender):
+    return load_recommender()
+
+
+@pytest.fixture(scope='module')
+def sharded(load_recommender):
+    recommender = load_recommender()
+    recommender.enable_sharding(3)
+    yield recommender
+    recommender.close()
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def assert_same_ranking(actual, expected):
+    np.testing.assert_array_equal(actual[0], expected[0])
+    np.testing.assert_allclose(actual[1], expected[1], rtol=1e-6)
+
+
+@pytest.mark.parametrize('method', ['match', 'tfidf'])
+@pytest.mark.parametrize('constraints', CONSTRAINTS)
+def test_sharded_rank_matches_in_process(in_process, sharded, method, constraints):
+    assert sharded.sharded.running
+    for query in QUERIES:
+        assert_same_ranking(sharded.rank(query, method, constraints), in_process.rank(query, method, constraints))
+
+
+@pytest.mark.parametrize('method', ['match', 'tfidf'])
+def test_sharded_batch_matches_in_process(in_process, sharded, method):
+    queries = [[ing.lower() for ing in query] for query in QUERIES]
+    expected = in_process._score_batch(queries, 20, method)
+    actual = sharded._score_batch(queries, 20, method)
+    assert [[r['id'] for r in recipes] for recipes in actual] == [[r['id'] for r in recipes] for recipes in expected]
+
+
+def test_closed_scorer_falls_back_to_in_process(in_process, load_recommender):
+    recommender = load_recommender()
+    recommender.enable_sharding(2)
+    recommender.close()
+    assert not recommender.sharded.running
+    assert recommender.sharded.top_k('match', [[np.array([0])]], 10) is None
+    assert_same_ranking(recommender.rank(['onion'], 'match'), in_process.rank(['onion'], 'match'))
+    # A closed scorer is never restarted
+    time.sleep(0.2)
+    assert recommender.sharded.pool is None
+
+
+def test_killed_shard_falls_back_and_restarts(in_process, load_recommender):
+    recommender = load_recommender()
+    recommender.enable_sharding(2)
+    try:
+        scorer = recommender.sharded
+        old_pool = scorer.pool
+        old_pool.processes[0].kill()
+        old_pool.processes[0].join()
+
+        # Scored in process, not an error, while the pool is replaced
+        for method in ('match', 'tfidf'):
+            assert_same_ranking(recommender.rank(['lemon'], method), in_process.rank(['lemon'], method))
+        assert old_pool.broken
+
+        wait_for(lambda: scorer.running)
+        assert scorer.pool is not old_pool
+        wait_for(lambda: not any(process.is_alive() for process in old_pool.processes))
+        assert scorer.top_k('match', [[np.array([0])]], 10) is not None
+        assert_same_ranking(recommender.rank(['parsley'], 'match'), in_process.rank(['parsley'], 'match'))
+    finally:
+        recommender.close()
+
+
+def test_deferred_start_happens_off_the_request_path(in_process, load_recommender):
+    recommender = load_recommender()
+    recommender.enable_sharding(2, start=False)
+    try:
+        scorer = recommender.sharded
+        assert not scorer.running
+        # The first query is scored in process and starts the pool in the background
+        started = time.perf_counter()
+        assert_same_ranking(recommender.rank(['cumin'], 'match'), in_process.rank(['cumin'], 'match'))
+        assert time.perf_counter() - started < 1
+        wait_for(lambda: scorer.running)
+        assert_same_ranking(recommender.rank(['ginger'], 'tfidf'), in_process.rank(['ginger'], 'tfidf'))
+    finally:
+        recommender.close()
+
+
+def test_concurrent_queries_use_separate_channels(in_process, sharded):
+    from concurrent.futures import ThreadPoolExecutor
+    queries = [[a, b] for a in ('egg', 'milk', 'rice', 'beef') for b in ('pepper', 'lime', 'honey')]
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda q: sharded._rank('tfidf', q, 50), queries))
+    for query, ranked in zip(queries, results):
+        assert_same_ranking(ranked, in_process._rank('tfidf', query, 50))
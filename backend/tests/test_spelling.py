@@ -0,0 +1,62 @@
+import pytest
+from models.spelling import SpellingCorrector, edit_distance
+
+WORDS = {'parmesan': 40, 'cheese': 90, 'broccoli': 30, 'garlic': 120, 'onion': 150, 'basil': 50, 'basin': 1,
+         'chicken': 200, 'thigh': 20}
+
+
+@pytest.fixture(scope='module')
+def speller():
+    return SpellingCorrector(WORDS)
+
+
+@pytest.mark.parametrize('a, b, distance', [
+    ('garlic', 'garlic', 0), ('garlik', 'garlic', 1), ('garilc', 'garlic', 1), ('onon', 'onion', 1),
+    ('parmesean', 'parmesan', 1), ('brocolli', 'broccoli', 2), ('abc', 'xyz', 3),
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b, 2) == min(distance, 3)
+
+
+@pytest.mark.parametrize('typo, word', [
+    ('garlik', 'garlic'),     # substitution
+    ('onon', 'onion'),        # deletion
+    ('chickenn', 'chicken'),  # insertion
+    ('garilc', 'garlic'),     # transposition
+    ('parmesean', 'parmesan'),
+    ('brocolli', 'broccoli'),  # two edits in a long word
+])
+def test_corrects_typos(speller, typo, word):
+    assert speller.correct_word(typo) == word
+
+
+def test_leaves_known_words_alone(speller):
+    for word in WORDS:
+        assert speller.correct_word(word) == word
+    assert speller.correct('chicken thigh') == 'chicken thigh'
+
+
+def test_leaves_uncorrectable_words_alone(speller):
+    # Too short, too far from anything known, or not a word
+    assert speller.correct_word('oni') == 'oni'
+    assert speller.correct_word('quinoa') == 'quinoa'
+    assert speller.correct_word('7up') == '7up'
+    # Two edits are too many for a short word
+    assert speller.correct_word('galrik') == 'galrik'
+
+
+def test_ties_go_to_the_more_frequent_word(speller):
+    # "basi" is one edit from both "basil" and "basin"
+    assert speller.correct_word('basi') == 'basil'
+
+
+def test_corrects_each_word_of_an_ingredient(speller):
+    assert speller.correct('parmesean cheese') == 'parmesan cheese'
+
+
+def test_recommender_applies_corrections(load_recommender):
+    recommender = load_recommender()
+    ingredients, corrections = recommender.correct_ingredients(['garlc', 'onion'])
+    assert ingredients == ['garlic', 'onion']
+    assert corrections == [{'original': 'garlc', 'corrected': 'garlic'}]
+    assert recommender.correct_ingredients(['garlic', 'onion']) == (['garlic', 'onion'], [])
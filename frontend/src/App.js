@@ -6,10 +6,16 @@ import RecipeList from './components/RecipeList';
 import Footer from './components/Footer';
 import config from './config';
 
+// Fields shown in the results list; instructions are fetched when a recipe is opened
+const RESULT_FIELDS = 'id,title,ingredients,rating,image_name,similarity_score';
+
 function App() {
   const [ingredients, setIngredients] = useState([]);
   const [recipes, setRecipes] = useState([]);
+  const [totalRecipes, setTotalRecipes] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [messages, setMessages] = useState([
     { 
       id: 1, 
@@ -44,6 +50,47 @@ function App() {
     return extractedIngredients;
   };
 
+  // Mark which of the user's ingredients each recipe uses
+  const processRecipes = (recipeList, userIngredients) => recipeList.map(recipe => {
+    const recipeIngredients = recipe.ingredients;
+    const matchedIngredients = userIngredients.filter(ing => 
+      recipeIngredients.some(recipeIng => recipeIng.toLowerCase().includes(ing.toLowerCase()))
+    );
+    
+    return {
+      ...recipe,
+      matched_ingredients: matchedIngredients
+    };
+  });
+
+  // Fetch the next page of the current results using the cursor from the last page
+  const loadMoreRecipes = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    
+    try {
+      const response = await fetch(`${config.API_URL}/api/recommend`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ cursor: nextCursor }),
+      });
+      
+      if (!response.ok) {
+        throw new Error(`Failed to fetch more recipes: ${response.status} ${response.statusText}`);
+      }
+      
+      const data = await response.json();
+      setRecipes(previous => [...previous, ...processRecipes(data.recipes, ingredients)]);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error('Error:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSendIngredients = async (userInput) => {
     setLoading(true);
     addMessage(userInput, 'user');
@@ -69,7 +116,7 @@ function App() {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ ingredients: extractedIngredients }),
+        body: JSON.stringify({ ingredients: extractedIngredients, fields: RESULT_FIELDS }),
       });
       
       if (!response.ok) {
@@ -79,24 +126,27 @@ function App() {
       const data = await response.json();
       console.log('Received data:', data);
       
+      // Misspelt ingredients are corrected by the backend; highlight what it searched for
+      const corrections = data.corrections ?? [];
+      let searchedIngredients = extractedIngredients;
+      if (corrections.length > 0) {
+        const corrected = Object.fromEntries(corrections.map((c) => [c.original, c.corrected]));
+        searchedIngredients = extractedIngredients.map((ing) => corrected[ing.trim().toLowerCase()] ?? ing);
+        setIngredients(searchedIngredients);
+        addMessage(`I searched for ${corrections.map((c) => `"${c.corrected}" (you typed "${c.original}")`).join(', ')}.`, 'bot');
+      }
+      
       // Process recipes to add matched_ingredients
-      const processedRecipes = data.recipes.map(recipe => {
-        const recipeIngredients = recipe.ingredients;
-        const matchedIngredients = extractedIngredients.filter(ing => 
-          recipeIngredients.some(recipeIng => recipeIng.toLowerCase().includes(ing.toLowerCase()))
-        );
-        
-        return {
-          ...recipe,
-          matched_ingredients: matchedIngredients
-        };
-      });
+      const processedRecipes = processRecipes(data.recipes, searchedIngredients);
       
       setRecipes(processedRecipes);
+      setTotalRecipes(data.total ?? processedRecipes.length);
+      setNextCursor(data.next_cursor ?? null);
       
       // Add bot response
       if (processedRecipes.length > 0) {
-        addMessage(`I found ${processedRecipes.length} recipes you can make with those ingredients! Check them out below.`, 'bot');
+        const total = data.total ?? processedRecipes.length;
+        addMessage(`I found ${total} recipes you can make with those ingredients! Check them out below.`, 'bot');
       } else {
         addMessage("I couldn't find any recipes with those exact ingredients. Try adding more ingredients or being more general.", 'bot');
       }
@@ -126,7 +176,13 @@ function App() {
             loading={loading}
           />
           
-          <RecipeList recipes={recipes} />
+          <RecipeList 
+            recipes={recipes} 
+            total={totalRecipes}
+            hasMore={Boolean(nextCursor)}
+            loadingMore={loadingMore}
+            onLoadMore={loadMoreRecipes}
+          />
         </motion.div>
       </main>
       
@@ -1,8 +1,16 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { motion } from 'framer-motion';
+import config from '../config';
+
+// Wait this long after a keystroke before asking for suggestions
+const SUGGEST_DELAY_MS = 80;
+
+// The ingredient being typed: the text after the last comma
+const currentTerm = (text) => text.slice(text.lastIndexOf(',') + 1).trim();
 
 const ChatBox = ({ messages, onSendMessage, loading }) => {
   const [input, setInput] = useState('');
+  const [suggestions, setSuggestions] = useState([]);
   const messagesEndRef = useRef(null);
   
   const scrollToBottom = () => {
@@ -13,11 +21,48 @@ const ChatBox = ({ messages, onSendMessage, loading }) => {
     scrollToBottom();
   }, [messages]);
   
+  // Suggest ingredient names for the term being typed
+  useEffect(() => {
+    const term = currentTerm(input);
+    if (term.length < 2) {
+      setSuggestions([]);
+      return undefined;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(
+          `${config.API_URL}/api/ingredients/suggest?q=${encodeURIComponent(term)}&limit=6`,
+          { signal: controller.signal }
+        );
+        if (response.ok) {
+          const data = await response.json();
+          setSuggestions(data.suggestions.map((suggestion) => suggestion.ingredient));
+        }
+      } catch (error) {
+        if (error.name !== 'AbortError') {
+          setSuggestions([]);
+        }
+      }
+    }, SUGGEST_DELAY_MS);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [input]);
+  
+  const applySuggestion = (ingredient) => {
+    const head = input.slice(0, input.lastIndexOf(',') + 1);
+    setInput(`${head}${head ? ' ' : ''}${ingredient}, `);
+    setSuggestions([]);
+  };
+  
   const handleSubmit = (e) => {
     e.preventDefault();
     if (input.trim() && !loading) {
       onSendMessage(input);
       setInput('');
+      setSuggestions([]);
     }
   };
   
@@ -91,6 +136,20 @@ const ChatBox = ({ messages, onSendMessage, loading }) => {
             Send
           </motion.button>
         </div>
+        {suggestions.length > 0 && (
+          <div className="flex flex-wrap gap-2 mt-2">
+            {suggestions.map((ingredient) => (
+              <button
+                key={ingredient}
+                type="button"
+                onClick={() => applySuggestion(ingredient)}
+                className="text-sm bg-green-50 text-green-700 border border-green-200 rounded-full px-3 py-1 hover:bg-green-100"
+              >
+                {ingredient}
+              </button>
+            ))}
+          </div>
+        )}
         <p className="text-xs text-gray-500 mt-2">
           <i className="fas fa-lightbulb text-yellow-500 mr-1"></i>
           Tip: Separate ingredients with commas for better results
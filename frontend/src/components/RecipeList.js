@@ -1,7 +1,8 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { useInView } from 'react-intersection-observer';
-import { getImageUrl, handleImageError } from '../utils';
+import { getImageUrl, getImageSrcSet, handleImageError } from '../utils';
+import config from '../config';
 
 const RecipeCard = ({ recipe, index }) => {
   const [ref, inView] = useInView({
@@ -10,8 +11,29 @@ const RecipeCard = ({ recipe, index }) => {
   });
   
   const [showInstructions, setShowInstructions] = useState(false);
+  const [instructions, setInstructions] = useState(recipe.instructions);
+  const [loadingInstructions, setLoadingInstructions] = useState(false);
   const [imageError, setImageError] = useState(false);
 
+  // Results come without instructions; fetch them the first time the recipe is opened
+  const toggleInstructions = async () => {
+    setShowInstructions(!showInstructions);
+    if (instructions || loadingInstructions) return;
+    setLoadingInstructions(true);
+    try {
+      const response = await fetch(`${config.API_URL}/api/recipes/${recipe.id}?fields=instructions`);
+      if (!response.ok) {
+        throw new Error(`Failed to fetch recipe: ${response.status} ${response.statusText}`);
+      }
+      const data = await response.json();
+      setInstructions(data.instructions);
+    } catch (error) {
+      console.error('Error:', error);
+    } finally {
+      setLoadingInstructions(false);
+    }
+  };
+
   // Helper function to handle ingredients in either string or array format
   const getIngredientsList = (ingredients) => {
     if (!ingredients) return [];
@@ -43,7 +65,10 @@ const RecipeCard = ({ recipe, index }) => {
       <div className="w-full h-64 bg-gray-200 overflow-hidden">
         {recipe.image_name && !imageError ? (
           <img 
-            src={getImageUrl(recipe.image_name)} 
+            src={getImageUrl(recipe.image_name, 640)} 
+            srcSet={getImageSrcSet(recipe.image_name)}
+            sizes="(max-width: 672px) 100vw, 672px"
+            loading="lazy"
             alt={recipe.title} 
             className="w-full h-full object-cover"
             onError={handleLocalImageError}
@@ -99,14 +124,18 @@ const RecipeCard = ({ recipe, index }) => {
           <motion.button
             whileHover={{ scale: 1.02 }}
             whileTap={{ scale: 0.98 }}
-            onClick={() => setShowInstructions(!showInstructions)}
+            onClick={toggleInstructions}
             className="w-full bg-green-600 hover:bg-green-700 text-white py-3 rounded-lg transition-colors text-lg font-medium"
           >
             {showInstructions ? 'Hide Recipe' : 'View Recipe'}
           </motion.button>
         </div>
         
-        {showInstructions && recipe.instructions && (
+        {showInstructions && loadingInstructions && (
+          <p className="mt-6 text-gray-500">Loading recipe...</p>
+        )}
+        
+        {showInstructions && instructions && (
           <motion.div
             initial={{ opacity: 0, height: 0 }}
             animate={{ opacity: 1, height: 'auto' }}
@@ -114,7 +143,7 @@ const RecipeCard = ({ recipe, index }) => {
             className="mt-6 p-4 bg-gray-50 rounded-lg"
           >
             <h4 className="text-lg font-medium text-gray-800 mb-3">Instructions:</h4>
-            <p className="text-base text-gray-700 whitespace-pre-line leading-relaxed">{recipe.instructions}</p>
+            <p className="text-base text-gray-700 whitespace-pre-line leading-relaxed">{instructions}</p>
           </motion.div>
         )}
       </div>
@@ -122,9 +151,26 @@ const RecipeCard = ({ recipe, index }) => {
   );
 };
 
-const RecipeList = ({ recipes }) => {
+// Start fetching the next page when this many loaded recipes are left
+const PREFETCH_THRESHOLD = 3;
+
+const RecipeList = ({ recipes, total, hasMore = false, loadingMore = false, onLoadMore }) => {
   const [currentIndex, setCurrentIndex] = useState(0);
 
+  // New results start from the first recipe; appended pages keep the position
+  const firstRecipeId = recipes && recipes.length > 0 ? recipes[0].id : null;
+  useEffect(() => {
+    setCurrentIndex(0);
+  }, [firstRecipeId]);
+
+  // Load the next page before the user reaches the end of the loaded recipes
+  useEffect(() => {
+    if (!recipes || !hasMore || loadingMore || !onLoadMore) return;
+    if (recipes.length - currentIndex <= PREFETCH_THRESHOLD) {
+      onLoadMore();
+    }
+  }, [currentIndex, recipes, hasMore, loadingMore, onLoadMore]);
+
   if (!recipes || recipes.length === 0) {
     return (
       <div className="bg-white rounded-xl shadow-lg p-6 h-full flex flex-col justify-center items-center text-center">
@@ -138,6 +184,8 @@ const RecipeList = ({ recipes }) => {
   }
 
   const goToNextRecipe = () => {
+    // Only wrap around once every page has been loaded
+    if (hasMore && currentIndex + 1 >= recipes.length) return;
     setCurrentIndex((prev) => (prev + 1) % recipes.length);
   };
 
@@ -150,7 +198,7 @@ const RecipeList = ({ recipes }) => {
       <div className="flex justify-between items-center mb-6">
         <h2 className="text-xl font-semibold text-gray-800 flex items-center">
           <i className="fas fa-utensils mr-2 text-green-600"></i>
-          Recipe {currentIndex + 1} of {recipes.length}
+          Recipe {currentIndex + 1} of {Math.max(total || 0, recipes.length)}
         </h2>
         <div className="flex gap-3">
           <motion.button
@@ -167,7 +215,7 @@ const RecipeList = ({ recipes }) => {
             whileTap={{ scale: 0.95 }}
             onClick={goToNextRecipe}
             className="px-4 py-2 bg-gray-200 hover:bg-gray-300 rounded-lg transition-colors"
-            disabled={recipes.length <= 1}
+            disabled={recipes.length <= 1 || (loadingMore && currentIndex + 1 >= recipes.length)}
           >
             Next <i className="fas fa-chevron-right ml-1"></i>
           </motion.button>
@@ -5,13 +5,17 @@
 // Base URL for the API - adjust according to your backend deployment
 const API_BASE_URL = 'http://localhost:5000';
 
+// Widths the backend pre-renders recipe images at
+const IMAGE_WIDTHS = [160, 320, 640];
+
 /**
  * Creates a proper image URL for the given image name
  * 
  * @param {string} imageName - The name of the image (with or without extension)
+ * @param {number} [width] - Desired width in pixels; omit for the original image
  * @returns {string} The full URL to the image
  */
-export const getImageUrl = (imageName) => {
+export const getImageUrl = (imageName, width) => {
   if (!imageName) {
     return null;
   }
@@ -22,7 +26,21 @@ export const getImageUrl = (imageName) => {
     : imageName;
   
   // Return absolute URL
-  return `${API_BASE_URL}/api/images/${nameWithoutExt}`;
+  const url = `${API_BASE_URL}/api/images/${nameWithoutExt}`;
+  return width ? `${url}?w=${width}` : url;
+};
+
+/**
+ * Creates a srcset listing the pre-rendered sizes of an image
+ * 
+ * @param {string} imageName - The name of the image (with or without extension)
+ * @returns {string} A srcset attribute value
+ */
+export const getImageSrcSet = (imageName) => {
+  if (!imageName) {
+    return null;
+  }
+  return IMAGE_WIDTHS.map((width) => `${getImageUrl(imageName, width)} ${width}w`).join(', ');
 };
 
 /**
@@ -32,6 +50,8 @@ export const getImageUrl = (imageName) => {
  */
 export const handleImageError = (event) => {
   console.error('Image failed to load:', event.target.src);
+  // srcset takes precedence over src, so drop it for the fallback to show
+  event.target.removeAttribute('srcset');
   event.target.src = `${API_BASE_URL}/api/images/default-recipe-image`;
   event.target.alt = 'Recipe image unavailable';
   
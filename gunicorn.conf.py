@@ -0,0 +1,21 @@
+import gc
+import sys
+
+# Import wsgi.py (and load the dataset) once in the master process, so that
+# workers are forked with the recipe store already mapped and share its pages
+preload_app = True
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the garbage collector's reach;
+    # otherwise collections in the workers write to those objects' headers
+    # and force private copies of the shared pages
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Threads do not survive fork: restart the dataset loader's background
+    # work (loading if the master did not, watching for changes) per worker,
+    # and start this worker's scoring shards (SCORING_SHARDS) in the background
+    app = sys.modules.get('app')
+    if app is not None:
+        app.dataset_loader.start()
+        app.start_scoring_shards()
@@ -5,7 +5,15 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'backend')))
 
 # Import the Flask app
-from app import app
+from app import app, ensure_dataset_loaded
+
+# Load the dataset at import time. With preload_app (see gunicorn.conf.py)
+# this runs once in the master, and workers inherit the memory-mapped store
+# copy-on-write instead of each loading their own copy. With
+# PRELOAD_DATASET=0 each worker loads in the background instead and reports
+# not ready on /api/health/ready until it is done.
+if os.environ.get('PRELOAD_DATASET', '1') == '1':
+    ensure_dataset_loaded()
 
 # This is what Gunicorn will use
 application = app